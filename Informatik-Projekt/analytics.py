@@ -0,0 +1,209 @@
+# analytics.py
+
+"""
+analytics.py
+
+Aufgabe:
+    Dieses Modul berechnet Angebotskennzahlen für das gesamte Netz:
+    Fahrten pro Stunde je Linie und Halt, erste/letzte Abfahrt,
+    mittlerer Takt und größte Taktlücke.
+    Gruppen sind (Linie, Richtung, Halt): teilen sich beide Richtungen eine
+    stop_id, würden sonst ihre Abfahrten verzahnt und der Takt halbiert.
+
+Datenquelle:
+    - kompilierter Tagesfahrplan (timetable.py) -> Kalenderlogik wie überall
+      über calendar_.py, nur aktive Trips des gewählten Datums
+
+Verfahren:
+    Vollständig vektorisiert mit NumPy: alle Abfahrten werden einmal nach
+    (Linie, Richtung, Halt, Zeit) sortiert; Gruppengrenzen, Takt-Differenzen und
+    Stunden-Histogramme entstehen dann ohne Python-Schleife.
+
+Zentrale Aufgaben:
+    - FrequencyReport für ein Datum
+    - Auswahl für einen Halt / eine Station
+    - CSV-Export
+    - Kommandozeile (python analytics.py) und Streamlit-Ansicht (app_streamlit.py)
+"""
+
+import csv
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from timetable import Timetable
+from utils import format_seconds_hhmm
+
+HOURS = 30  # GTFS-Zeiten gehen über 24:00 hinaus
+
+
+@dataclass(frozen=True)
+class FrequencyRow:
+    route_id: str
+    route_name: str
+    direction: Optional[int]  # direction_id, None = im Feed nicht angegeben
+    stop_id: str
+    departures: int
+    first_sec: int
+    last_sec: int
+    mean_headway_sec: Optional[int]
+    max_gap_sec: Optional[int]
+    peak_per_hour: int
+
+
+class FrequencyReport:
+    """
+    Kennzahlen pro Gruppe (Linie, Richtung, Halt). Alle Felder sind Arrays gleicher Länge.
+    hourly[g, h] = Abfahrten der Gruppe g in Stunde h.
+    """
+
+    def __init__(self, tt: Timetable):
+        self.tt = tt
+
+        # Abfahrten = alle Halte-Ereignisse außer dem letzten eines Trips
+        n_ev = len(tt.ev_stop)
+        is_last = np.zeros(n_ev, dtype=bool)
+        if n_ev:
+            is_last[tt.trip_ptr[1:][np.diff(tt.trip_ptr) > 0] - 1] = True
+        keep = np.flatnonzero(~is_last)
+
+        route = tt.trip_route[tt.ev_trip[keep]].astype(np.int64)
+        direction = tt.trip_direction[tt.ev_trip[keep]].astype(np.int64) + 1  # -1/0/1 -> 0/1/2
+        stop = tt.ev_stop[keep].astype(np.int64)
+        dep = tt.ev_dep[keep].astype(np.int64)
+
+        n_stops = max(tt.n_stops, 1)
+        key = (route * 3 + direction) * n_stops + stop
+        order = np.lexsort((dep, key))
+        key = key[order]
+        dep = dep[order]
+        m = len(key)
+
+        if m == 0:
+            starts = np.zeros(0, dtype=np.int64)
+        else:
+            starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        ends = np.r_[starts[1:], m] if m else starts
+        group = np.repeat(np.arange(len(starts)), ends - starts)
+
+        self.route = (key[starts] // n_stops // 3).astype(np.int32)
+        self.direction = (key[starts] // n_stops % 3 - 1).astype(np.int8)
+        self.stop = (key[starts] % n_stops).astype(np.int32)
+        self.count = (ends - starts).astype(np.int32)
+        self.first = dep[starts] if m else dep
+        self.last = dep[ends - 1] if m else dep
+
+        # Taktlücken innerhalb der Gruppe
+        self.max_gap = np.full(len(starts), -1, dtype=np.int64)
+        if m > 1:
+            same = key[1:] == key[:-1]
+            gaps = np.diff(dep)[same]
+            np.maximum.at(self.max_gap, group[1:][same], gaps)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean_headway = np.where(
+                self.count > 1, (self.last - self.first) / np.maximum(self.count - 1, 1), -1
+            ).astype(np.int64)
+
+        hour = np.minimum(dep // 3600, HOURS - 1)
+        self.hourly = np.bincount(group * HOURS + hour, minlength=len(starts) * HOURS).reshape(len(starts), HOURS)
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+    def _row(self, g: int) -> FrequencyRow:
+        tt = self.tt
+        r = int(self.route[g])
+        mean = int(self.mean_headway[g])
+        gap = int(self.max_gap[g])
+        direction = int(self.direction[g])
+        return FrequencyRow(
+            route_id=tt.route_ids[r],
+            route_name=tt.route_names[r],
+            direction=direction if direction >= 0 else None,
+            stop_id=tt.stop_ids[int(self.stop[g])],
+            departures=int(self.count[g]),
+            first_sec=int(self.first[g]),
+            last_sec=int(self.last[g]),
+            mean_headway_sec=mean if mean >= 0 else None,
+            max_gap_sec=gap if gap >= 0 else None,
+            peak_per_hour=int(self.hourly[g].max()),
+        )
+
+    def rows(self) -> Iterable[FrequencyRow]:
+        for g in range(len(self)):
+            yield self._row(g)
+
+    def groups_for_stops(self, stop_ids: Iterable[str]) -> np.ndarray:
+        idx = [self.tt.stop_index[s] for s in stop_ids if s in self.tt.stop_index]
+        return np.flatnonzero(np.isin(self.stop, np.asarray(idx, dtype=np.int32)))
+
+    def for_stops(self, stop_ids: Iterable[str]) -> List[FrequencyRow]:
+        """Kennzahlen aller Linien an diesen Halten, sortiert nach Anzahl Abfahrten."""
+        rows = [self._row(int(g)) for g in self.groups_for_stops(stop_ids)]
+        rows.sort(key=lambda r: -r.departures)
+        return rows
+
+    def hourly_for_stops(self, stop_ids: Iterable[str]) -> Dict[str, List[int]]:
+        """Linienname -> Abfahrten pro Stunde (0..HOURS-1), über die Halte summiert."""
+        result: Dict[str, np.ndarray] = {}
+        for g in self.groups_for_stops(stop_ids):
+            name = self.tt.route_names[int(self.route[g])]
+            result[name] = result.get(name, 0) + self.hourly[g]
+        return {k: v.tolist() for k, v in result.items()}
+
+    def write_csv(self, path: str) -> int:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["route_id", "route_name", "direction_id", "stop_id", "departures", "first", "last",
+                        "mean_headway_min", "max_gap_min", "peak_per_hour"] + [f"h{h:02d}" for h in range(HOURS)])
+            for g in range(len(self)):
+                r = self._row(g)
+                w.writerow([
+                    r.route_id, r.route_name, "" if r.direction is None else r.direction, r.stop_id, r.departures,
+                    format_seconds_hhmm(r.first_sec), format_seconds_hhmm(r.last_sec),
+                    "" if r.mean_headway_sec is None else round(r.mean_headway_sec / 60, 1),
+                    "" if r.max_gap_sec is None else round(r.max_gap_sec / 60, 1),
+                    r.peak_per_hour,
+                ] + self.hourly[g].tolist())
+        return len(self)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from datetime import date
+    from config import GTFS_ZIP_PATH
+    from cli import print_frequency_table
+    from journey import station_stop_ids
+    from stops import load_stops, search_stops
+    from timetable import get_timetable
+    from utils import today_date
+
+    parser = argparse.ArgumentParser(description="Takt- und Häufigkeitsauswertung")
+    parser.add_argument("--halt", help="nur diese Station (Suchtext oder stop_id)")
+    parser.add_argument("--datum", help="Datum YYYY-MM-DD (Standard: heute)")
+    parser.add_argument("--csv", help="gesamtes Netz als CSV schreiben")
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    args = parser.parse_args()
+
+    d = date.fromisoformat(args.datum) if args.datum else today_date()
+    stops_by_id = load_stops(args.zip)
+    tt = get_timetable(args.zip, d, stops_by_id=stops_by_id)
+
+    t0 = time.time()
+    report = FrequencyReport(tt)
+    print(f"{len(report)} Linien/Halt-Gruppen in {time.time() - t0:.2f}s berechnet.")
+
+    if args.csv:
+        report.write_csv(args.csv)
+        print(f"CSV geschrieben: {args.csv}")
+
+    if args.halt:
+        sid = args.halt if args.halt in stops_by_id else None
+        if sid is None:
+            hits = search_stops(stops_by_id, args.halt, limit=1)
+            if not hits:
+                raise SystemExit(f"Kein Halt gefunden für '{args.halt}'.")
+            sid = hits[0][0]
+        print_frequency_table(report.for_stops(station_stop_ids(stops_by_id, sid)), stops_by_id)
@@ -3,28 +3,34 @@ import folium
 from streamlit_folium import folium_static
 
 # Eure Module (Backend)
-import stops
-import departures
 import cache_db
-from config import GTFS_ZIP_PATH
+from config import GTFS_ZIP_PATH, FEEDS
 
 
 FEED_ZIP = "data/feed.zip"
 DB_PATH = "gtfs_cache.db"
 
-@st.cache_data(show_spinner=True)
+@st.cache_resource
+def feed_snapshot():
+    # gemappte Datei: alle Worker-Prozesse teilen sich dieselben Seiten
+    from feed_snapshot import get_snapshot
+    return get_snapshot(FEED_ZIP)
 
-def cached_departures(stop_id: str, limit: int):
-    from calendar_ import active_service_ids
-    from utils import today_date
 
-    active_services = active_service_ids(FEED_ZIP, today_date())
+@st.cache_resource(max_entries=2)  # heute und (nach Mitternacht) noch gestern
+def active_trip_route_for(day):
+    snap = feed_snapshot()
+    has_services = bool(snap.service_mask(day).any())
+    # ohne aktive Services: alle Trips (wie build_trip_route_map_all)
+    return has_services, snap.active_trip_route(day)
+
 
-    if not active_services:
+def sqlite_departures(stop_id: str, limit: int):
+    from utils import today_date
+
+    has_services, active_trip_route = active_trip_route_for(today_date())
+    if not has_services:
         st.warning("Hinweis: Keine aktiven Services für HEUTE im Feed gefunden. Fallback ohne Kalenderfilter.")
-        active_trip_route = departures.build_trip_route_map_all(FEED_ZIP)
-    else:
-        active_trip_route = departures.build_active_trip_route_map(FEED_ZIP, active_services)
 
     # 3) DB-Connection holen
     con = cache_db.connect(DB_PATH)
@@ -44,10 +50,202 @@ def cached_departures(stop_id: str, limit: int):
     return next_departures
 
 
+@st.cache_resource
+def compressed_stop_times():
+    # Komprimierter Feed (python cache_db.py komprimieren) passt komplett in den RAM
+    con = cache_db.connect(DB_PATH)
+    if not cache_db.has_compressed_cache(con):
+        return None
+    return cache_db.CompressedStopTimes(con)
+
+
+@st.cache_resource
+def shape_store():
+    import shapes
+    # wird von allen Sitzungs-Threads benutzt (nur Lesezugriffe)
+    return shapes.ShapeStore(cache_db.connect(DB_PATH, check_same_thread=False))
+
+
+@st.cache_resource
+def delay_history():
+    # Verspätungen schreibt ein anderer Prozess; hier nur nachlesen (ohne Historie: None)
+    import os
+    from config import DELAY_HISTORY_DIR
+    if not os.path.isdir(DELAY_HISTORY_DIR):
+        return None
+    from delay_history import DelayHistory
+    history = DelayHistory(DELAY_HISTORY_DIR)
+    history.watch()
+    return history
+
+
+@st.cache_resource
+def board_cache():
+    # Tafeln pro Minute im Speicher (LRU, begrenzt); st.cache_data würde sie ewig halten
+    import board_cache as bc
+    cache = bc.BoardCache()
+    history = delay_history()
+    if history is not None:
+        history.subscribe(cache.on_realtime_update)  # betroffene Tafeln sofort verwerfen
+    return cache
+
+
+@st.cache_resource
+def board_index_manager():
+    # Tagesindex wird im Hintergrund gebaut und beim Tageswechsel ausgetauscht
+    import board_index
+    return board_index.BoardIndexManager(FEED_ZIP).start()
+
+
+@st.cache_resource
+def prewarm_scheduler():
+    # Cache der meistgenutzten Stationen im Hintergrund vorwärmen
+    import prewarm
+    return prewarm.PrewarmScheduler(FEED_ZIP, DB_PATH).start()
+
+
+def ensure_cached(stop_id: str) -> None:
+    """Kalter Halt: Vordergrund-Auftrag an den Scheduler, Fortschritt live anzeigen."""
+    scheduler = prewarm_scheduler()
+    pending = scheduler.request([stop_id])
+    if not pending:
+        return
+    bar = st.progress(0.0, text="Cache für diesen Halt wird aufgebaut (stop_times.txt wird gescannt) …")
+    scheduler.wait(pending, on_progress=lambda f: bar.progress(f, text=f"Cache-Aufbau: {f:.0%}"))
+    bar.empty()
+
+
+def _departures_uncached(stop_id: str, limit: int):
+    """Schneller Weg über den Tagesindex, solange der noch nicht fertig ist: SQLite-Cache."""
+    manager = board_index_manager()
+    if manager.ready:
+        return manager.next_departures(stop_id, limit)
+    compressed = compressed_stop_times()
+    if compressed is not None:
+        from utils import today_date
+        return compressed.next_departures(stop_id, active_trip_route_for(today_date())[1], limit)
+    ensure_cached(stop_id)
+    return sqlite_departures(stop_id, limit)
+
+
+def departures_for_stop(stop_id: str, limit: int):
+    from utils import today_date, now_seconds
+    return board_cache().get_or_compute(
+        stop_id, today_date(), now_seconds(), limit,
+        lambda: _departures_uncached(stop_id, limit),
+    )
+
+
 st.set_page_config(layout="wide", page_title="GTFS Mobility Dashboard", page_icon="🚆")
 
 st.title("🚆 GTFS Mobility Dashboard (Deutschland)")
 
+# ---------------------------
+# Netzübersicht (vorgenerierte Kacheln)
+# ---------------------------
+
+if st.sidebar.checkbox("Netzübersicht anzeigen", value=False):
+    import json
+    import os
+    import route_map
+    import network_tiles
+    from config import TILES_DIR, TILE_MIN_ZOOM, TILE_MAX_ZOOM
+
+    meta_path = os.path.join(TILES_DIR, "meta.json")
+    if not os.path.exists(meta_path):
+        st.warning("Noch keine Kacheln vorhanden. Bitte zuerst `python network_tiles.py build` "
+                   "und `python network_tiles.py serve` ausführen.")
+        st.stop()
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    st.header("Netzübersicht")
+    st.caption("Kacheln werden vom lokalen Kachel-Server geladen (`python network_tiles.py serve`).")
+    m = route_map.build_network_map(
+        network_tiles.tiles_url(),
+        min_zoom=meta.get("min_zoom", TILE_MIN_ZOOM),
+        max_zoom=meta.get("max_zoom", TILE_MAX_ZOOM),
+        max_departures=meta.get("max_departures", 0),
+    )
+    folium_static(m, width=1200, height=700)
+    st.stop()
+
+# ---------------------------
+# Live-Karte: alle fahrenden Züge (Fahrplan + Verspätung)
+# ---------------------------
+
+@st.cache_resource(show_spinner=True)
+def vehicle_engine(day):
+    import vehicles
+    engine = vehicles.VehicleEngine.for_day(FEED_ZIP, day, feed_snapshot().stops_by_id())
+    history = delay_history()
+    if history is not None:
+        engine.follow(history)
+    return engine
+
+
+if st.sidebar.checkbox("Live-Karte (alle Züge) anzeigen", value=False):
+    import route_map
+    from config import VEHICLE_REFRESH_SEC
+    from utils import today_date, now_seconds, format_seconds_hhmmss
+
+    st.header("Live-Karte")
+    st.caption("Position aus Fahrplan und Verspätung, linear zwischen den Halten. "
+               "Grün pünktlich, orange ab 1 min, rot ab 6 min. Flüssiger ohne Neuladen der Karte: "
+               "`python vehicles.py serve` + `python vehicles.py karte`.")
+    with st.spinner("Tagesfahrplan wird geladen/kompiliert…"):
+        engine = vehicle_engine(today_date())
+
+    def _vehicle_map():
+        t = now_seconds()
+        vp = engine.positions(t)
+        st.write(f"**{len(vp)}** Fahrzeuge unterwegs, Stand {format_seconds_hhmmss(t)}")
+        m = folium.Map(location=[51.16, 10.45], zoom_start=6)
+        route_map.add_vehicle_layer(m, vp)
+        folium_static(m, width=1200, height=700)
+
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=VEHICLE_REFRESH_SEC)(_vehicle_map)()
+    else:
+        _vehicle_map()
+        st.button("Aktualisieren")
+    st.stop()
+
+# ---------------------------
+# Mehrere Feeds (config.FEEDS): Suche und Abfahrten über alle Shards
+# ---------------------------
+
+if len(FEEDS) > 1 and st.sidebar.checkbox(f"Alle Feeds durchsuchen ({', '.join(FEEDS)})", value=False):
+    import multi_feed
+
+    @st.cache_resource
+    def multi_feed_backend():
+        return multi_feed.MultiFeed()
+
+    mf = multi_feed_backend()
+    q = st.sidebar.text_input("Station (alle Feeds):", value="Mannheim")
+    stations = mf.search_stations(q)
+    if not stations:
+        st.sidebar.warning("Keine Treffer. Bitte Suchbegriff ändern.")
+        st.stop()
+    i = st.sidebar.selectbox("Treffer:", range(len(stations)),
+                             format_func=lambda k: f"{stations[k].name} [{', '.join(stations[k].feeds)}]")
+    station = stations[i]
+
+    st.header(f"Nächste Abfahrten {station.name}")
+    st.caption(f"Feeds: {', '.join(station.feeds)} · {len(station.members)} stop_ids")
+    st.dataframe([
+        {
+            "Zeit": d.departure_time[:5],
+            "Linie": d.route_name,
+            "Ziel": d.headsign,
+            "Feed": multi_feed.split_id(d.trip_id)[0],
+        }
+        for d in mf.next_departures(station, limit=20)
+    ], use_container_width=True)
+    st.stop()
+
 # ---------------------------
 # Helpers: kompatibel zu mehreren Backend-Varianten
 # ---------------------------
@@ -108,9 +306,18 @@ def _route_coords_from_trip(stops_dict, trip_id):
     - nutzt cache_db.trip_stop_sequence(zip, trip_id)
     - wandelt stop_id -> (lat, lon) über stops_dict um
     """
-    seq = cache_db.trip_stop_sequence(FEED_ZIP, trip_id)
+    compressed = compressed_stop_times()
+    if compressed is not None:
+        seq = compressed.trip_stop_sequence(trip_id)
+    else:
+        seq = cache_db.trip_stop_sequence(FEED_ZIP, trip_id)
     ordered_stop_ids = [sid for _, sid in seq]
 
+    # Feeds mit shapes.txt: echter Verlauf (python shapes.py build)
+    geometry = shape_store().trip_geometry(trip_id, ordered_stop_ids, stops_dict)
+    if geometry:
+        return geometry
+
     coords = []
     for sid in ordered_stop_ids:
         s = stops_dict.get(sid)
@@ -124,9 +331,9 @@ def _route_coords_from_trip(stops_dict, trip_id):
 # Caching (Streamlit)
 # ---------------------------
 
-@st.cache_data(show_spinner=True)
+@st.cache_resource(show_spinner=True)
 def cached_load_stops():
-    return stops.load_stops(FEED_ZIP)
+    return feed_snapshot().stops_by_id()
 
 STOPS_DICT = cached_load_stops()
 
@@ -137,7 +344,12 @@ STOPS_DICT = cached_load_stops()
 st.sidebar.header("Stationssuche (GTFS)")
 query = st.sidebar.text_input("Bahnhof/Halt eingeben:", value="Mannheim")
 
-results = stops.search_stops(STOPS_DICT, query, limit=25)
+if st.session_state.get("logged_query") != query:
+    import prewarm
+    prewarm.log_event("search", query=query)
+    st.session_state["logged_query"] = query
+
+results = feed_snapshot().search(query, limit=25)
 
 if not results:
     st.sidebar.warning("Keine Treffer. Bitte Suchbegriff ändern.")
@@ -158,6 +370,194 @@ st.sidebar.subheader("Ausgewählt:")
 st.sidebar.write(f"**{stop_display_name(selected_stop)}**")
 st.sidebar.caption(f"stop_id: {selected_stop.stop_id}")
 
+# Anfrage einmal pro Auswahl ins Query-Log (Rangfolge fürs Vorwärmen)
+if st.session_state.get("logged_stop") != selected_stop.stop_id:
+    import prewarm
+    prewarm.log_query(selected_stop.stop_id)
+    st.session_state["logged_stop"] = selected_stop.stop_id
+
+_board_stats = board_cache().stats()
+st.sidebar.caption(
+    f"Tafel-Cache: {_board_stats.hits} Treffer / {_board_stats.misses} Fehlzugriffe, "
+    f"{_board_stats.entries} Tafeln ({_board_stats.bytes // 1024} KiB)"
+)
+
+_prewarm = prewarm_scheduler().status()
+if _prewarm.ranking:
+    st.sidebar.caption("Cache-Vorwärmen: Abfahrten werden gezählt …")
+elif _prewarm.stations_done < _prewarm.stations_total:
+    st.sidebar.progress(
+        _prewarm.fraction,
+        text=f"Cache-Vorwärmen: {_prewarm.stations_done}/{_prewarm.stations_total} Stationen",
+    )
+
+# ---------------------------
+# Taktanalyse (Fahrten pro Stunde, Takt, Lücken)
+# ---------------------------
+
+if st.sidebar.checkbox("Taktanalyse anzeigen", value=False):
+    import analytics
+    import journey
+    import timetable
+    from utils import today_date, format_seconds_hhmm
+
+    @st.cache_resource
+    def frequency_report(day):
+        tt = timetable.get_timetable(FEED_ZIP, day, stops_by_id=STOPS_DICT)
+        return analytics.FrequencyReport(tt)
+
+    st.header(f"Taktanalyse {stop_display_name(selected_stop)}")
+    with st.spinner("Tagesfahrplan wird geladen/kompiliert…"):
+        report = frequency_report(today_date())
+
+    ids = journey.station_stop_ids(STOPS_DICT, selected_stop.stop_id)
+    rows = report.for_stops(ids)
+    if not rows:
+        st.info("Heute keine Abfahrten an diesem Halt.")
+        st.stop()
+
+    st.dataframe([
+        {
+            "Linie": r.route_name,
+            "Richtung": r.direction,
+            "Steig": STOPS_DICT[r.stop_id].stop_name if r.stop_id in STOPS_DICT else r.stop_id,
+            "Abfahrten": r.departures,
+            "erste": format_seconds_hhmm(r.first_sec),
+            "letzte": format_seconds_hhmm(r.last_sec),
+            "Takt (min)": None if r.mean_headway_sec is None else round(r.mean_headway_sec / 60, 1),
+            "größte Lücke (min)": None if r.max_gap_sec is None else round(r.max_gap_sec / 60, 1),
+            "max. pro Stunde": r.peak_per_hour,
+        }
+        for r in rows
+    ], use_container_width=True)
+
+    st.subheader("Fahrten pro Stunde")
+    st.bar_chart(report.hourly_for_stops(ids))
+    st.stop()
+
+# ---------------------------
+# Linienfahrplan (alle Fahrten einer Linie x Halte)
+# ---------------------------
+
+if st.sidebar.checkbox("Linienfahrplan anzeigen", value=False):
+    import numpy as np
+    import journey
+    import route_timetable
+    import timetable
+    from utils import today_date
+
+    with st.spinner("Tagesfahrplan wird geladen/kompiliert…"):
+        tt = timetable.get_timetable(FEED_ZIP, today_date(), stops_by_id=STOPS_DICT)
+
+    # Linien, die an der gewählten Station halten
+    idx = [tt.stop_index[sid] for sid in journey.station_stop_ids(STOPS_DICT, selected_stop.stop_id) if sid in tt.stop_index]
+    trips_here = np.unique(tt.ev_trip[np.isin(tt.ev_stop, np.asarray(idx, dtype=tt.ev_stop.dtype))])
+    route_ids = sorted({tt.route_ids[r] for r in np.unique(tt.trip_route[trips_here]).tolist()},
+                       key=lambda rid: tt.route_names[tt.route_ids.index(rid)])
+    if not route_ids:
+        st.info("Heute keine Linien an diesem Halt.")
+        st.stop()
+
+    rid = st.selectbox("Linie", route_ids, format_func=lambda r: tt.route_names[tt.route_ids.index(r)])
+    direction = st.radio("Richtung", [0, 1], horizontal=True)
+    rt = route_timetable.build_route_timetable(tt, rid, direction)
+    if len(rt) == 0:
+        rt = route_timetable.build_route_timetable(tt, rid, None)
+
+    st.header(f"Fahrplan {rt.route_label}")
+    st.caption(f"{len(rt)} Fahrten, {len(rt.patterns)} Haltemuster")
+    names = {sid: s.stop_name for sid, s in STOPS_DICT.items()}
+    st.dataframe(
+        {
+            "Halt": [names.get(sid, sid) for sid in rt.stop_ids],
+            **{f"{i + 1}: {rt.headsigns[i]}": [rt.cell(i, c) for c in range(len(rt.stop_ids))] for i in range(len(rt))},
+        },
+        use_container_width=True,
+    )
+
+    st.download_button("Als CSV herunterladen", rt.csv_text(names),
+                       file_name=f"fahrplan_{rt.route_label}.csv", mime="text/csv")
+    st.stop()
+
+# ---------------------------
+# Isochrone (Erreichbarkeit ab dem gewählten Halt)
+# ---------------------------
+
+if st.sidebar.checkbox("Erreichbarkeit (Isochrone) anzeigen", value=False):
+    import isochrone
+    import journey
+    import route_map
+    import timetable
+    from config import ISOCHRONE_BUCKET_SEC
+    from utils import today_date, now_seconds, format_seconds_hhmm
+
+    st.header(f"Erreichbarkeit ab {stop_display_name(selected_stop)}")
+    with st.spinner("Tagesfahrplan wird geladen/kompiliert…"):
+        tt = timetable.get_timetable(FEED_ZIP, today_date(), stops_by_id=STOPS_DICT)
+    iso = isochrone.compute_isochrone(tt, journey.station_stop_ids(STOPS_DICT, selected_stop.stop_id), now_seconds())
+
+    st.caption(f"Abfahrt ab {format_seconds_hhmm(iso.dep_sec)} (auf {ISOCHRONE_BUCKET_SEC // 60} Minuten aufgerundet)")
+    for band, ids in iso.bands().items():
+        st.write(f"bis {band} min: **{len(ids)}** Halte")
+
+    m = folium.Map(location=[selected_stop.lat, selected_stop.lon], zoom_start=8)
+    route_map.add_isochrone_layer(m, STOPS_DICT, iso)
+    folium_static(m, width=1200, height=650)
+    st.stop()
+
+# ---------------------------
+# Ankünfte und Anschlüsse
+# ---------------------------
+
+if st.sidebar.checkbox("Ankünfte & Anschlüsse anzeigen", value=False):
+    import connections
+    from utils import format_seconds_hhmm
+
+    @st.cache_resource
+    def connection_finder():
+        # eine DB-Verbindung für alle Sitzungen (intern mit Lock)
+        return connections.ConnectionFinder(FEED_ZIP, DB_PATH)
+
+    finder = connection_finder()
+    st.header(f"Ankünfte {stop_display_name(selected_stop)}")
+    with st.spinner("Ankünfte werden geladen…"):
+        arrivals = finder.arrivals(selected_stop.stop_id, limit=20)
+    if not arrivals:
+        st.info("Keine Ankünfte gefunden (Datum/Wochentag/Feed).")
+        st.stop()
+
+    arr_idx = st.selectbox(
+        "Ankunft auswählen:",
+        list(range(len(arrivals))),
+        format_func=lambda i: f"{arrivals[i][1].arrival_time[:5]} – {arrivals[i][1].route_name or arrivals[i][1].route_id}"
+                              f" → {arrivals[i][1].headsign or ''} (Steig {arrivals[i][0]})",
+    )
+    arr_stop, arrival = arrivals[int(arr_idx)]
+    delay_min = st.number_input("Verspätung der Ankunft (min)", min_value=0, max_value=180, value=0)
+    window_min = st.slider("Anschlüsse bis … Minuten nach Ankunft", 10, 120, 60, step=10)
+
+    arr_sec = finder.arrival_sec(arrival.trip_id, arr_stop)
+    res = finder.connections(
+        arrival.trip_id, arr_stop, window_sec=window_min * 60,
+        arrival_sec=None if arr_sec is None else arr_sec + delay_min * 60,
+    )
+    st.subheader(f"Anschlüsse nach Ankunft {format_seconds_hhmm(res.arrival_sec)}" if res.arrival_sec is not None else "Anschlüsse")
+    if not res.connections:
+        st.info("Keine erreichbaren Anschlüsse in diesem Zeitfenster.")
+        st.stop()
+    st.dataframe([
+        {
+            "ab": format_seconds_hhmm(c.dep_sec),
+            "Linie": c.departure.route_name or c.departure.route_id,
+            "Ziel": c.departure.headsign or "",
+            "Steig": STOPS_DICT[c.stop_id].stop_name if c.stop_id in STOPS_DICT else c.stop_id,
+            "Umstieg (min)": c.transfer_sec // 60,
+            "Puffer (min)": c.slack_sec // 60,
+        }
+        for c in res.connections
+    ], use_container_width=True)
+    st.stop()
+
 # ---------------------------
 # Hauptbereich
 # ---------------------------
@@ -168,7 +568,7 @@ with col1:
     st.header("Nächste Abfahrten")
     deps = []
     try:
-        deps = cached_departures(selected_stop.stop_id, limit=20)
+        deps = departures_for_stop(selected_stop.stop_id, limit=20)
     except Exception as e:
         st.error("Fehler beim Laden der Abfahrten aus GTFS:")
         st.code(str(e))
@@ -176,9 +576,9 @@ with col1:
 
 # Schritt B: Fallback auf Child-Stops
 if not deps:
-    child_ids = stops.child_stop_ids(STOPS_DICT, selected_stop.stop_id)
+    child_ids = feed_snapshot().children(selected_stop.stop_id)
     for cid in child_ids:
-        deps.extend(cached_departures(cid, limit=20))
+        deps.extend(departures_for_stop(cid, limit=20))
 
 # ERST JETZT abbrechen, falls wirklich nichts da ist
 if not deps:
@@ -208,6 +608,11 @@ if not trip_id:
 
 st.caption(f"trip_id: {trip_id}")
 
+if st.session_state.get("logged_trip") != trip_id:
+    import prewarm
+    prewarm.log_event("trip_map", trip_id=trip_id)
+    st.session_state["logged_trip"] = trip_id
+
 with col2:
     st.header("Streckenverlauf (Karte)")
 
@@ -228,4 +633,5 @@ with col2:
     folium_static(m, width=900, height=520)
 
 st.markdown("---")
-st.caption("Hinweis: Der verwendete Deutschland-GTFS-Feed enthält keine shapes.txt → Route wird Stop-zu-Stop visualisiert.")
\ No newline at end of file
+st.caption("Hinweis: Der verwendete Deutschland-GTFS-Feed enthält keine shapes.txt → Route wird Stop-zu-Stop visualisiert. "
+           "Feeds mit shapes.txt zeigen nach `python shapes.py build` den echten Verlauf.")
\ No newline at end of file
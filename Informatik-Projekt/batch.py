@@ -0,0 +1,292 @@
+# batch.py
+
+"""
+batch.py
+
+Aufgabe:
+    Nicht-interaktiver Batch-Modus für Skripte und Cronjobs. Liest viele
+    Anfragen (Halt + Uhrzeit) aus einer Datei oder von stdin und schreibt die
+    Abfahrtstafeln als JSON-Lines oder CSV fortlaufend nach stdout.
+
+Eingabeformat (eine Anfrage pro Zeile):
+    - CSV:  <Suchtext oder stop_id>[,<HH:MM>[,<Anzahl>]]   (ohne Uhrzeit: jetzt)
+    - JSON: {"stop": "Mannheim Hbf", "time": "08:15", "limit": 5, "date": "2026-10-19"}
+    Leere Zeilen und Zeilen mit "#" am Anfang werden ignoriert.
+
+Zentrale Aufgaben:
+    - Anfragen blockweise lesen (BATCH_CHUNK_LINES) und Ergebnisse je Block
+      fortlaufend ausgeben (Streaming)
+    - Namen, Stationen und aktive Trips aus dem Feed-Snapshot
+      (feed_snapshot.py, per mmap) – stops.txt, trips.txt und der Kalender
+      werden nicht bei jedem Lauf neu gelesen
+    - Abfahrten aus dem Cache pro Halt (cache_db.py): komprimierter Cache,
+      sonst stop_times_cache – fehlende Halte eines Blocks in EINEM Scan
+    - Keine Folium-/Browser-Imports
+
+Hinweise:
+    - Aufruf über main.py: python main.py --batch anfragen.txt --format csv
+    - Es wird kein landesweiter Tagesfahrplan kompiliert; der Aufwand hängt an
+      den angefragten Halten.
+    - Ist an einem Datum kein Service aktiv (z.B. außerhalb von calendar.txt),
+      gelten wie in der App alle Trips; auf stderr steht ein Hinweis.
+"""
+
+import csv
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date
+from heapq import merge
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import cache_db
+from config import GTFS_ZIP_PATH, CACHE_DB_PATH, SNAPSHOT_PATH, DEFAULT_DEPARTURES_LIMIT, BATCH_CHUNK_LINES
+from models import Departure
+from utils import now_seconds, parse_gtfs_time_to_seconds, today_date
+
+CSV_FIELDS = ["query", "stop_id", "stop_name", "time", "departure_time", "route_name", "headsign", "trip_id", "error"]
+
+
+@dataclass(frozen=True)
+class BatchRequest:
+    query: str
+    time_sec: int
+    limit: int
+    service_date: date
+
+
+def parse_request(line: str, default_date: date, default_limit: int) -> Optional[BatchRequest]:
+    """
+    Liest eine Anfragezeile (CSV oder JSON). None bei Leer-/Kommentarzeilen.
+    Ungültige Zeilen lösen ValueError aus.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    if line.startswith("{"):
+        obj = json.loads(line)
+        query = str(obj.get("stop") or obj.get("stop_id") or "").strip()
+        time_txt = str(obj.get("time") or "").strip()
+        limit = int(obj.get("limit") or default_limit)
+        d = date.fromisoformat(obj["date"]) if obj.get("date") else default_date
+    else:
+        parts = next(csv.reader([line]))
+        query = parts[0].strip()
+        time_txt = parts[1].strip() if len(parts) > 1 else ""
+        limit = int(parts[2]) if len(parts) > 2 and parts[2].strip() else default_limit
+        d = default_date
+
+    if not query:
+        raise ValueError("Halt fehlt")
+    if not time_txt:
+        return BatchRequest(query, now_seconds(), limit, d)
+    if time_txt.count(":") == 1:
+        time_txt += ":00"
+    return BatchRequest(query, parse_gtfs_time_to_seconds(time_txt), limit, d)
+
+
+class BatchBackend:
+    """
+    Lädt Daten erst bei Bedarf und hält sie für alle weiteren Anfragen.
+    """
+
+    def __init__(self, zip_path: str = GTFS_ZIP_PATH, db_path: str = CACHE_DB_PATH,
+                 snapshot_path: str = SNAPSHOT_PATH):
+        self.zip_path = zip_path
+        self.snapshot_path = snapshot_path
+        self._snapshot = None
+        self._active: Dict[date, Dict[str, str]] = {}
+        self._scanned: set = set()  # in diesem Lauf schon gescannt (auch Halte ohne Abfahrten)
+        self.con = cache_db.connect(db_path)
+        cache_db.init_db(self.con)
+        self.compressed = (
+            cache_db.CompressedStopTimes(self.con) if cache_db.has_compressed_cache(self.con) else None
+        )
+
+    def snapshot(self):
+        if self._snapshot is None:
+            from feed_snapshot import get_snapshot
+            self._snapshot = get_snapshot(self.zip_path, self.snapshot_path)
+        return self._snapshot
+
+    def active_trip_route(self, d: date) -> Dict[str, str]:
+        m = self._active.get(d)
+        if m is None:
+            snap = self.snapshot()
+            if not snap.service_mask(d).any():
+                print(f"Hinweis: keine aktiven Services am {d.isoformat()} – alle Trips werden gezeigt.", file=sys.stderr)
+            m = self._active[d] = snap.active_trip_route(d, fallback_all=True)
+        return m
+
+    def _has_stop(self, stop_id: str) -> bool:
+        if self.compressed is not None:
+            return stop_id in self.compressed.stop_occ
+        return cache_db.has_cached_stop(self.con, stop_id)
+
+    def resolve(self, query: str) -> Tuple[str, str, List[str]]:
+        """
+        Rückgabe: (stop_id, Name, stop_ids für die Tafel).
+        Eine stop_id mit eigenen Abfahrten im Cache wird direkt benutzt.
+        """
+        snap = self.snapshot()
+        stop = snap.stop(query)
+        if stop is not None and self._has_stop(query):
+            return query, stop.stop_name, [query]
+
+        if stop is None:
+            hits = snap.search(query, limit=1)
+            if not hits:
+                raise LookupError(f"kein Halt gefunden für '{query}'")
+            stop = snap.stop(hits[0][0])
+        ids = [stop.stop_id] + snap.children(stop.stop_id)
+        # Stationen (location_type 1) haben keine stop_times
+        return stop.stop_id, stop.stop_name, [i for i in ids if snap.stop(i).location_type != 1]
+
+    def ensure_cached(self, stop_ids: Iterable[str]) -> None:
+        """Baut alle noch fehlenden Halte in einem Scan über stop_times.txt."""
+        if self.compressed is not None:
+            return
+        missing = [
+            sid for sid in dict.fromkeys(stop_ids)
+            if sid not in self._scanned and not cache_db.has_cached_stop(self.con, sid)
+        ]
+        if missing:
+            cache_db.build_cache_for_stops(self.zip_path, self.con, missing)
+        self._scanned.update(missing)
+
+    def departures(self, req: BatchRequest, ids: List[str]) -> List[Departure]:
+        active = self.active_trip_route(req.service_date)
+        boards = []
+        for sid in ids:
+            if self.compressed is not None:
+                deps = self.compressed.next_departures(sid, active, req.limit, req.time_sec)
+            else:
+                deps = cache_db.get_next_departures_cached(self.con, sid, active, req.limit, req.time_sec)
+            boards.append([(parse_gtfs_time_to_seconds(dep.departure_time), dep) for dep in deps])
+        rows = list(merge(*boards, key=lambda x: x[0]))[:req.limit]
+        return [dep for _, dep in rows]
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _dep_dict(dep: Departure) -> dict:
+    return {
+        "departure_time": dep.departure_time,
+        "route_name": dep.route_name,
+        "headsign": dep.headsign,
+        "trip_id": dep.trip_id,
+        "route_id": dep.route_id,
+        "stop_sequence": dep.stop_sequence,
+    }
+
+
+def run_batch(
+    lines: Iterable[str],
+    out: TextIO,
+    fmt: str = "jsonl",
+    zip_path: str = GTFS_ZIP_PATH,
+    default_date: Optional[date] = None,
+    default_limit: int = DEFAULT_DEPARTURES_LIMIT,
+    db_path: str = CACHE_DB_PATH,
+    chunk_lines: int = BATCH_CHUNK_LINES,
+    snapshot_path: str = SNAPSHOT_PATH
+) -> int:
+    """
+    Verarbeitet die Anfragen blockweise: erst alle Halte eines Blocks
+    auflösen und fehlende gemeinsam bauen, dann die Ergebnisse in
+    Eingabereihenfolge schreiben. Rückgabe: Anzahl fehlerhafter Anfragen.
+    """
+    backend = BatchBackend(zip_path, db_path, snapshot_path)
+    d0 = default_date or today_date()
+    errors = 0
+
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+    for chunk in _chunks(lines, chunk_lines):
+        resolved = []
+        for line in chunk:
+            query = line.strip()
+            try:
+                req = parse_request(line, d0, default_limit)
+                if req is None:
+                    continue
+                query = req.query
+                resolved.append((query, req, backend.resolve(req.query), None))
+            except (ValueError, LookupError, KeyError) as e:
+                resolved.append((query, None, None, e))
+        backend.ensure_cached(sid for _, _, r, _ in resolved if r is not None for sid in r[2])
+
+        for query, req, r, err in resolved:
+            if err is not None:
+                errors += 1
+                if writer:
+                    writer.writerow({"query": query, "error": str(err)})
+                else:
+                    out.write(json.dumps({"query": query, "error": str(err)}, ensure_ascii=False) + "\n")
+                out.flush()
+                continue
+            sid, name, ids = r
+            _write_result(out, writer, req, sid, name, backend.departures(req, ids))
+
+    return errors
+
+
+def _write_result(out: TextIO, writer, req: BatchRequest, sid: str, name: str, deps: List[Departure]) -> None:
+    time_txt = f"{req.time_sec // 3600:02d}:{req.time_sec % 3600 // 60:02d}"
+    if writer:
+        for dep in deps:
+            writer.writerow({
+                "query": req.query, "stop_id": sid, "stop_name": name, "time": time_txt,
+                "departure_time": dep.departure_time, "route_name": dep.route_name,
+                "headsign": dep.headsign, "trip_id": dep.trip_id,
+            })
+    else:
+        out.write(json.dumps({
+            "query": req.query,
+            "stop_id": sid,
+            "stop_name": name,
+            "date": req.service_date.isoformat(),
+            "time": time_txt,
+            "departures": [_dep_dict(dep) for dep in deps],
+        }, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def _open_lines(path: str) -> Iterator[str]:
+    if path == "-":
+        yield from sys.stdin
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from f
+
+
+def run_cli(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main.py", description="GTFS Abfahrtsmonitor – Batch-Modus")
+    parser.add_argument("--batch", metavar="DATEI", default="-", help="Anfragedatei ('-' = stdin)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--datum", help="Standard-Datum YYYY-MM-DD (sonst heute)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_DEPARTURES_LIMIT)
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    parser.add_argument("--db", default=CACHE_DB_PATH)
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    args = parser.parse_args(argv)
+
+    d = date.fromisoformat(args.datum) if args.datum else None
+    errors = run_batch(_open_lines(args.batch), sys.stdout, args.format, args.zip, d, args.limit, args.db,
+                       snapshot_path=args.snapshot)
+    return 1 if errors else 0
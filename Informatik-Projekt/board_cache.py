@@ -0,0 +1,222 @@
+# board_cache.py
+
+"""
+board_cache.py
+
+Aufgabe:
+    Dieses Modul hält fertige Abfahrtstafeln im Speicher, damit beliebte
+    Tafeln (Anzeigen, Dashboard) nicht mehrmals pro Minute neu per SQL und
+    Python-Filter berechnet werden.
+
+Schlüssel:
+    (Halt oder Station, Betriebstag, Minuten-Bucket, Anzahl)
+
+Zentrale Aufgaben:
+    - LRU-Verdrängung unter einer Speichergrenze (geschätzte Bytes)
+    - Ablauf spätestens am Ende der Minute bzw. nach TTL
+    - Invalidierung, wenn eine Echtzeit-Meldung einen Trip der Tafel betrifft
+      (Rückwärtsindex trip_id -> Schlüssel)
+    - Zähler für Treffer, Fehlzugriffe, Verdrängungen, Invalidierungen
+
+Hinweise:
+    - Thread-sicher (Streamlit bedient mehrere Sitzungen in Threads).
+    - Rückgabe ist immer eine Kopie der Liste, Aufrufer dürfen sie verändern.
+    - Echtzeit: DelayHistory.subscribe(cache.on_realtime_update)
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import BOARD_CACHE_MAX_BYTES, BOARD_CACHE_TTL_SEC
+from models import Departure
+
+BoardKey = Tuple[str, date, int, int]
+
+ENTRY_OVERHEAD = 200  # Schlüssel, OrderedDict-Knoten, Index-Einträge (grob)
+
+
+@dataclass(frozen=True)
+class BoardCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    value: List[Departure]
+    size: int
+    expires_at: float
+    trip_ids: Set[str]
+
+
+def estimate_size(deps: List[Departure]) -> int:
+    """Grobe Speicherschätzung einer Tafel in Bytes."""
+    size = ENTRY_OVERHEAD + sys.getsizeof(deps)
+    for dep in deps:
+        size += sys.getsizeof(dep)
+        for f in fields(dep):
+            size += sys.getsizeof(getattr(dep, f.name))
+    return size
+
+
+class BoardCache:
+    """
+    In-Process-Cache für Abfahrtstafeln.
+
+        cache = BoardCache()
+        deps = cache.get_or_compute(stop_id, today_date(), now_seconds(), 12,
+                                    lambda: get_next_departures_cached(...))
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = BOARD_CACHE_MAX_BYTES,
+        ttl_sec: int = BOARD_CACHE_TTL_SEC,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[BoardKey, _Entry]" = OrderedDict()
+        self._by_trip: Dict[str, Set[BoardKey]] = {}
+        self._bytes = 0
+        self._minute = int(clock() // 60)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(stop_key: str, service_date: date, now_sec: int, limit: int) -> BoardKey:
+        return (stop_key, service_date, now_sec // 60, limit)
+
+    # ---------- intern (nur mit Lock aufrufen) ----------
+
+    def _remove(self, key: BoardKey) -> None:
+        e = self._entries.pop(key)
+        self._bytes -= e.size
+        for tid in e.trip_ids:
+            keys = self._by_trip.get(tid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_trip[tid]
+
+    def _expire(self, now: float) -> None:
+        # Einmal pro Minute alles Abgelaufene entfernen (alte Minuten-Buckets)
+        minute = int(now // 60)
+        if minute == self._minute:
+            return
+        self._minute = minute
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(key)
+            self.expirations += 1
+
+    # ---------- öffentlich ----------
+
+    def get(self, key: BoardKey) -> Optional[List[Departure]]:
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            e = self._entries.get(key)
+            if e is None:
+                self.misses += 1
+                return None
+            if e.expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(e.value)
+
+    def put(self, key: BoardKey, deps: List[Departure]) -> None:
+        now = self.clock()
+        size = estimate_size(deps)
+        if size > self.max_bytes:
+            return
+        # spätestens am Ende der aktuellen Minute ungültig
+        expires_at = min(now + self.ttl_sec, (int(now // 60) + 1) * 60)
+        trip_ids = {dep.trip_id for dep in deps}
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(list(deps), size, expires_at, trip_ids)
+            self._bytes += size
+            for tid in trip_ids:
+                self._by_trip.setdefault(tid, set()).add(key)
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        stop_key: str,
+        service_date: date,
+        now_sec: int,
+        limit: int,
+        compute: Callable[[], List[Departure]]
+    ) -> List[Departure]:
+        """Tafel aus dem Cache oder compute() aufrufen und speichern."""
+        key = self.key(stop_key, service_date, now_sec, limit)
+        deps = self.get(key)
+        if deps is None:
+            deps = list(compute())
+            self.put(key, deps)
+        return deps
+
+    def invalidate_trips(self, trip_ids: Iterable[str]) -> int:
+        """Entfernt alle Tafeln, die einen dieser Trips enthalten. Rückgabe: Anzahl."""
+        n = 0
+        with self._lock:
+            for tid in trip_ids:
+                for key in list(self._by_trip.get(tid, ())):
+                    self._remove(key)
+                    n += 1
+            self.invalidations += n
+        return n
+
+    def on_realtime_update(self, service_date: date, trip_ids: Set[str]) -> None:
+        """Callback für DelayHistory.subscribe."""
+        self.invalidate_trips(trip_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_trip.clear()
+            self._bytes = 0
+
+    def stats(self) -> BoardCacheStats:
+        with self._lock:
+            return BoardCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                invalidations=self.invalidations,
+                entries=len(self._entries),
+                bytes=self._bytes,
+            )
@@ -0,0 +1,240 @@
+# board_index.py
+
+"""
+board_index.py
+
+Aufgabe:
+    Dieses Modul materialisiert einmal pro Betriebstag alle an diesem Tag
+    aktiven Abfahrten als sortierte Arrays pro Halt. "Die nächsten N
+    Abfahrten ab jetzt" ist danach nur noch eine binäre Suche (bisect)
+    plus ein Slice – ohne SQL, ohne Kalender- oder Trip-Filter zur Abfragezeit.
+
+Datenquelle:
+    - kompilierter Tagesfahrplan (timetable.py), der bereits nur aktive
+      Trips enthält
+
+Zentrale Aufgaben:
+    - Aufbau der Tagesarrays (dep_sec, trip, route, headsign) pro stop_id
+    - Abfrage per bisect
+    - Hintergrund-Thread: Aufbau beim Start; der Index des Folgetags wird
+      BOARD_INDEX_PREBUILD_SEC vor Mitternacht gebaut und zum Tageswechsel
+      atomar eingetauscht
+
+Hinweise:
+    - Nach Mitternacht fahren noch Trips des Vortags (GTFS-Zeiten > 24:00:00).
+      Deshalb wird der Index des Vortags behalten und mit abgefragt.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import GTFS_ZIP_PATH, TIMETABLE_DIR, BOARD_INDEX_PREBUILD_SEC
+from models import Departure
+from timetable import Timetable, get_timetable
+from utils import format_seconds_hhmmss, now_seconds, today_date
+
+DAY_SEC = 24 * 3600
+
+
+class BoardIndex:
+    """
+    Abfahrten eines Betriebstags, sortiert nach (Halt, Abfahrtszeit).
+
+    stop_ptr[stop_idx]:stop_ptr[stop_idx+1] ist der Bereich eines Halts in
+    den Arrays dep_sec / trip / seq.
+    """
+
+    def __init__(self, service_date: date, tt: Timetable):
+        self.service_date = service_date
+        self.stop_index = tt.stop_index
+        self.trip_ids = tt.trip_ids
+        self.route_ids = tt.route_ids
+        self.route_names = tt.route_names
+        self.headsigns = tt.headsigns
+        self.trip_route = array("i", tt.trip_route.astype(np.int32).tobytes())
+        self.trip_headsign = array("i", tt.trip_headsign.astype(np.int32).tobytes())
+
+        # Letzter Halt eines Trips ist keine Abfahrt
+        n_ev = len(tt.ev_stop)
+        is_last = np.zeros(n_ev, dtype=bool)
+        if n_ev:
+            is_last[tt.trip_ptr[1:][np.diff(tt.trip_ptr) > 0] - 1] = True
+        keep = np.flatnonzero(~is_last)
+
+        order = keep[np.lexsort((tt.ev_dep[keep], tt.ev_stop[keep]))]
+        stop_sorted = tt.ev_stop[order]
+        ptr = np.zeros(tt.n_stops + 1, dtype=np.int64)
+        np.cumsum(np.bincount(stop_sorted, minlength=tt.n_stops), out=ptr[1:])
+
+        # array.array statt NumPy: bisect und Einzelzugriffe liefern direkt int
+        self.stop_ptr = array("q", ptr.tobytes())
+        self.dep_sec = array("i", tt.ev_dep[order].astype(np.int32).tobytes())
+        self.trip = array("i", tt.ev_trip[order].astype(np.int32).tobytes())
+        self.seq = array("i", tt.ev_seq[order].astype(np.int32).tobytes())
+
+    def __len__(self) -> int:
+        return len(self.dep_sec)
+
+    def next_departures(self, stop_id: str, after_sec: int, limit: int = 10) -> List[Departure]:
+        """
+        Nächste Abfahrten an stop_id ab after_sec (Sekunden ab Mitternacht
+        dieses Betriebstags).
+        """
+        return [dep for _, dep in self.next_departures_with_sec(stop_id, after_sec, limit)]
+
+    def next_departures_with_sec(self, stop_id: str, after_sec: int, limit: int = 10) -> List[Tuple[int, Departure]]:
+        si = self.stop_index.get(stop_id)
+        if si is None:
+            return []
+        lo = self.stop_ptr[si]
+        hi = self.stop_ptr[si + 1]
+        start = bisect_left(self.dep_sec, after_sec, lo, hi)
+
+        result: List[Tuple[int, Departure]] = []
+        for i in range(start, min(start + limit, hi)):
+            t = self.trip[i]
+            r = self.trip_route[t]
+            sec = self.dep_sec[i]
+            result.append((sec, Departure(
+                trip_id=self.trip_ids[t],
+                route_id=self.route_ids[r],
+                departure_time=format_seconds_hhmmss(sec),
+                stop_sequence=self.seq[i],
+                route_name=self.route_names[r],
+                headsign=self.headsigns[self.trip_headsign[t]],
+            )))
+        return result
+
+
+def build_board_index(zip_path: str, d: date, cache_dir: str = TIMETABLE_DIR) -> BoardIndex:
+    return BoardIndex(d, get_timetable(zip_path, d, cache_dir))
+
+
+def _seconds_until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+class BoardIndexManager:
+    """
+    Hält den Index des aktuellen (und des vorherigen) Betriebstags bereit.
+
+    Ein Daemon-Thread baut den Index beim Start und den des Folgetags schon
+    vor Mitternacht. Zum Tageswechsel wird nur noch umgehängt (im Thread oder
+    bei der ersten Abfrage des neuen Tags, was zuerst kommt); laufende Abfragen
+    arbeiten mit ihrer lokalen Referenz weiter.
+    """
+
+    def __init__(self, zip_path: str = GTFS_ZIP_PATH, cache_dir: str = TIMETABLE_DIR):
+        self.zip_path = zip_path
+        self.cache_dir = cache_dir
+        self._current: Optional[BoardIndex] = None
+        self._previous: Optional[BoardIndex] = None
+        self._next: Optional[BoardIndex] = None   # vorab gebauter Folgetag
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[BaseException] = None
+
+    def start(self) -> "BoardIndexManager":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="board-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _build_day(self, d: date) -> None:
+        new = build_board_index(self.zip_path, d, self.cache_dir)
+
+        yesterday = d - timedelta(days=1)
+        prev = self._current
+        if prev is None or prev.service_date != yesterday:
+            prev = self._previous
+        if prev is None or prev.service_date != yesterday:
+            try:
+                prev = build_board_index(self.zip_path, yesterday, self.cache_dir)
+            except Exception as e:  # Vortag ist nur ein Zusatz
+                self.last_error = e
+                prev = None
+
+        # atomarer Austausch
+        with self._lock:
+            self._previous, self._current = prev, new
+        self._ready.set()
+
+    def _rollover(self, d: date) -> bool:
+        """Vorab gebauten Index von d einhängen; False, wenn keiner bereitliegt."""
+        with self._lock:
+            new = self._next
+            if new is None or new.service_date != d:
+                return False
+            prev = self._current
+            if prev is not None and prev.service_date != d - timedelta(days=1):
+                prev = None
+            self._previous, self._current, self._next = prev, new, None
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            d = today_date()
+            current = self._current
+            if (current is None or current.service_date != d) and not self._rollover(d):
+                try:
+                    self._build_day(d)
+                except Exception as e:
+                    self.last_error = e
+                    self._stop.wait(60)
+                    continue
+
+            # Folgetag vor Mitternacht bauen, damit der Wechsel nur ein Umhängen ist
+            tomorrow = d + timedelta(days=1)
+            if self._next is None or self._next.service_date != tomorrow:
+                self._stop.wait(max(0.0, _seconds_until_midnight() - BOARD_INDEX_PREBUILD_SEC))
+                if self._stop.is_set() or today_date() != d:
+                    continue
+                try:
+                    self._next = build_board_index(self.zip_path, tomorrow, self.cache_dir)
+                except Exception as e:  # zum Tageswechsel wird dann direkt gebaut
+                    self.last_error = e
+            # bis kurz nach Mitternacht schlafen
+            self._stop.wait(_seconds_until_midnight() + 1)
+
+    def next_departures(self, stop_id: str, limit: int = 10, now_sec: Optional[int] = None) -> List[Departure]:
+        """
+        Nächste Abfahrten ab jetzt: Trips des Vortags (Zeiten > 24:00) und
+        des aktuellen Tags, zeitlich zusammengeführt.
+        """
+        nxt = self._next
+        if nxt is not None and nxt.service_date == today_date():
+            self._rollover(nxt.service_date)  # Tageswechsel vor dem Aufwachen des Threads
+        with self._lock:
+            current = self._current
+            previous = self._previous
+        if current is None:
+            return []
+
+        now = now_seconds() if now_sec is None else now_sec
+        rows = current.next_departures_with_sec(stop_id, now, limit)
+        if previous is not None and previous.service_date == current.service_date - timedelta(days=1):
+            # Vortags-Trips liegen 24 h "früher" als ihre GTFS-Uhrzeit
+            late = [(sec - DAY_SEC, dep) for sec, dep in previous.next_departures_with_sec(stop_id, now + DAY_SEC, limit)]
+            if late:
+                rows = list(merge(late, rows, key=lambda x: x[0]))[:limit]
+        return [dep for _, dep in rows]
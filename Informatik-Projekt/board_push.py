@@ -0,0 +1,598 @@
+# board_push.py
+
+"""
+board_push.py
+
+Aufgabe:
+    Dieses Modul schiebt Abfahrtstafeln an Anzeigen, statt sie pollen zu
+    lassen. Eine Anzeige abonniert einen Halt oder eine Station und bekommt
+    zuerst die ganze Tafel, danach nur noch kleine Änderungen (Diffs) per
+    Server-Sent Events.
+
+Zentrale Aufgaben:
+    - Eine Tafel (Thema) pro (Station, Anzahl), egal wie viele Anzeigen sie
+      abonniert haben: berechnet wird einmal, verteilt an alle
+    - Planer (ein Thread, Heap nach Fälligkeit): eine Tafel wird neu berechnet,
+      wenn ihre erste Abfahrt weg ist – oder sofort, wenn eine Echtzeit-Meldung
+      einen ihrer Trips betrifft (DelayHistory.subscribe, Rückwärtsindex
+      trip_id -> Tafeln)
+    - Diff: entfernte Zeilen (Schlüssel) und neue/geänderte Zeilen; ist nichts
+      anders, wird nichts gesendet
+    - SSE-Server (python board_push.py serve) mit kleiner Beispielanzeige
+
+Ereignisse (JSON):
+    {"type": "snapshot", "rev": 7, "rows": [Zeile, ...]}
+    {"type": "diff", "rev": 8, "remove": ["<trip_id>@<stop_id>", ...], "upsert": [Zeile, ...]}
+    Zeile: {"k": Schlüssel, "t": "HH:MM" Plan, "s": Sekunden inkl. Verspätung,
+            "d": Verspätung in Minuten, "l": Linie, "h": Ziel, "p": stop_id (Steig)}
+
+Hinweise:
+    - Der Aufwand hängt an den Änderungen der Tafeln, nicht an der Zahl der
+      Anzeigen: eine Änderung = eine Berechnung + ein Diff je Abonnent.
+    - Eine Tafel ohne Abfahrten wird spätestens nach PUSH_MAX_IDLE_SEC
+      (und zum Tageswechsel) neu geprüft.
+    - Ohne komprimierten Cache baut der PrewarmScheduler fehlende Steige
+      außerhalb der Hub-Sperre; bis dahin bekommen Abonnenten eine leere
+      Tafel, nach dem Aufbau kommt die ganze Tafel als Diff.
+    - Verspätete Züge, deren Planzeit schon vorbei ist, bleiben stehen, solange
+      Planzeit + Verspätung noch in der Zukunft liegt (Rückblick
+      PUSH_DELAY_LOOKBACK_SEC).
+    - Ohne Meldung für den Halt gilt die letzte frühere Meldung desselben Trips
+      (wie in vehicles.py: nach vorne durchreichen, nie über die Trip-Grenze).
+"""
+
+import bisect
+import heapq
+import itertools
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import cache_db
+from config import (
+    GTFS_ZIP_PATH,
+    CACHE_DB_PATH,
+    DEFAULT_DEPARTURES_LIMIT,
+    PUSH_HOST,
+    PUSH_PORT,
+    PUSH_MAX_IDLE_SEC,
+    PUSH_DELAY_LOOKBACK_SEC,
+    PUSH_KEEPALIVE_SEC,
+)
+from utils import now_seconds, parse_gtfs_time_to_seconds, today_date, format_seconds_hhmm
+
+TopicKey = Tuple[str, int]  # (stop_id, Anzahl)
+
+
+@dataclass(frozen=True)
+class BoardRow:
+    key: str            # "<trip_id>@<stop_id>"
+    trip_id: str
+    stop_id: str
+    sched_sec: int
+    delay_sec: int
+    route_name: str
+    headsign: str
+
+    @property
+    def eff_sec(self) -> int:
+        return self.sched_sec + self.delay_sec
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.key,
+            "t": format_seconds_hhmm(self.sched_sec),
+            "s": self.eff_sec,
+            "d": self.delay_sec // 60,
+            "l": self.route_name,
+            "h": self.headsign,
+            "p": self.stop_id,
+        }
+
+
+class TripDelays:
+    """
+    Verspätungen je Trip (DelayHistory.current_trip_delays). Eine Meldung gilt
+    für ihren Halt und alle späteren Halte des Trips, bis eine neue kommt.
+    """
+
+    def __init__(self, by_trip: Optional[Dict[str, List[Tuple[int, str, int]]]] = None):
+        self.by_trip = by_trip or {}
+        self._sched = {tid: [e[0] for e in events] for tid, events in self.by_trip.items()}
+
+    def __bool__(self) -> bool:
+        return bool(self.by_trip)
+
+    def get(self, trip_id: str, stop_id: str, sched_sec: int) -> int:
+        events = self.by_trip.get(trip_id)
+        if not events:
+            return 0
+        for _, sid, d in events:
+            if sid == stop_id:
+                return d
+        i = bisect.bisect_right(self._sched[trip_id], sched_sec)
+        return events[i - 1][2] if i else 0
+
+
+def diff_boards(old: List[BoardRow], new: List[BoardRow]) -> Tuple[List[str], List[BoardRow]]:
+    """(entfernte Schlüssel, neue oder geänderte Zeilen). Beides leer = keine Änderung."""
+    old_by_key = {r.key: r for r in old}
+    new_keys = {r.key for r in new}
+    removed = [r.key for r in old if r.key not in new_keys]
+    upsert = [r for r in new if old_by_key.get(r.key) != r]
+    return removed, upsert
+
+
+class BoardSource:
+    """
+    Berechnet Tafeln: komprimierter Feed-Cache, sonst stop_times_cache
+    (fehlende Steige baut der PrewarmScheduler, siehe pending/wait).
+    Stationen umfassen ihre Bahnsteige (Snapshot).
+    """
+
+    def __init__(self, zip_path: str = GTFS_ZIP_PATH, db_path: str = CACHE_DB_PATH):
+        from feed_snapshot import get_snapshot
+
+        self.zip_path = zip_path
+        self.db_path = db_path
+        self.snapshot = get_snapshot(zip_path)
+        self._lock = threading.Lock()
+        self._con = cache_db.connect(db_path, check_same_thread=False)
+        cache_db.init_db(self._con)
+        self.compressed = (
+            cache_db.CompressedStopTimes(self._con) if cache_db.has_compressed_cache(self._con) else None
+        )
+        self._active: Dict[date, Dict[str, str]] = {}
+        self.prewarm = None
+        if self.compressed is None:
+            from prewarm import PrewarmScheduler
+            self.prewarm = PrewarmScheduler(zip_path, db_path).start(prewarm=False)
+
+    def stop_ids(self, stop_id: str) -> List[str]:
+        return [stop_id] + self.snapshot.children(stop_id)
+
+    def pending(self, stop_ids: List[str]) -> List[str]:
+        """Steige, deren Cache noch gebaut wird (der Aufbau wird dabei angestoßen)."""
+        if self.prewarm is None:
+            return []
+        # Stationen (location_type 1) haben keine stop_times – sonst würde jedes Mal gescannt
+        return self.prewarm.request(
+            sid for sid in stop_ids if getattr(self.snapshot.stop(sid), "location_type", None) != 1
+        )
+
+    def wait(self, stop_ids: List[str]) -> bool:
+        """Blockiert, bis die Steige gebaut sind (ohne eine Sperre zu halten)."""
+        return self.prewarm is None or self.prewarm.wait(stop_ids)
+
+    def _active_trip_route(self, d: date) -> Dict[str, str]:
+        m = self._active.get(d)
+        if m is None:
+            m = self.snapshot.active_trip_route(d)
+            self._active = {d: m}  # nur der aktuelle Tag
+        return m
+
+    def _departures(self, stop_id: str, active: Dict[str, str], limit: int, after_sec: int):
+        if self.compressed is not None:
+            return self.compressed.next_departures(stop_id, active, limit, after_sec)
+        return cache_db.get_next_departures_cached(self._con, stop_id, active, limit, after_sec)
+
+    def rows(
+        self,
+        stop_ids: List[str],
+        limit: int,
+        d: date,
+        now_sec: int,
+        delays: TripDelays
+    ) -> List[BoardRow]:
+        """Tafel aus dem Cache; noch nicht gebaute Steige liefern (noch) nichts."""
+        with self._lock:
+            active = self._active_trip_route(d)
+            rows: Dict[str, BoardRow] = {}
+            for sid in stop_ids:
+                deps = self._departures(sid, active, limit, now_sec)
+                if delays:
+                    # verspätete Züge mit Planzeit in der Vergangenheit
+                    deps = self._departures(sid, active, limit * 20, now_sec - PUSH_DELAY_LOOKBACK_SEC) + deps
+                for dep in deps:
+                    sched = parse_gtfs_time_to_seconds(dep.departure_time)
+                    row = BoardRow(
+                        key=f"{dep.trip_id}@{sid}",
+                        trip_id=dep.trip_id,
+                        stop_id=sid,
+                        sched_sec=sched,
+                        delay_sec=delays.get(dep.trip_id, sid, sched),
+                        route_name=dep.route_name or "",
+                        headsign=dep.headsign or "",
+                    )
+                    if row.eff_sec >= now_sec:
+                        rows[row.key] = row
+        return sorted(rows.values(), key=lambda r: (r.eff_sec, r.key))[:limit]
+
+
+class Subscription:
+    """Ein Abonnent: Warteschlange mit Ereignissen (dicts)."""
+
+    def __init__(self, topic: TopicKey):
+        self.topic = topic
+        self.queue: "queue.Queue[dict]" = queue.Queue()
+
+
+@dataclass
+class _Topic:
+    key: TopicKey
+    stop_ids: List[str]
+    rows: List[BoardRow] = field(default_factory=list)
+    rev: int = 0
+    due: float = 0.0
+    subs: Set[Subscription] = field(default_factory=set)
+
+
+@dataclass(frozen=True)
+class PushStats:
+    topics: int
+    subscribers: int
+    recomputes: int
+    diffs: int
+    unchanged: int
+    events_sent: int
+    realtime_updates: int
+
+
+class BoardHub:
+    """
+    Abonnements und Planer.
+
+        hub = BoardHub(BoardSource()).start()
+        sub = hub.subscribe("de:08222:2417", 12)
+        event = sub.queue.get()          # zuerst "snapshot", danach "diff"
+        hub.unsubscribe(sub)
+
+    clock() liefert (Betriebstag, Sekunden ab Mitternacht); speed > 1 lässt die
+    Zeit für Simulationen schneller laufen (Wartezeiten werden geteilt).
+    """
+
+    def __init__(
+        self,
+        source: BoardSource,
+        history=None,
+        clock: Optional[Callable[[], Tuple[date, int]]] = None,
+        speed: float = 1.0
+    ):
+        self.source = source
+        self.clock = clock or (lambda: (today_date(), now_seconds()))
+        self.speed = speed
+        self._lock = threading.Condition()
+        self._topics: Dict[TopicKey, _Topic] = {}
+        self._by_trip: Dict[str, Set[TopicKey]] = {}
+        self._heap: List[Tuple[float, int, TopicKey]] = []
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._day: Optional[date] = None
+        self._history = history
+        self._delays = TripDelays()
+        self._delays_day: Optional[date] = None
+        self._recomputes = 0
+        self._diffs = 0
+        self._unchanged = 0
+        self._events = 0
+        self._realtime = 0
+        if history is not None:
+            history.subscribe(self.on_realtime_update)
+
+    def start(self) -> "BoardHub":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="board-push", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+
+    # --- Abonnements ---
+
+    def subscribe(self, stop_id: str, limit: int = DEFAULT_DEPARTURES_LIMIT) -> Subscription:
+        key = (stop_id, limit)
+        sub = Subscription(key)
+        stop_ids = self.source.stop_ids(stop_id)
+        pending = self.source.pending(stop_ids) if key not in self._topics else []
+        with self._lock:
+            topic = self._topics.get(key)
+            if topic is None:
+                topic = _Topic(key, stop_ids)
+                self._topics[key] = topic
+                if pending:
+                    # Cache-Aufbau läuft ohne Hub-Sperre; danach veröffentlicht der Planer die Tafel
+                    threading.Thread(target=self._await_build, args=(key, pending), daemon=True).start()
+                else:
+                    self._recompute(topic)
+            topic.subs.add(sub)
+            self._send(sub, {"type": "snapshot", "rev": topic.rev, "rows": [r.to_dict() for r in topic.rows]})
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            topic = self._topics.get(sub.topic)
+            if topic is None:
+                return
+            topic.subs.discard(sub)
+            if not topic.subs:
+                self._index(topic, [])
+                del self._topics[sub.topic]  # Heap-Einträge laufen ins Leere
+
+    def on_realtime_update(self, service_date: date, trip_ids) -> None:
+        """Für DelayHistory.subscribe: betroffene Tafeln sofort neu berechnen."""
+        with self._lock:
+            self._realtime += 1
+            self._delays_day = None  # beim nächsten Berechnen neu laden
+            d, now = self.clock()
+            keys: Set[TopicKey] = set()
+            for tid in trip_ids:
+                keys |= self._by_trip.get(tid, set())
+            for key in keys:
+                self._schedule(self._topics[key], now)
+            if keys:
+                self._lock.notify()
+
+    def _await_build(self, key: TopicKey, stop_ids: List[str]) -> None:
+        self.source.wait(stop_ids)
+        with self._lock:
+            topic = self._topics.get(key)
+            if topic is not None:
+                self._schedule(topic, self.clock()[1])
+                self._lock.notify()
+
+    # --- intern (alles unter self._lock) ---
+
+    def _send(self, sub: Subscription, event: dict) -> None:
+        sub.queue.put(event)
+        self._events += 1
+
+    def _index(self, topic: _Topic, rows: List[BoardRow]) -> None:
+        for r in topic.rows:
+            keys = self._by_trip.get(r.trip_id)
+            if keys is not None:
+                keys.discard(topic.key)
+                if not keys:
+                    del self._by_trip[r.trip_id]
+        for r in rows:
+            self._by_trip.setdefault(r.trip_id, set()).add(topic.key)
+
+    def _schedule(self, topic: _Topic, due: float) -> None:
+        topic.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), topic.key))
+
+    def _current_delays(self, d: date) -> TripDelays:
+        if self._history is None:
+            return self._delays
+        if self._delays_day != d:
+            self._delays = TripDelays(self._history.current_trip_delays(d))
+            self._delays_day = d
+        return self._delays
+
+    def _recompute(self, topic: _Topic) -> Optional[dict]:
+        """Tafel neu berechnen, nächste Fälligkeit planen; Rückgabe: Diff-Ereignis oder None."""
+        d, now = self.clock()
+        rows = self.source.rows(topic.stop_ids, topic.key[1], d, now, self._current_delays(d))
+        self._recomputes += 1
+
+        removed, upsert = diff_boards(topic.rows, rows)
+        event = None
+        if removed or upsert or topic.rev == 0:
+            topic.rev += 1
+            event = {"type": "diff", "rev": topic.rev, "remove": removed, "upsert": [r.to_dict() for r in upsert]}
+        self._index(topic, rows)
+        topic.rows = rows
+
+        # fällig, sobald die erste Abfahrt weg ist; sonst ändert sich die Tafel nur
+        # durch Echtzeit (on_realtime_update) oder den Tageswechsel
+        self._schedule(topic, rows[0].eff_sec + 1 if rows else now + PUSH_MAX_IDLE_SEC)
+        return event
+
+    def _run(self) -> None:
+        with self._lock:
+            while not self._stop.is_set():
+                d, now = self.clock()
+                if self._day is not None and d != self._day:
+                    # Tageswechsel: alle Tafeln neu, Uhrzeit beginnt bei 0
+                    for topic in self._topics.values():
+                        self._schedule(topic, now)
+                self._day = d
+
+                if not self._heap:
+                    self._lock.wait(PUSH_MAX_IDLE_SEC / self.speed)
+                    continue
+                due, _, key = self._heap[0]
+                if due > now:
+                    self._lock.wait(min(due - now, PUSH_MAX_IDLE_SEC) / self.speed)
+                    continue
+                heapq.heappop(self._heap)
+                topic = self._topics.get(key)
+                if topic is None or topic.due != due:
+                    continue  # abgemeldet oder neu geplant
+
+                event = self._recompute(topic)
+                if event is None:
+                    self._unchanged += 1
+                    continue
+                self._diffs += 1
+                for sub in topic.subs:
+                    self._send(sub, event)
+
+    def stats(self) -> PushStats:
+        with self._lock:
+            return PushStats(
+                topics=len(self._topics),
+                subscribers=sum(len(t.subs) for t in self._topics.values()),
+                recomputes=self._recomputes,
+                diffs=self._diffs,
+                unchanged=self._unchanged,
+                events_sent=self._events,
+                realtime_updates=self._realtime,
+            )
+
+
+# ---------------------------
+# SSE-Server
+# ---------------------------
+
+DISPLAY_PAGE = """<!doctype html>
+<meta charset="utf-8"><title>Abfahrten</title>
+<style>body{font-family:sans-serif;background:#003;color:#fff}td{padding:2px 10px}.late{color:#f80}</style>
+<h2 id="title"></h2><table id="board"></table>
+<script>
+var q = new URLSearchParams(location.search), rows = {};
+document.getElementById("title").textContent = q.get("stop_id") || "";
+function render() {
+  var list = Object.values(rows).sort(function(a, b) { return a.s - b.s || (a.k < b.k ? -1 : 1); });
+  document.getElementById("board").innerHTML = list.map(function(r) {
+    var d = r.d > 0 ? ' <span class="late">+' + r.d + '</span>' : "";
+    return "<tr><td>" + r.t + d + "</td><td>" + r.l + "</td><td>" + r.h + "</td><td>" + r.p + "</td></tr>";
+  }).join("");
+}
+var es = new EventSource("/subscribe?" + q.toString());
+es.addEventListener("snapshot", function(e) {
+  rows = {}; JSON.parse(e.data).rows.forEach(function(r) { rows[r.k] = r; }); render();
+});
+es.addEventListener("diff", function(e) {
+  var m = JSON.parse(e.data);
+  m.remove.forEach(function(k) { delete rows[k]; });
+  m.upsert.forEach(function(r) { rows[r.k] = r; });
+  render();
+});
+</script>
+"""
+
+
+def serve_push(hub: BoardHub, host: str = PUSH_HOST, port: int = PUSH_PORT) -> None:
+    """
+    GET /subscribe?stop_id=...&limit=...   Server-Sent Events (snapshot, dann diff)
+    GET /stats                             Zähler als JSON
+    GET /anzeige?stop_id=...               Beispielanzeige im Browser
+    Eine Verbindung = ein Thread, der auf seiner Warteschlange blockiert.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_body(self, body: bytes, content_type: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/stats":
+                self._send_body(json.dumps(hub.stats().__dict__).encode("utf-8"), "application/json")
+                return
+            if url.path == "/anzeige":
+                self._send_body(DISPLAY_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+                return
+            if url.path != "/subscribe" or not q.get("stop_id"):
+                self.send_error(404)
+                return
+
+            limit = int(q.get("limit") or DEFAULT_DEPARTURES_LIMIT)
+            sub = hub.subscribe(q["stop_id"], limit)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            try:
+                while True:
+                    try:
+                        event = sub.queue.get(timeout=PUSH_KEEPALIVE_SEC)
+                    except queue.Empty:
+                        self.wfile.write(b": ping\n\n")  # hält Proxys und die Verbindung offen
+                    else:
+                        data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+                        self.wfile.write(f"id: {event['rev']}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                hub.unsubscribe(sub)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    print(f"Push-Server läuft: http://{host}:{port}/subscribe?stop_id=...  (Anzeige: /anzeige?stop_id=...)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        hub.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Abfahrtstafeln per Server-Sent Events (nur Änderungen)")
+    sub_p = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub_p.add_parser("serve", help="SSE-Server starten")
+    p_serve.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_serve.add_argument("--db", default=CACHE_DB_PATH)
+    p_serve.add_argument("--port", type=int, default=PUSH_PORT)
+    p_serve.add_argument("--verspaetungen", help="Verzeichnis der Verspätungshistorie (delay_history.py)")
+    p_sim = sub_p.add_parser("sim", help="viele Anzeigen im Prozess simulieren (schnellere Uhr)")
+    p_sim.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_sim.add_argument("--db", default=CACHE_DB_PATH)
+    p_sim.add_argument("--anzeigen", type=int, default=1000)
+    p_sim.add_argument("--stationen", type=int, default=50)
+    p_sim.add_argument("--minuten", type=int, default=30, help="simulierte Minuten")
+    p_sim.add_argument("--tempo", type=float, default=60.0, help="simulierte Sekunden pro echter Sekunde")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        history = None
+        if args.verspaetungen:
+            from delay_history import DelayHistory
+            history = DelayHistory(args.verspaetungen)
+            history.watch()  # Datensätze des schreibenden Prozesses nachlesen
+        serve_push(BoardHub(BoardSource(args.zip, args.db), history).start(), port=args.port)
+
+    else:
+        source = BoardSource(args.zip, args.db)
+        snap = source.snapshot
+        stations = [snap.stop_id[i] for i in range(snap.n_stops) if int(snap.stop_parent[i]) < 0]
+        random.seed(1)
+        chosen = random.sample(stations, min(args.stationen, len(stations)))
+
+        start_real = time.time()
+        start_day, start_sec = today_date(), now_seconds()
+
+        def sim_clock() -> Tuple[date, int]:
+            return start_day, min(start_sec + int((time.time() - start_real) * args.tempo), 24 * 3600 - 1)
+
+        hub = BoardHub(source, clock=sim_clock, speed=args.tempo)
+        t0 = time.time()
+        subs = [hub.subscribe(random.choice(chosen)) for _ in range(args.anzeigen)]
+        print(f"{args.anzeigen} Anzeigen auf {len(chosen)} Stationen abonniert in {time.time() - t0:.2f}s")
+        hub.start()
+        time.sleep(args.minuten * 60 / args.tempo)
+        hub.stop()
+
+        s = hub.stats()
+        polls = args.anzeigen * args.minuten * 2  # Vergleich: jede Anzeige pollt alle 30 s
+        print(f"{args.minuten} simulierte Minuten: {s.recomputes} Tafel-Berechnungen "
+              f"({s.diffs} mit Änderung, {s.unchanged} ohne), {s.events_sent} Ereignisse verschickt")
+        print(f"Zum Vergleich Polling alle 30 s: {polls} Tafel-Abfragen")
+        sizes = [len(json.dumps(e)) for e in list(subs[0].queue.queue)]
+        if sizes:
+            print(f"Anzeige 1: {len(sizes)} Ereignisse, Snapshot {sizes[0]} Bytes, Diffs im Mittel "
+                  f"{sum(sizes[1:]) / max(len(sizes) - 1, 1):.0f} Bytes")
@@ -15,40 +15,56 @@ Verwendete Technologien:
 Zentrale Aufgaben:
     - Aufbau eines Caches pro stop_id
     - Persistente Speicherung zwischen Programmläufen
-    - Schnelle Abfrage von Abfahrten nach Zeit
+    - Schnelle Abfrage von Abfahrten und Ankünften nach Zeit
 
 Hinweise:
     - Beim ersten Zugriff auf eine Haltestelle wird ein vollständiger Scan durchgeführt.
+      Die Zeilen eines Halts erscheinen erst, wenn der Scan fertig ist.
     - Folgezugriffe sind deutlich schneller.
+    - Ankunftszeiten stehen neben den Abfahrtszeiten (eigener Index). Am ersten
+      Halt eines Trips ist arrival_sec NULL – dort kommt nichts an; am letzten
+      ist departure_sec NULL – dort fährt nichts mehr ab.
+    - Caches einer älteren Version (ohne Ankunftsspalten oder mit Pflicht-
+      Abfahrtszeit) werden beim Öffnen verworfen und beim nächsten Zugriff
+      pro Halt neu aufgebaut.
 """
 
 import sqlite3
-from typing import Dict, List, Tuple, Set
+from typing import Callable, Dict, List, Optional, Tuple, Set
 
 from gtfs_zip import iter_rows
 from utils import parse_gtfs_time_to_seconds, now_seconds
-from models import Departure
+from models import Arrival, Departure
 
-def connect(db_path: str) -> sqlite3.Connection:
-    con = sqlite3.connect(db_path)
+def connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    con = sqlite3.connect(db_path, check_same_thread=check_same_thread)
     con.execute("PRAGMA journal_mode=WAL;")
     con.execute("PRAGMA synchronous=NORMAL;")
     return con
 
 def init_db(con: sqlite3.Connection) -> None:
+    old = {r[1]: r[3] for r in con.execute("PRAGMA table_info(stop_times_cache);")}  # Spalte -> NOT NULL
+    if old and ("arrival_sec" not in old or old.get("departure_sec")):
+        # Cache einer älteren Version (ohne Ankünfte bzw. mit Abfahrt am Endhalt):
+        # verwerfen, has_cached_stop ist danach False -> Neuaufbau beim nächsten Zugriff
+        con.execute("DROP TABLE stop_times_cache;")
     con.execute("""
     CREATE TABLE IF NOT EXISTS stop_times_cache (
     stop_id TEXT NOT NULL,
     trip_id TEXT NOT NULL,
-    departure_time TEXT NOT NULL,
-    departure_sec INTEGER NOT NULL,
+    departure_time TEXT,
+    departure_sec INTEGER,
     stop_sequence INTEGER NOT NULL,
 
     route_name TEXT,
-    headsign TEXT
+    headsign TEXT,
+
+    arrival_time TEXT,
+    arrival_sec INTEGER
 );
     """)
     con.execute("CREATE INDEX IF NOT EXISTS idx_stop_depsec ON stop_times_cache(stop_id, departure_sec);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_stop_arrsec ON stop_times_cache(stop_id, arrival_sec);")
     con.execute("CREATE INDEX IF NOT EXISTS idx_stop_trip ON stop_times_cache(stop_id, trip_id);")
     con.commit()
 
@@ -56,15 +72,154 @@ def has_cached_stop(con: sqlite3.Connection, stop_id: str) -> bool:
     cur = con.execute("SELECT 1 FROM stop_times_cache WHERE stop_id=? LIMIT 1;", (stop_id,))
     return cur.fetchone() is not None
 
+INSERT_CACHE_SQL = (
+    "INSERT INTO {table}"
+    "(stop_id,trip_id,departure_time,departure_sec,stop_sequence,route_name,headsign,arrival_time,arrival_sec) "
+    "VALUES (?,?,?,?,?,?,?,?,?);"
+)
+
+# Neu gebaute Halte landen erst hier (pro Verbindung, unsichtbar für andere)
+# und werden am Ende in EINER Transaktion nach stop_times_cache übernommen.
+STAGING_TABLE = "temp.stop_times_staging"
+
+def insert_cache_rows(con: sqlite3.Connection, rows: List[Tuple], table: str = "stop_times_cache") -> None:
+    if rows:
+        con.executemany(INSERT_CACHE_SQL.format(table=table), rows)
+        con.commit()
+
+def make_cache_row(
+    row: Dict[str, str],
+    trips: Dict[str, Dict[str, str]],
+    routes: Dict[str, Dict[str, str]]
+) -> Optional[Tuple[str, str, str, int, int, str, str, str, int]]:
+    """
+    Wandelt eine Zeile aus stop_times.txt in eine Zeile für stop_times_cache um
+    (inkl. Liniennamen, Ziel und Ankunftszeit). None, falls die Zeile unvollständig ist.
+    Fehlt arrival_time, gilt die Abfahrtszeit.
+    """
+    stop_id = (row.get("stop_id") or "").strip()
+    trip_id = (row.get("trip_id") or "").strip()
+    dep_time = (row.get("departure_time") or "").strip()
+    arr_time = (row.get("arrival_time") or "").strip() or dep_time
+    seq = (row.get("stop_sequence") or "").strip()
+    if not stop_id or not trip_id or not dep_time or not seq.isdigit():
+        return None
+
+    dep_sec = parse_gtfs_time_to_seconds(dep_time)
+    trip = trips.get(trip_id, {})
+    route_id = trip.get("route_id")
+    route = routes.get(route_id, {})
+
+    route_name = (
+        route.get("route_short_name")
+        or route.get("route_long_name")
+        or route_id
+)
+
+    headsign = trip.get("trip_headsign")
+
+    return (
+        stop_id,
+        trip_id,
+        dep_time,
+        dep_sec,
+        int(seq),
+        route_name or "",
+        headsign or "",
+        arr_time,
+        parse_gtfs_time_to_seconds(arr_time)
+)
+
+def track_first_stop(row: Dict[str, str], first_stop: Dict[str, Tuple[int, str]]) -> None:
+    """Merkt sich pro Trip den Halt mit der kleinsten stop_sequence (Reihenfolge in der Datei egal)."""
+    trip_id = (row.get("trip_id") or "").strip()
+    seq = (row.get("stop_sequence") or "").strip()
+    if not trip_id or not seq.isdigit():
+        return
+    seq_i = int(seq)
+    known = first_stop.get(trip_id)
+    if known is None or seq_i < known[0]:
+        first_stop[trip_id] = (seq_i, (row.get("stop_id") or "").strip())
+
+def track_last_stop(row: Dict[str, str], last_stop: Dict[str, Tuple[int, str]]) -> None:
+    """Merkt sich pro Trip den Halt mit der größten stop_sequence (Reihenfolge in der Datei egal)."""
+    trip_id = (row.get("trip_id") or "").strip()
+    seq = (row.get("stop_sequence") or "").strip()
+    if not trip_id or not seq.isdigit():
+        return
+    seq_i = int(seq)
+    known = last_stop.get(trip_id)
+    if known is None or seq_i > known[0]:
+        last_stop[trip_id] = (seq_i, (row.get("stop_id") or "").strip())
+
+def clear_terminal_departures(
+    con: sqlite3.Connection,
+    last_stop: Dict[str, Tuple[int, str]],
+    stop_ids: Set[str],
+    table: str = "stop_times_cache"
+) -> None:
+    """
+    Am letzten Halt eines Trips fährt nichts ab: dort departure_* = NULL,
+    damit der Trip weder auf der Abfahrtstafel noch als Anschluss erscheint.
+    Nur für stop_ids im Cache.
+    """
+    con.executemany(
+        f"UPDATE {table} SET departure_time=NULL, departure_sec=NULL "
+        "WHERE stop_id=? AND trip_id=? AND stop_sequence=?;",
+        ((sid, tid, seq) for tid, (seq, sid) in last_stop.items() if sid in stop_ids)
+    )
+    con.commit()
+
+def clear_origin_arrivals(
+    con: sqlite3.Connection,
+    first_stop: Dict[str, Tuple[int, str]],
+    stop_ids: Set[str],
+    table: str = "stop_times_cache"
+) -> None:
+    """
+    Am ersten Halt eines Trips kommt nichts an: dort arrival_* = NULL,
+    damit der Trip nicht auf der Ankunftstafel steht. Nur für stop_ids im Cache.
+    """
+    con.executemany(
+        f"UPDATE {table} SET arrival_time=NULL, arrival_sec=NULL "
+        "WHERE stop_id=? AND trip_id=? AND stop_sequence=?;",
+        ((sid, tid, seq) for tid, (seq, sid) in first_stop.items() if sid in stop_ids)
+    )
+    con.commit()
+
 def build_cache_for_stop(zip_path: str, con: sqlite3.Connection, stop_id: str) -> int:
     """
     Scannt EINMAL die riesige stop_times.txt und speichert NUR Zeilen für stop_id.
     Das dauert beim ersten Mal ein bisschen, danach ist es schnell.
     """
-    con.execute("DELETE FROM stop_times_cache WHERE stop_id=?;", (stop_id,))
+    return build_cache_for_stops(zip_path, con, [stop_id])[stop_id]
+
+def build_cache_for_stops(
+    zip_path: str,
+    con: sqlite3.Connection,
+    stop_ids: List[str],
+    progress: Optional[Callable[[int], None]] = None,
+    progress_every: int = 200_000
+) -> Dict[str, int]:
+    """
+    Wie build_cache_for_stop, aber für mehrere Halte in EINEM Scan.
+    progress(rows_scanned) wird alle progress_every Zeilen aufgerufen.
+    Rückgabe: stop_id -> Anzahl gespeicherter Zeilen.
+
+    Die Zeilen werden in STAGING_TABLE gesammelt und erst nach dem Scan
+    ausgetauscht: andere Leser sehen den Halt vorher gar nicht (bzw. im alten
+    Stand) und nie halb gebaut.
+    """
+    wanted: Set[str] = set(stop_ids)
+    counts: Dict[str, int] = {sid: 0 for sid in wanted}
+
+    con.execute(f"CREATE TABLE IF NOT EXISTS {STAGING_TABLE} AS SELECT * FROM stop_times_cache WHERE 0;")
+    con.execute(f"DELETE FROM {STAGING_TABLE};")
     con.commit()
 
-    rows_to_insert: List[Tuple[str, str, str, int, int]] = []
+    rows_to_insert: List[Tuple[str, str, str, int, int, str, str, str, int]] = []
+    first_stop: Dict[str, Tuple[int, str]] = {}
+    last_stop: Dict[str, Tuple[int, str]] = {}
     trips = {
     r["trip_id"]: r
     for r in iter_rows(zip_path, "trips.txt")
@@ -74,73 +229,56 @@ def build_cache_for_stop(zip_path: str, con: sqlite3.Connection, stop_id: str) -
     r["route_id"]: r
     for r in iter_rows(zip_path, "routes.txt")
 }
-    
-    count = 0
+
+    scanned = 0
 
     for row in iter_rows(zip_path, "stop_times.txt"):
+        scanned += 1
+        if progress is not None and scanned % progress_every == 0:
+            progress(scanned)
+
+        track_first_stop(row, first_stop)
+        track_last_stop(row, last_stop)
         sid = (row.get("stop_id") or "").strip()
-        if sid != stop_id:
+        if sid not in wanted:
             continue
 
-        trip_id = (row.get("trip_id") or "").strip()
-        dep_time = (row.get("departure_time") or "").strip()
-        seq = (row.get("stop_sequence") or "").strip()
-        if not trip_id or not dep_time or not seq.isdigit():
+        cache_row = make_cache_row(row, trips, routes)
+        if cache_row is None:
             continue
-
-        dep_sec = parse_gtfs_time_to_seconds(dep_time)
-        trip = trips.get(trip_id, {})
-        route_id = trip.get("route_id")
-        route = routes.get(route_id, {})
-
-        route_name = (
-            route.get("route_short_name")
-            or route.get("route_long_name")
-            or route_id
-)
-
-        headsign = trip.get("trip_headsign")
-
-        rows_to_insert.append((
-            stop_id,
-            trip_id,
-            dep_time,
-            dep_sec,
-            int(seq),
-            route_name or "",
-            headsign or ""
-))
-        count += 1
+        rows_to_insert.append(cache_row)
+        counts[sid] += 1
 
         # Batch insert, damit’s nicht langsam ist
         if len(rows_to_insert) >= 5000:
-            con.executemany(
-                "INSERT INTO stop_times_cache(stop_id,trip_id,departure_time,departure_sec,stop_sequence,route_name,headsign)) VALUES (?,?,?,?,?,?,?);",
-                rows_to_insert
-            )
-            con.commit()
+            insert_cache_rows(con, rows_to_insert, STAGING_TABLE)
             rows_to_insert.clear()
 
-    if rows_to_insert:
-        con.executemany(
-            "INSERT INTO stop_times_cache(stop_id,trip_id,departure_time,departure_sec,stop_sequence,route_name,headsign) VALUES (?,?,?,?,?,?,?);",
-            rows_to_insert
-        )
-        con.commit()
+    insert_cache_rows(con, rows_to_insert, STAGING_TABLE)
+    clear_origin_arrivals(con, first_stop, wanted, STAGING_TABLE)
+    clear_terminal_departures(con, last_stop, wanted, STAGING_TABLE)
 
-    return count
+    with con:  # eine Transaktion: alter Stand raus, neuer rein
+        con.executemany("DELETE FROM stop_times_cache WHERE stop_id=?;", [(sid,) for sid in wanted])
+        con.execute(f"INSERT INTO stop_times_cache SELECT * FROM {STAGING_TABLE};")
+        con.execute(f"DELETE FROM {STAGING_TABLE};")
+    if progress is not None:
+        progress(scanned)
+
+    return counts
 
 def get_next_departures_cached(
     con: sqlite3.Connection,
     stop_id: str,
     active_trip_route: Dict[str, str],
-    limit: int = 10
+    limit: int = 10,
+    after_sec: Optional[int] = None
 ) -> List[Departure]:
     """
-    Holt nächste Abfahrten ab 'jetzt' aus dem Cache.
+    Holt nächste Abfahrten ab 'jetzt' (oder ab after_sec) aus dem Cache.
     Filtert gleichzeitig auf heute aktive trip_ids.
     """
-    now_sec = now_seconds()
+    now_sec = now_seconds() if after_sec is None else after_sec
 
     # Wir holen erstmal mehr als limit, weil wir danach nach active trips filtern.
     cur = con.execute(
@@ -178,6 +316,89 @@ def get_next_departures_cached(
 
     return result
 
+def get_next_arrivals_cached(
+    con: sqlite3.Connection,
+    stop_id: str,
+    active_trip_route: Dict[str, str],
+    limit: int = 10,
+    after_sec: Optional[int] = None
+) -> List[Arrival]:
+    """
+    Gegenstück zu get_next_departures_cached: nächste Ankünfte ab 'jetzt'
+    (oder ab after_sec). Trips, die hier beginnen, fehlen (arrival_sec NULL).
+    """
+    now_sec = now_seconds() if after_sec is None else after_sec
+
+    cur = con.execute(
+    """
+    SELECT
+        trip_id,
+        arrival_time,
+        stop_sequence,
+        route_name,
+        headsign
+    FROM stop_times_cache
+    WHERE stop_id=?
+      AND arrival_sec>=?
+    ORDER BY arrival_sec ASC
+    LIMIT ?;
+    """,
+    (stop_id, now_sec, limit * 20)
+)
+    result: List[Arrival] = []
+    for trip_id, arr_time, seq, route_name, headsign in cur.fetchall():
+        route_id = active_trip_route.get(trip_id)
+        if not route_id:
+            continue
+        result.append(
+            Arrival(
+                trip_id=trip_id,
+                route_id=route_id,
+                arrival_time=arr_time,
+                stop_sequence=seq,
+                route_name=route_name,
+                headsign=headsign))
+        if len(result) >= limit:
+            break
+
+    return result
+
+def get_arrival_sec_cached(con: sqlite3.Connection, stop_id: str, trip_id: str) -> Optional[int]:
+    """Planmäßige Ankunft eines Trips am Halt (None: hält hier nicht oder beginnt hier)."""
+    row = con.execute(
+        "SELECT arrival_sec FROM stop_times_cache WHERE stop_id=? AND trip_id=? ORDER BY stop_sequence DESC LIMIT 1;",
+        (stop_id, trip_id)
+    ).fetchone()
+    return None if row is None else row[0]
+
+def get_departures_between_cached(
+    con: sqlite3.Connection,
+    stop_id: str,
+    active_trip_route: Dict[str, str],
+    from_sec: int,
+    to_sec: int
+) -> List[Tuple[int, Departure]]:
+    """
+    Alle aktiven Abfahrten am Halt mit from_sec <= Abfahrt <= to_sec
+    (Bereichsabfrage über idx_stop_depsec). Rückgabe: [(Sekunden, Departure), ...]
+    """
+    cur = con.execute(
+    """
+    SELECT trip_id, departure_time, departure_sec, stop_sequence, route_name, headsign
+    FROM stop_times_cache
+    WHERE stop_id=?
+      AND departure_sec BETWEEN ? AND ?
+    ORDER BY departure_sec ASC;
+    """,
+    (stop_id, from_sec, to_sec)
+)
+    result: List[Tuple[int, Departure]] = []
+    for trip_id, dep_time, dep_sec, seq, route_name, headsign in cur:
+        route_id = active_trip_route.get(trip_id)
+        if route_id:
+            result.append((dep_sec, Departure(trip_id, route_id, dep_time, seq, route_name, headsign)))
+    return result
+
 def trip_stop_sequence(zip_path: str, trip_id: str) -> List[Tuple[int, str]]:
     """
     Für die Karte: Stop-Reihenfolge eines trips (Stop-IDs).
@@ -194,4 +415,431 @@ def trip_stop_sequence(zip_path: str, trip_id: str) -> List[Tuple[int, str]]:
         if stop_id and sseq.isdigit():
             seq.append((int(sseq), stop_id))
     seq.sort(key=lambda x: x[0])
-    return seq
\ No newline at end of file
+    return seq
+
+# ---------------------------
+# Komprimierte Form: Haltemuster + Fahrzeit-Vorlagen
+# ---------------------------
+#
+# Die meisten Trips einer Linie haben dieselbe Halte-Folge (Muster) und
+# dieselben relativen Fahrzeiten (Vorlage), nur mit anderer Startzeit.
+# Gespeichert wird daher pro Trip nur (Muster, Vorlage, Startzeit);
+# Zeilen von stop_times entstehen erst bei Bedarf (expand_trip).
+
+def init_compressed_db(con: sqlite3.Connection) -> None:
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS cmp_pattern_stops (
+    pattern_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    stop_id TEXT NOT NULL,
+    stop_sequence INTEGER NOT NULL,
+    PRIMARY KEY (pattern_id, position)
+);
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS cmp_templates (
+    template_id INTEGER PRIMARY KEY,
+    pattern_id INTEGER NOT NULL,
+    dep_offsets BLOB NOT NULL,
+    arr_offsets BLOB NOT NULL
+);
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS cmp_trips (
+    trip_id TEXT PRIMARY KEY,
+    pattern_id INTEGER NOT NULL,
+    template_id INTEGER NOT NULL,
+    start_sec INTEGER NOT NULL,
+    route_id TEXT,
+    route_name TEXT,
+    headsign TEXT
+);
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_cmp_stop ON cmp_pattern_stops(stop_id);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_cmp_trip_pattern ON cmp_trips(pattern_id, start_sec);")
+    con.commit()
+
+def has_compressed_cache(con: sqlite3.Connection) -> bool:
+    init_compressed_db(con)
+    return con.execute("SELECT 1 FROM cmp_trips LIMIT 1;").fetchone() is not None
+
+def _mix64(x):
+    """splitmix64-Finalizer auf einem uint64-Array (Überlauf ist gewollt)."""
+    import numpy as np
+
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _slice_hash(ptr, pos, cols):
+    """
+    Ein 64-bit-Hash je Trip-Abschnitt ptr[t]:ptr[t+1] über die Spalten cols
+    (je Ereignis). Die Position geht mit ein, die Summe je Abschnitt ist damit
+    reihenfolgeabhängig; die Länge wird am Ende eingemischt.
+    """
+    import numpy as np
+
+    h = _mix64(pos.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15))
+    for c in cols:
+        h = _mix64(h ^ c.astype(np.int64).view(np.uint64))
+    if len(ptr) < 2:
+        return np.zeros(0, dtype=np.uint64)
+    sums = np.add.reduceat(h, ptr[:-1]) if len(h) else np.zeros(len(ptr) - 1, dtype=np.uint64)
+    return _mix64(sums ^ np.diff(ptr).astype(np.uint64))
+
+def _group_slices(hashes, ptr, owner, pos, cols):
+    """
+    Fasst Trips mit gleichem Abschnitt zusammen. Gleicher Hash reicht nicht:
+    jeder Trip wird mit dem Vertreter seines Hashes verglichen, Kollisionen
+    (praktisch nie) werden exakt über Tupel getrennt.
+    Rückgabe: (Gruppe je Trip, Vertreter-Trip je Gruppe), Gruppen nach erstem Auftreten nummeriert.
+    """
+    import numpy as np
+
+    n = len(hashes)
+    _, first, inv = np.unique(hashes, return_index=True, return_inverse=True)
+    rep = first[inv.reshape(-1)]
+    length = np.diff(ptr)
+    bad = length != length[rep]
+    if len(pos):
+        rep_ev = np.minimum(ptr[:-1][rep][owner] + pos, len(pos) - 1)
+        differs = np.zeros(len(pos), dtype=bool)
+        for c in cols:
+            differs |= c != c[rep_ev]
+        bad |= np.bincount(owner[differs], minlength=n) > 0
+
+    group = inv.reshape(-1).astype(np.int64)
+    if bad.any():
+        exact: Dict[Tuple, int] = {}
+        for t in np.flatnonzero(bad).tolist():
+            a, b = int(ptr[t]), int(ptr[t + 1])
+            key = tuple(tuple(c[a:b].tolist()) for c in cols)
+            group[t] = exact.setdefault(key, len(first) + len(exact))
+
+    _, first_of, inv_of = np.unique(group, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_of), dtype=np.int64)
+    rank[np.argsort(first_of, kind="stable")] = np.arange(len(first_of))
+    return rank[inv_of.reshape(-1)], np.sort(first_of)
+
+def build_compressed_cache(zip_path: str, con: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Scannt stop_times.txt EINMAL für den ganzen Feed und speichert ihn
+    komprimiert (alle Trips, ohne Kalenderfilter – wie stop_times_cache).
+
+    Rückgabe: Zeilen, Trips, Muster, Vorlagen (für die Erfolgsmeldung).
+    """
+    import numpy as np
+    from array import array
+
+    init_compressed_db(con)
+    for table in ("cmp_pattern_stops", "cmp_templates", "cmp_trips"):
+        con.execute(f"DELETE FROM {table};")
+    con.commit()
+
+    trips = {
+    r["trip_id"]: r
+    for r in iter_rows(zip_path, "trips.txt")
+}
+
+    routes = {
+    r["route_id"]: r
+    for r in iter_rows(zip_path, "routes.txt")
+}
+
+    # 1) stop_times in kompakte Spalten streamen (Reihenfolge in der Datei egal)
+    trip_index: Dict[str, int] = {}
+    stop_index: Dict[str, int] = {}
+    ev_trip, ev_seq, ev_stop, ev_arr, ev_dep = array("i"), array("i"), array("i"), array("i"), array("i")
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        trip_id = (row.get("trip_id") or "").strip()
+        stop_id = (row.get("stop_id") or "").strip()
+        seq = (row.get("stop_sequence") or "").strip()
+        dep_t = (row.get("departure_time") or "").strip()
+        arr_t = (row.get("arrival_time") or "").strip()
+        if not trip_id or not stop_id or not dep_t or not seq.isdigit():
+            continue
+        dep = parse_gtfs_time_to_seconds(dep_t)
+        ev_trip.append(trip_index.setdefault(trip_id, len(trip_index)))
+        ev_seq.append(int(seq))
+        ev_stop.append(stop_index.setdefault(stop_id, len(stop_index)))
+        ev_dep.append(dep)
+        ev_arr.append(parse_gtfs_time_to_seconds(arr_t) if arr_t else dep)
+
+    e_trip = np.frombuffer(ev_trip, dtype=np.int32)
+    order = np.lexsort((np.frombuffer(ev_seq, dtype=np.int32), e_trip))
+    n_trips = len(trip_index)
+    ptr = np.zeros(n_trips + 1, dtype=np.int64)
+    np.cumsum(np.bincount(e_trip, minlength=n_trips), out=ptr[1:])
+
+    # 2) Muster und Vorlagen erkennen – vektorisiert über Hashes der Trip-Abschnitte
+    owner = e_trip[order].astype(np.int64)          # Trip je (sortiertem) Ereignis
+    pos = np.arange(len(order), dtype=np.int64) - ptr[owner]
+    stop_s = np.frombuffer(ev_stop, dtype=np.int32)[order]
+    seq_s = np.frombuffer(ev_seq, dtype=np.int32)[order]
+    start = np.frombuffer(ev_dep, dtype=np.int32)[order][ptr[:-1]] if n_trips else np.zeros(0, dtype=np.int32)
+    dep_off = np.frombuffer(ev_dep, dtype=np.int32)[order] - start[owner]
+    arr_off = np.frombuffer(ev_arr, dtype=np.int32)[order] - start[owner]
+
+    pat_hash = _slice_hash(ptr, pos, (stop_s, seq_s))
+    trip_pattern, pat_reps = _group_slices(pat_hash, ptr, owner, pos, (stop_s, seq_s))
+    pat_ev = trip_pattern[owner]
+    tpl_hash = _slice_hash(ptr, pos, (pat_ev, dep_off, arr_off))
+    trip_template, tpl_reps = _group_slices(tpl_hash, ptr, owner, pos, (pat_ev, dep_off, arr_off))
+
+    # nur noch die (wenigen) Vertreter einzeln anfassen
+    stop_ids = list(stop_index)
+    pattern_rows: List[Tuple[int, int, str, int]] = []
+    for p, t in enumerate(pat_reps.tolist()):
+        a, b = int(ptr[t]), int(ptr[t + 1])
+        pattern_rows.extend(
+            (p, i, stop_ids[sid], sq) for i, (sid, sq) in enumerate(zip(stop_s[a:b].tolist(), seq_s[a:b].tolist()))
+        )
+    template_rows: List[Tuple[int, int, bytes, bytes]] = []
+    for tpl, t in enumerate(tpl_reps.tolist()):
+        a, b = int(ptr[t]), int(ptr[t + 1])
+        template_rows.append((
+            tpl, int(trip_pattern[t]),
+            dep_off[a:b].astype(np.int32).tobytes(),
+            arr_off[a:b].astype(np.int32).tobytes(),
+        ))
+
+    trip_rows: List[Tuple[str, int, int, int, str, str, str]] = []
+    for trip_id, p, tpl, st in zip(trip_index, trip_pattern.tolist(), trip_template.tolist(), start.tolist()):
+        trip = trips.get(trip_id, {})
+        route_id = trip.get("route_id") or ""
+        route = routes.get(route_id, {})
+        route_name = route.get("route_short_name") or route.get("route_long_name") or route_id
+        trip_rows.append((trip_id, p, tpl, st, route_id, route_name or "", trip.get("trip_headsign") or ""))
+
+    con.executemany("INSERT INTO cmp_pattern_stops VALUES (?,?,?,?);", pattern_rows)
+    con.executemany("INSERT INTO cmp_templates VALUES (?,?,?,?);", template_rows)
+    con.executemany("INSERT INTO cmp_trips VALUES (?,?,?,?,?,?,?);", trip_rows)
+    con.commit()
+
+    return {"rows": len(ev_trip), "trips": len(trip_rows), "patterns": len(pat_reps), "templates": len(tpl_reps)}
+
+class CompressedStopTimes:
+    """
+    Die komprimierte Form im RAM (NumPy-Arrays) mit Abfragen direkt darauf.
+
+    pat_trip_ptr[p]:pat_trip_ptr[p+1]  Trips des Musters p, nach Startzeit sortiert
+    tpl_ptr[t]:tpl_ptr[t+1]            Offsets der Vorlage t (eine Zahl pro Position)
+    stop_occ[stop_id]                  [(Muster, Position), ...]
+    """
+
+    def __init__(self, con: sqlite3.Connection):
+        import numpy as np
+
+        occ: Dict[str, List[Tuple[int, int]]] = {}
+        pat_stops: Dict[int, List[Tuple[int, str, int]]] = {}
+        for p, pos, sid, sq in con.execute("SELECT pattern_id, position, stop_id, stop_sequence FROM cmp_pattern_stops;"):
+            occ.setdefault(sid, []).append((p, pos))
+            pat_stops.setdefault(p, []).append((pos, sid, sq))
+        self.stop_occ = occ
+        self.pattern_stops = {p: sorted(v) for p, v in pat_stops.items()}
+
+        tpl = con.execute("SELECT template_id, dep_offsets, arr_offsets FROM cmp_templates ORDER BY template_id;").fetchall()
+        lens = np.array([len(d) // 4 for _, d, _ in tpl], dtype=np.int64)
+        self.tpl_ptr = np.zeros(len(tpl) + 1, dtype=np.int64)
+        np.cumsum(lens, out=self.tpl_ptr[1:])
+        self.tpl_dep = np.frombuffer(b"".join(d for _, d, _ in tpl), dtype=np.int32)
+        self.tpl_arr = np.frombuffer(b"".join(a for _, _, a in tpl), dtype=np.int32)
+
+        rows = con.execute(
+            "SELECT trip_id, pattern_id, template_id, start_sec, route_id, route_name, headsign "
+            "FROM cmp_trips ORDER BY pattern_id, start_sec;"
+        ).fetchall()
+        self.trip_ids = [r[0] for r in rows]
+        self.trip_row = {tid: i for i, tid in enumerate(self.trip_ids)}
+        self.trip_pattern = np.array([r[1] for r in rows], dtype=np.int32)
+        self.trip_template = np.array([r[2] for r in rows], dtype=np.int32)
+        self.trip_start = np.array([r[3] for r in rows], dtype=np.int32)
+        self.trip_route_id = [r[4] for r in rows]
+        self.trip_route_name = [r[5] for r in rows]
+        self.trip_headsign = [r[6] for r in rows]
+
+        n_pat = len(self.pattern_stops)
+        self.pat_trip_ptr = np.zeros(n_pat + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.trip_pattern, minlength=n_pat), out=self.pat_trip_ptr[1:])
+
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    def _times_at(self, stop_id: str, offsets, after_sec: int, before_sec: Optional[int],
+                  skip_first: bool, skip_last: bool):
+        import numpy as np
+
+        rows, secs, poss = [], [], []
+        for p, pos in self.stop_occ.get(stop_id, ()):
+            if skip_first and pos == 0:
+                continue
+            if skip_last and pos == len(self.pattern_stops[p]) - 1:
+                continue  # am Endhalt fährt nichts ab
+            r = np.arange(self.pat_trip_ptr[p], self.pat_trip_ptr[p + 1])
+            t = self.trip_start[r] + offsets[self.tpl_ptr[self.trip_template[r]] + pos]
+            keep = t >= after_sec
+            if before_sec is not None:
+                keep &= t <= before_sec
+            rows.append(r[keep])
+            secs.append(t[keep])
+            poss.append(np.full(int(keep.sum()), pos, dtype=np.int32))
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        rows_a, secs_a, poss_a = np.concatenate(rows), np.concatenate(secs), np.concatenate(poss)
+        order = np.argsort(secs_a, kind="stable")
+        return rows_a[order], secs_a[order], poss_a[order]
+
+    def departures_at(self, stop_id: str, after_sec: int, before_sec: Optional[int] = None):
+        """
+        Alle Abfahrten am Halt ab after_sec (bis before_sec), sortiert.
+        Trips, die hier enden (letzte Position), fehlen.
+        Rückgabe: (Trip-Zeilen, Abfahrtssekunden, Positionen) als NumPy-Arrays.
+        """
+        return self._times_at(stop_id, self.tpl_dep, after_sec, before_sec, skip_first=False, skip_last=True)
+
+    def arrivals_at(self, stop_id: str, after_sec: int, before_sec: Optional[int] = None):
+        """Wie departures_at, aber Ankünfte; Trips, die hier beginnen (Position 0), fehlen."""
+        return self._times_at(stop_id, self.tpl_arr, after_sec, before_sec, skip_first=True, skip_last=False)
+
+    def next_departures(
+        self,
+        stop_id: str,
+        active_trip_route: Dict[str, str],
+        limit: int = 10,
+        after_sec: Optional[int] = None
+    ) -> List[Departure]:
+        """Wie get_next_departures_cached, aber auf der komprimierten Form."""
+        from utils import format_seconds_hhmmss
+
+        if after_sec is None:
+            after_sec = now_seconds()
+        rows, secs, poss = self.departures_at(stop_id, after_sec)
+
+        result: List[Departure] = []
+        for r, sec, pos in zip(rows.tolist(), secs.tolist(), poss.tolist()):
+            trip_id = self.trip_ids[r]
+            route_id = active_trip_route.get(trip_id)
+            if not route_id:
+                continue
+            p = int(self.trip_pattern[r])
+            result.append(
+                Departure(
+                    trip_id=trip_id,
+                    route_id=route_id,
+                    departure_time=format_seconds_hhmmss(sec),
+                    stop_sequence=self.pattern_stops[p][pos][2],
+                    route_name=self.trip_route_name[r],
+                    headsign=self.trip_headsign[r]))
+            if len(result) >= limit:
+                break
+        return result
+
+    def next_arrivals(
+        self,
+        stop_id: str,
+        active_trip_route: Dict[str, str],
+        limit: int = 10,
+        after_sec: Optional[int] = None
+    ) -> List[Arrival]:
+        """Wie get_next_arrivals_cached, aber auf der komprimierten Form."""
+        from utils import format_seconds_hhmmss
+
+        if after_sec is None:
+            after_sec = now_seconds()
+        rows, secs, poss = self.arrivals_at(stop_id, after_sec)
+
+        result: List[Arrival] = []
+        for r, sec, pos in zip(rows.tolist(), secs.tolist(), poss.tolist()):
+            trip_id = self.trip_ids[r]
+            route_id = active_trip_route.get(trip_id)
+            if not route_id:
+                continue
+            p = int(self.trip_pattern[r])
+            result.append(
+                Arrival(
+                    trip_id=trip_id,
+                    route_id=route_id,
+                    arrival_time=format_seconds_hhmmss(sec),
+                    stop_sequence=self.pattern_stops[p][pos][2],
+                    route_name=self.trip_route_name[r],
+                    headsign=self.trip_headsign[r]))
+            if len(result) >= limit:
+                break
+        return result
+
+    def arrival_sec(self, stop_id: str, trip_id: str) -> Optional[int]:
+        """Wie get_arrival_sec_cached."""
+        visits = [arr for _, sid, arr, _ in self.expand_trip(trip_id)[1:] if sid == stop_id]
+        return visits[-1] if visits else None
+
+    def departures_between(
+        self,
+        stop_id: str,
+        active_trip_route: Dict[str, str],
+        from_sec: int,
+        to_sec: int
+    ) -> List[Tuple[int, Departure]]:
+        """Wie get_departures_between_cached."""
+        from utils import format_seconds_hhmmss
+
+        rows, secs, poss = self.departures_at(stop_id, from_sec, to_sec)
+        result: List[Tuple[int, Departure]] = []
+        for r, sec, pos in zip(rows.tolist(), secs.tolist(), poss.tolist()):
+            trip_id = self.trip_ids[r]
+            route_id = active_trip_route.get(trip_id)
+            if not route_id:
+                continue
+            p = int(self.trip_pattern[r])
+            result.append((sec, Departure(
+                trip_id=trip_id,
+                route_id=route_id,
+                departure_time=format_seconds_hhmmss(sec),
+                stop_sequence=self.pattern_stops[p][pos][2],
+                route_name=self.trip_route_name[r],
+                headsign=self.trip_headsign[r])))
+        return result
+
+    def expand_trip(self, trip_id: str) -> List[Tuple[int, str, int, int]]:
+        """Rekonstruiert die stop_times eines Trips: [(stop_sequence, stop_id, arr_sec, dep_sec), ...]"""
+        r = self.trip_row.get(trip_id)
+        if r is None:
+            return []
+        p = int(self.trip_pattern[r])
+        t = int(self.trip_template[r])
+        start = int(self.trip_start[r])
+        a, b = int(self.tpl_ptr[t]), int(self.tpl_ptr[t + 1])
+        dep = self.tpl_dep[a:b].tolist()
+        arr = self.tpl_arr[a:b].tolist()
+        return [
+            (sq, sid, start + arr[pos], start + dep[pos])
+            for pos, sid, sq in self.pattern_stops[p]
+        ]
+
+    def trip_stop_sequence(self, trip_id: str) -> List[Tuple[int, str]]:
+        """Wie trip_stop_sequence(zip_path, trip_id), aber ohne Scan."""
+        return [(sq, sid) for sq, sid, _, _ in self.expand_trip(trip_id)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from config import GTFS_ZIP_PATH, CACHE_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Abfahrts-Cache (SQLite)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_cmp = sub.add_parser("komprimieren", help="ganzen Feed als Haltemuster + Vorlagen speichern")
+    p_cmp.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_cmp.add_argument("--db", default=CACHE_DB_PATH)
+    args = parser.parse_args()
+
+    con = connect(args.db)
+    t0 = time.time()
+    stats = build_compressed_cache(args.zip, con)
+    print(
+        f"{stats['rows']} stop_times-Zeilen -> {stats['trips']} Trips, "
+        f"{stats['patterns']} Haltemuster, {stats['templates']} Fahrzeit-Vorlagen "
+        f"in {time.time() - t0:.1f}s"
+    )
@@ -17,7 +17,10 @@ Hinweise:
     - Es fungiert ausschließlich als Schnittstelle zwischen Nutzer und Backend.
 """
 
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+from models import Journey, Stop
+from utils import format_seconds_hhmm
 
 def header(title: str) -> None:
     print("\n" + "=" * 60)
@@ -42,4 +45,64 @@ def choose_from_list(options: List[Tuple[str, str]], prompt: str) -> int:
 
 def ask_yes_no(prompt: str) -> bool:
     v = input(prompt + " (y/n): ").strip().lower()
-    return v == "y"
\ No newline at end of file
+    return v == "y"
+
+def print_journey(journey: Journey, stops_by_id: Dict[str, Stop]) -> None:
+    """
+    Gibt eine Verbindung Teilstrecke für Teilstrecke aus.
+    """
+    def name(sid: str) -> str:
+        s = stops_by_id.get(sid)
+        return s.stop_name if s else sid
+
+    print(
+        f"\n{format_seconds_hhmm(journey.dep_sec)} -> {format_seconds_hhmm(journey.arr_sec)}"
+        f"  ({(journey.arr_sec - journey.dep_sec) // 60} min, {journey.transfers} Umstiege)"
+    )
+    for leg in journey.legs:
+        if leg.kind == "walk":
+            print(f"   Fußweg  {name(leg.from_stop_id)} -> {name(leg.to_stop_id)}"
+                  f"  ({max((leg.arr_sec - leg.dep_sec) // 60, 1)} min)")
+        else:
+            print(f"   {format_seconds_hhmm(leg.dep_sec)} {name(leg.from_stop_id)}"
+                  f" -> {format_seconds_hhmm(leg.arr_sec)} {name(leg.to_stop_id)}"
+                  f"  (trip_id={leg.trip_id})")
+
+def print_frequency_table(rows, stops_by_id: Dict[str, Stop]) -> None:
+    """
+    Tabelle der Angebotskennzahlen (analytics.FrequencyRow) für die Konsole.
+    """
+    if not rows:
+        print("Keine Abfahrten an diesem Datum.")
+        return
+
+    def minutes(sec):
+        return "-" if sec is None else f"{sec / 60:.0f}"
+
+    print(f"\n{'Linie':12s} {'Ri.':>3s} {'Halt':28s} {'Abf.':>5s} {'erste':>6s} {'letzte':>6s} {'Takt':>5s} {'Lücke':>6s} {'max/h':>6s}")
+    for r in rows:
+        s = stops_by_id.get(r.stop_id)
+        name = (s.stop_name if s else r.stop_id)[:28]
+        print(
+            f"{r.route_name[:12]:12s} {'-' if r.direction is None else r.direction:>3} {name:28s} {r.departures:5d} "
+            f"{format_seconds_hhmm(r.first_sec):>6s} {format_seconds_hhmm(r.last_sec):>6s} "
+            f"{minutes(r.mean_headway_sec):>5s} {minutes(r.max_gap_sec):>6s} {r.peak_per_hour:6d}"
+        )
+
+
+def print_route_timetable(rt, stops_by_id: Dict[str, Stop], columns: int = 10) -> None:
+    """
+    Fahrplan einer Linie (route_timetable.RouteTimetable) im Aushang-Layout:
+    Halte untereinander, Fahrten nebeneinander, in Blöcken zu `columns` Fahrten.
+    """
+    if len(rt) == 0:
+        print("Keine Fahrten an diesem Datum.")
+        return
+
+    for start in range(0, len(rt), columns):
+        rows = range(start, min(start + columns, len(rt)))
+        print(f"\n{'Muster':28s} " + " ".join(f"{int(rt.pattern[r]) + 1:>5d}" for r in rows))
+        for col, sid in enumerate(rt.stop_ids):
+            s = stops_by_id.get(sid)
+            name = (s.stop_name if s else sid)[:28]
+            print(f"{name:28s} " + " ".join(f"{rt.cell(r, col) or '|':>5s}" for r in rows))
@@ -0,0 +1,199 @@
+# columnar.py
+
+"""
+columnar.py
+
+Aufgabe:
+    Dieses Modul exportiert alle Dateien des GTFS-Feeds in ein typisiertes,
+    komprimiertes Spaltenformat (Parquet). Auswertungen können danach nur die
+    benötigten Spalten und Row-Groups lesen, statt jedes Mal die CSV-Dateien
+    aus der ZIP komplett zu parsen.
+
+Verwendete Bibliotheken:
+    - pyarrow (csv, parquet)
+
+Zentrale Aufgaben:
+    - Streaming-Konvertierung jeder ZIP-Datei in eine Parquet-Datei
+    - GTFS-Zeiten (HH:MM:SS) -> Sekunden (int32)
+    - IDs (trip_id, stop_id, ...) als Dictionary-Spalten
+    - Zahlen und Koordinaten typisiert
+    - manifest.json mit Herkunft (Feed-Pfad, CRCs) und Zeilenzahlen
+
+Hinweise:
+    - Lesen erfolgt über gtfs_zip.read_columnar / gtfs_zip.iter_rows_columnar.
+    - Export: python columnar.py export
+    - Parquet statt Arrow IPC: Parquet bringt Row-Group-Statistiken für das
+      Filtern mit und kann Dictionaries pro Row-Group neu anlegen, was beim
+      Streaming großer Dateien nötig ist.
+"""
+
+import csv
+import json
+import os
+import zipfile
+from typing import Dict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from config import GTFS_ZIP_PATH, COLUMNAR_DIR, COLUMNAR_ROW_GROUP_SIZE
+from gtfs_zip import columnar_path
+
+COLUMNAR_VERSION = 1
+
+TIME_COLUMNS = {"arrival_time", "departure_time", "start_time", "end_time"}
+
+ID_COLUMNS = {
+    "agency_id", "stop_id", "route_id", "trip_id", "service_id", "shape_id",
+    "parent_station", "block_id", "zone_id", "from_stop_id", "to_stop_id",
+    "level_id", "fare_id", "from_route_id", "to_route_id", "from_trip_id", "to_trip_id",
+}
+
+INT_COLUMNS = {
+    "stop_sequence", "direction_id", "location_type", "route_type", "exception_type",
+    "pickup_type", "drop_off_type", "timepoint", "wheelchair_boarding",
+    "wheelchair_accessible", "bikes_allowed", "shape_pt_sequence", "transfer_type",
+    "min_transfer_time", "headway_secs", "exact_times",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "date", "start_date", "end_date",
+}
+
+FLOAT_COLUMNS = {"stop_lat", "stop_lon", "shape_pt_lat", "shape_pt_lon", "shape_dist_traveled"}
+
+
+def gtfs_time_to_seconds(arr: pa.Array) -> pa.Array:
+    """
+    Vektorisiert: "HH:MM:SS" -> Sekunden (int32), leere Werte -> null.
+    Stunden können > 24 sein, daher kein Zeit-Datentyp.
+    """
+    arr = pc.utf8_trim_whitespace(arr)
+    arr = pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+    parts = pc.split_pattern(arr, ":")
+    hh = pc.cast(pc.list_element(parts, 0), pa.int32())
+    mm = pc.cast(pc.list_element(parts, 1), pa.int32())
+    ss = pc.cast(pc.list_element(parts, 2), pa.int32())
+    return pc.add(pc.add(pc.multiply(hh, 3600), pc.multiply(mm, 60)), ss)
+
+
+def _convert_column(name: str, arr: pa.Array) -> pa.Array:
+    if name in TIME_COLUMNS:
+        return gtfs_time_to_seconds(arr)
+    if name in INT_COLUMNS or name in FLOAT_COLUMNS:
+        arr = pc.utf8_trim_whitespace(arr)
+        arr = pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+        return pc.cast(arr, pa.float64() if name in FLOAT_COLUMNS else pa.int32())
+    if name in ID_COLUMNS:
+        return pc.dictionary_encode(arr)
+    return arr
+
+
+def _target_type(name: str) -> pa.DataType:
+    if name in TIME_COLUMNS or name in INT_COLUMNS:
+        return pa.int32()
+    if name in FLOAT_COLUMNS:
+        return pa.float64()
+    if name in ID_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def export_member(z: zipfile.ZipFile, filename: str, out_path: str, row_group_size: int = COLUMNAR_ROW_GROUP_SIZE) -> int:
+    """
+    Konvertiert eine Datei aus der ZIP streamend nach Parquet.
+    Rückgabe: Anzahl Zeilen.
+    """
+    with z.open(filename, "r") as f:
+        header = f.readline().decode("utf-8-sig").strip()
+    names = [n.strip() for n in next(csv.reader([header]))]
+
+    with z.open(filename, "r") as f:
+        reader = pacsv.open_csv(
+            f,
+            read_options=pacsv.ReadOptions(block_size=16 << 20, column_names=names, skip_rows=1),
+            # alles erst als Text lesen, Typen setzen wir selbst
+            convert_options=pacsv.ConvertOptions(
+                column_types={n: pa.string() for n in names},
+                strings_can_be_null=False,
+            ),
+        )
+        schema = pa.schema([pa.field(n, _target_type(n)) for n in names])
+
+        tmp = out_path + ".tmp"
+        rows = 0
+        pending = []
+        pending_rows = 0
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for batch in reader:
+                cols = [_convert_column(n, batch.column(i)) for i, n in enumerate(names)]
+                pending.append(pa.RecordBatch.from_arrays(cols, schema=schema))
+                pending_rows += batch.num_rows
+                if pending_rows >= row_group_size:
+                    writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+                    rows += pending_rows
+                    pending, pending_rows = [], 0
+            if pending:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+                rows += pending_rows
+        os.replace(tmp, out_path)
+    return rows
+
+
+def export_feed(zip_path: str = GTFS_ZIP_PATH, out_dir: str = COLUMNAR_DIR) -> Dict[str, int]:
+    """
+    Exportiert alle .txt-Dateien des Feeds nach out_dir/<name>.parquet.
+    Rückgabe: Dateiname -> Anzahl Zeilen.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    counts: Dict[str, int] = {}
+    with zipfile.ZipFile(zip_path, "r") as z:
+        members = [i for i in z.infolist() if i.filename.endswith(".txt")]
+        for info in members:
+            counts[info.filename] = export_member(z, info.filename, columnar_path(out_dir, info.filename))
+        crcs = {i.filename: i.CRC for i in members}
+
+    manifest = {
+        "version": COLUMNAR_VERSION,
+        "source": os.path.abspath(zip_path),
+        "crc": crcs,
+        "rows": counts,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return counts
+
+
+def is_up_to_date(zip_path: str = GTFS_ZIP_PATH, out_dir: str = COLUMNAR_DIR) -> bool:
+    """True, wenn der Export zum aktuellen Feed passt (CRCs aus dem ZIP-Verzeichnis)."""
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != COLUMNAR_VERSION:
+        return False
+    with zipfile.ZipFile(zip_path, "r") as z:
+        crcs = {i.filename: i.CRC for i in z.infolist() if i.filename.endswith(".txt")}
+    return crcs == manifest.get("crc")
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="GTFS-Feed nach Parquet exportieren")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export")
+    p_exp.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_exp.add_argument("--out", default=COLUMNAR_DIR)
+    p_exp.add_argument("--force", action="store_true", help="auch exportieren, wenn aktuell")
+    args = parser.parse_args()
+
+    if not args.force and is_up_to_date(args.zip, args.out):
+        print(f"Export in {args.out} ist aktuell.")
+    else:
+        t0 = time.time()
+        for name, n in export_feed(args.zip, args.out).items():
+            print(f"{name:25s} {n:>12d} Zeilen")
+        print(f"fertig in {time.time() - t0:.1f}s -> {args.out}")
@@ -26,3 +26,75 @@ DEFAULT_DEPARTURES_LIMIT = 12
 
 MAP_FILE = "route_map.html"
 MAP_ZOOM = 6
+
+# Netzübersicht (vorgenerierte GeoJSON-Kacheln)
+TILES_DIR = "data/tiles"
+TILES_HOST = "127.0.0.1"
+TILES_PORT = 8765
+TILE_MIN_ZOOM = 5
+TILE_MAX_ZOOM = 12
+TILE_MAX_FEATURES = 400
+
+# Kompilierter Tagesfahrplan / Verbindungssuche
+TIMETABLE_DIR = "data/timetable"
+FOOTPATH_MAX_METERS = 400
+WALKING_SPEED_MPS = 1.2
+MIN_TRANSFER_SEC = 120
+MAX_TRANSFERS = 6
+MAX_JOURNEY_SEC = 12 * 3600
+
+# Tafel-Index (board_index.py)
+BOARD_INDEX_PREBUILD_SEC = 30 * 60  # Index des Folgetags so lange vor Mitternacht bauen
+
+# Isochronen
+ISOCHRONE_BANDS_MIN = (30, 60, 90)
+ISOCHRONE_BUCKET_SEC = 300
+ISOCHRONE_CACHE_SIZE = 64
+
+# Spaltenformat (Parquet-Export des Feeds)
+COLUMNAR_DIR = "data/columnar"
+COLUMNAR_ROW_GROUP_SIZE = 1_000_000
+
+# Verspätungshistorie
+DELAY_HISTORY_DIR = "data/delays"
+ON_TIME_THRESHOLD_SEC = 6 * 60  # wie bei der DB: unter 6 Minuten gilt als pünktlich
+DELAY_WATCH_SEC = 10            # Server lesen neue Datensätze anderer Prozesse so oft nach
+
+# Cache-Vorwärmen im Hintergrund
+QUERY_LOG_PATH = "data/query_log.jsonl"
+PREWARM_STATIONS = 200     # so viele Stationen werden beim Start vorgewärmt
+PREWARM_BATCH_STOPS = 40   # Halte pro stop_times-Scan
+PREWARM_WORKERS = 1        # Hintergrund-Threads (zusätzlich ein Thread für Vordergrund-Anfragen)
+
+# Batch-Modus (main.py --batch)
+BATCH_CHUNK_LINES = 200    # Anfragen pro Block; fehlende Halte eines Blocks in einem Scan
+
+# Tafel-Cache im Prozess (Minuten-Buckets)
+BOARD_CACHE_MAX_BYTES = 32 * 1024 * 1024
+BOARD_CACHE_TTL_SEC = 60
+
+# Kompilierter Feed-Snapshot (Halte, Linien, Trips, Kalender, Suchindex) für schnellen Kaltstart
+SNAPSHOT_PATH = "data/feed_snapshot.bin"
+
+# Mehrere Feeds (Name -> ZIP, eigene Cache-Datei und eigener Snapshot). Der Name
+# ist das Präfix der IDs ("de:<stop_id>"), darf also keinen Doppelpunkt enthalten.
+FEEDS = {
+    "de": {"zip": GTFS_ZIP_PATH, "db": CACHE_DB_PATH, "snapshot": SNAPSHOT_PATH},
+}
+MULTI_FEED_WORKERS = 4
+STATION_DEDUP_METERS = 300  # gleicher Name und näher als das -> eine Station
+
+# Live-Karte der fahrenden Züge (vehicles.py)
+VEHICLES_HOST = "127.0.0.1"
+VEHICLES_PORT = 8766
+VEHICLE_REFRESH_SEC = 5
+
+# Push-Abfahrtstafeln (board_push.py)
+PUSH_HOST = "127.0.0.1"
+PUSH_PORT = 8767
+PUSH_MAX_IDLE_SEC = 300         # Tafel ohne Abfahrt spätestens so oft neu prüfen
+PUSH_DELAY_LOOKBACK_SEC = 1800  # so weit zurück nach verspäteten Zügen suchen
+PUSH_KEEPALIVE_SEC = 15         # SSE-Kommentar, damit die Verbindung offen bleibt
+
+# Anschlüsse (connections.py)
+CONNECTION_WINDOW_SEC = 3600  # Anschlüsse bis so lange nach der Ankunft zeigen
@@ -0,0 +1,277 @@
+# connections.py
+
+"""
+connections.py
+
+Aufgabe:
+    Dieses Modul beantwortet „Welche Anschlüsse erreiche ich, wenn ich mit
+    diesem Zug hier ankomme?“ und liefert die Ankunftstafel einer Station.
+    Grundlage sind die Ankunfts- und Abfahrtszeiten im Cache (cache_db.py),
+    nicht ein erneuter Scan von stop_times.txt.
+
+Verwendete GTFS-Dateien:
+    - transfers.txt (optional, Mindestumstiegszeiten zwischen Steigen)
+
+Zentrale Aufgaben:
+    - Ankunftstafel: nächste Ankünfte an allen Steigen einer Station
+    - Anschlüsse: Ankunft des Trips am Halt nachschlagen, dann pro Steig der
+      Station EINE Bereichsabfrage [Ankunft + Umstiegszeit, Ankunft + Fenster]
+    - Umstiegszeit je (Ankunftssteig, Abfahrtssteig): transfers.txt
+      (transfer_type 2), sonst Fußweg über die Luftlinie wie in timetable.py,
+      mindestens MIN_TRANSFER_SEC
+
+Hinweise:
+    - Der Aufwand hängt an der Zahl der Steige und der Abfahrten im Fenster,
+      nicht an der Größe des Feeds – auch an großen Knoten interaktiv.
+    - transfer_type 3 (kein Umstieg möglich) schließt die Steig-Kombination aus.
+    - Die Weiterfahrt im selben Trip ist kein Anschluss, ebenso wenig ein
+      Trip, der an der Station endet (am Endhalt gibt es keine Abfahrt).
+    - Wie bei den Abfahrtstafeln zählt nur der Betriebstag der Ankunft: der
+      ankommende Trip und die Anschlüsse müssen an diesem Tag verkehren.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import cache_db
+from config import (
+    GTFS_ZIP_PATH,
+    CACHE_DB_PATH,
+    DEFAULT_DEPARTURES_LIMIT,
+    MIN_TRANSFER_SEC,
+    WALKING_SPEED_MPS,
+    CONNECTION_WINDOW_SEC,
+)
+from gtfs_zip import has_file, iter_rows
+from models import Arrival, Departure
+from timetable import haversine_m
+from utils import now_seconds, today_date
+
+
+@dataclass(frozen=True)
+class Connection:
+    departure: Departure
+    stop_id: str        # Abfahrtssteig
+    dep_sec: int
+    transfer_sec: int   # nötige Umstiegszeit vom Ankunftssteig
+    slack_sec: int      # Puffer: dep_sec - Ankunft - transfer_sec
+
+
+@dataclass(frozen=True)
+class ConnectionResult:
+    trip_id: str
+    stop_id: str                  # Ankunftssteig
+    arrival_sec: Optional[int]    # None: Trip kommt hier (an diesem Tag) nicht an
+    connections: List[Connection]
+
+
+def load_transfer_times(zip_path: str) -> Dict[Tuple[str, str], Optional[int]]:
+    """
+    transfers.txt -> (from_stop_id, to_stop_id) -> Mindestumstiegszeit,
+    None bei transfer_type 3. Regeln für einzelne Trips/Linien werden ignoriert.
+    """
+    rules: Dict[Tuple[str, str], Optional[int]] = {}
+    if not has_file(zip_path, "transfers.txt"):
+        return rules
+    for row in iter_rows(zip_path, "transfers.txt"):
+        if (row.get("from_trip_id") or row.get("to_trip_id") or row.get("from_route_id") or row.get("to_route_id") or "").strip():
+            continue
+        a = (row.get("from_stop_id") or "").strip()
+        b = (row.get("to_stop_id") or "").strip()
+        kind = (row.get("transfer_type") or "0").strip() or "0"
+        min_time = (row.get("min_transfer_time") or "").strip()
+        if not a or not b:
+            continue
+        if kind == "3":
+            rules[(a, b)] = None
+        elif kind == "2" and min_time.isdigit():
+            rules[(a, b)] = int(min_time)
+    return rules
+
+
+class ConnectionFinder:
+    """
+    Ankunftstafel und Anschlüsse auf dem komprimierten Feed-Cache, sonst auf
+    stop_times_cache (fehlende Steige werden in einem Scan nachgebaut).
+    Ein Objekt kann von mehreren Threads benutzt werden.
+    """
+
+    def __init__(self, zip_path: str = GTFS_ZIP_PATH, db_path: str = CACHE_DB_PATH):
+        from feed_snapshot import get_snapshot
+
+        self.zip_path = zip_path
+        self.snapshot = get_snapshot(zip_path)
+        self._lock = threading.Lock()
+        self._con = cache_db.connect(db_path, check_same_thread=False)
+        cache_db.init_db(self._con)
+        self.compressed = (
+            cache_db.CompressedStopTimes(self._con) if cache_db.has_compressed_cache(self._con) else None
+        )
+        self._active: Dict[date, Dict[str, str]] = {}
+        self._transfers: Optional[Dict[Tuple[str, str], Optional[int]]] = None
+
+    def station_stop_ids(self, stop_id: str) -> List[str]:
+        """Alle Steige der Station, zu der stop_id gehört (inkl. der Station selbst)."""
+        stop = self.snapshot.stop(stop_id)
+        station = (stop.parent_station if stop is not None else None) or stop_id
+        return [station] + self.snapshot.children(station)
+
+    def transfer_sec(self, from_stop: str, to_stop: str) -> Optional[int]:
+        """Nötige Umstiegszeit zwischen zwei Steigen; None = Umstieg nicht möglich."""
+        if self._transfers is None:
+            self._transfers = load_transfer_times(self.zip_path)
+        if (from_stop, to_stop) in self._transfers:
+            return self._transfers[(from_stop, to_stop)]
+        if from_stop == to_stop:
+            return MIN_TRANSFER_SEC
+        a, b = self.snapshot.stop(from_stop), self.snapshot.stop(to_stop)
+        if a is None or b is None:
+            return MIN_TRANSFER_SEC
+        return max(MIN_TRANSFER_SEC, int(haversine_m(a.lat, a.lon, b.lat, b.lon) / WALKING_SPEED_MPS))
+
+    def _active_trip_route(self, d: date) -> Dict[str, str]:
+        m = self._active.get(d)
+        if m is None:
+            m = self.snapshot.active_trip_route(d)
+            self._active = {d: m}  # nur der aktuelle Tag
+        return m
+
+    def _ensure_cached(self, stop_ids: List[str]) -> None:
+        if self.compressed is not None:
+            return
+        # Stationen (location_type 1) haben keine stop_times – sonst würde jedes Mal gescannt
+        missing = [
+            sid for sid in stop_ids
+            if not cache_db.has_cached_stop(self._con, sid) and getattr(self.snapshot.stop(sid), "location_type", None) != 1
+        ]
+        if missing:
+            cache_db.build_cache_for_stops(self.zip_path, self._con, missing)  # ein Scan für alle Steige
+
+    def arrival_sec(self, trip_id: str, stop_id: str) -> Optional[int]:
+        """
+        Planmäßige Ankunft von trip_id an stop_id (None: kommt hier nicht an).
+        Baut gleich alle Steige der Station mit – die Anschlusssuche danach
+        braucht sie, so bleibt es bei einem Scan.
+        """
+        stop_ids = self.station_stop_ids(stop_id)
+        if stop_id not in stop_ids:
+            stop_ids.append(stop_id)
+        with self._lock:
+            self._ensure_cached(stop_ids)
+            if self.compressed is not None:
+                return self.compressed.arrival_sec(stop_id, trip_id)
+            return cache_db.get_arrival_sec_cached(self._con, stop_id, trip_id)
+
+    def arrivals(
+        self,
+        stop_id: str,
+        limit: int = DEFAULT_DEPARTURES_LIMIT,
+        d: Optional[date] = None,
+        after_sec: Optional[int] = None
+    ) -> List[Tuple[str, Arrival]]:
+        """Ankunftstafel der Station: [(Steig, Arrival), ...] nach Ankunftszeit."""
+        d = d or today_date()
+        after_sec = now_seconds() if after_sec is None else after_sec
+        stop_ids = self.station_stop_ids(stop_id)
+        with self._lock:
+            active = self._active_trip_route(d)
+            self._ensure_cached(stop_ids)
+            rows: List[Tuple[str, Arrival]] = []
+            for sid in stop_ids:
+                if self.compressed is not None:
+                    arrs = self.compressed.next_arrivals(sid, active, limit, after_sec)
+                else:
+                    arrs = cache_db.get_next_arrivals_cached(self._con, sid, active, limit, after_sec)
+                rows.extend((sid, a) for a in arrs)
+        rows.sort(key=lambda x: x[1].arrival_time)
+        return rows[:limit]
+
+    def connections(
+        self,
+        trip_id: str,
+        stop_id: str,
+        d: Optional[date] = None,
+        window_sec: int = CONNECTION_WINDOW_SEC,
+        arrival_sec: Optional[int] = None
+    ) -> ConnectionResult:
+        """
+        Anschlüsse nach Ankunft von trip_id an stop_id. arrival_sec überschreibt
+        die Planankunft (z.B. mit Verspätung). Verkehrt trip_id an d nicht,
+        gibt es keine Anschlüsse.
+        """
+        d = d or today_date()
+        stop_ids = self.station_stop_ids(stop_id)
+        with self._lock:
+            if trip_id not in self._active_trip_route(d):
+                return ConnectionResult(trip_id, stop_id, None, [])
+        if arrival_sec is None:
+            arrival_sec = self.arrival_sec(trip_id, stop_id)
+        if arrival_sec is None:
+            return ConnectionResult(trip_id, stop_id, None, [])
+
+        with self._lock:
+            active = self._active_trip_route(d)
+            self._ensure_cached(stop_ids)
+            found: List[Connection] = []
+            for sid in stop_ids:
+                transfer = self.transfer_sec(stop_id, sid)
+                if transfer is None:
+                    continue
+                lo, hi = arrival_sec + transfer, arrival_sec + window_sec
+                if lo > hi:
+                    continue
+                if self.compressed is not None:
+                    deps = self.compressed.departures_between(sid, active, lo, hi)
+                else:
+                    deps = cache_db.get_departures_between_cached(self._con, sid, active, lo, hi)
+                found.extend(
+                    Connection(dep, sid, sec, transfer, sec - arrival_sec - transfer)
+                    for sec, dep in deps if dep.trip_id != trip_id
+                )
+        found.sort(key=lambda c: (c.dep_sec, c.stop_id))
+        return ConnectionResult(trip_id, stop_id, arrival_sec, found)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils import format_seconds_hhmm
+
+    parser = argparse.ArgumentParser(description="Ankunftstafel und Anschlüsse einer Station")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_arr = sub.add_parser("ankuenfte", help="nächste Ankünfte an allen Steigen")
+    p_arr.add_argument("stop_id")
+    p_arr.add_argument("--anzahl", type=int, default=DEFAULT_DEPARTURES_LIMIT)
+    p_con = sub.add_parser("anschluesse", help="Anschlüsse nach Ankunft eines Trips")
+    p_con.add_argument("trip_id")
+    p_con.add_argument("stop_id")
+    p_con.add_argument("--fenster", type=int, default=CONNECTION_WINDOW_SEC // 60, help="Minuten nach Ankunft")
+    p_con.add_argument("--verspaetung", type=int, default=0, help="Minuten Verspätung der Ankunft")
+    for p in (p_arr, p_con):
+        p.add_argument("--zip", default=GTFS_ZIP_PATH)
+        p.add_argument("--db", default=CACHE_DB_PATH)
+    args = parser.parse_args()
+
+    finder = ConnectionFinder(args.zip, args.db)
+    t0 = time.time()
+    if args.cmd == "ankuenfte":
+        rows = finder.arrivals(args.stop_id, args.anzahl)
+        for sid, a in rows:
+            print(f"{a.arrival_time[:5]}  {a.route_name or a.route_id:10s} {a.headsign or '':30s} Steig {sid}")
+        print(f"({len(rows)} Ankünfte, {(time.time() - t0) * 1000:.1f} ms)")
+    else:
+        arrival = finder.arrival_sec(args.trip_id, args.stop_id)
+        if arrival is not None:
+            arrival += args.verspaetung * 60
+        res = finder.connections(args.trip_id, args.stop_id, window_sec=args.fenster * 60, arrival_sec=arrival)
+        if res.arrival_sec is None:
+            print("Dieser Trip kommt an diesem Halt (heute) nicht an.")
+        else:
+            print(f"Ankunft {format_seconds_hhmm(res.arrival_sec)} an {args.stop_id}:")
+            for c in res.connections:
+                print(f"  {format_seconds_hhmm(c.dep_sec)}  {c.departure.route_name or c.departure.route_id:10s} "
+                      f"{c.departure.headsign or '':30s} Steig {c.stop_id}  (Umstieg {c.transfer_sec // 60} min, "
+                      f"Puffer {c.slack_sec // 60} min)")
+            print(f"({len(res.connections)} Anschlüsse, {(time.time() - t0) * 1000:.1f} ms)")
@@ -0,0 +1,464 @@
+# delay_history.py
+
+"""
+delay_history.py
+
+Aufgabe:
+    Dieses Modul speichert die Verspätungshistorie: beobachtete Verspätung
+    pro (Betriebstag, Trip, Halt) aus jedem Echtzeit-Abruf. Daraus werden
+    Pünktlichkeitskennzahlen pro Halt und pro Linie berechnet.
+
+Speicherformat:
+    <DELAY_HISTORY_DIR>/<YYYYMMDD>/
+        observations.bin   feste Datensätze (NumPy-Struktur OBS_DTYPE), nur anhängen
+        trips.tsv          Zeile i = trip_id <TAB> route_id des Trip-Index i
+        stops.tsv          Zeile i = stop_id des Halt-Index i
+    <DELAY_HISTORY_DIR>/rollups.db
+        SQLite mit vorberechneten Stunden- und Tageswerten
+
+Zentrale Aufgaben:
+    - Nur Änderungen speichern: gleiche Verspätung wie zuletzt -> kein Datensatz
+    - Kompakte, typisierte Datensätze (24 Byte) statt roher Snapshots
+    - Partitionierung nach Betriebstag
+    - Rollups pro Stunde und Tag für Halt und Linie (Mittel, p90, Anteil pünktlich)
+    - Pünktlichkeitsabfragen lesen ausschließlich die Rollups
+
+Hinweise:
+    - Für die Rollups zählt pro (Trip, Halt) die zuletzt beobachtete Verspätung.
+    - Im Speicher bleiben nur die Partitionen von heute und gestern (und die
+      zuletzt angefragte ältere). Dateien werden erst beim ersten Schreiben
+      angelegt und geöffnet; Lesen vergangener Tage legt nichts an.
+    - Rollups einmal nachts: python delay_history.py rollup (Standard: gestern).
+    - Pro Tag schreibt genau ein Prozess (record_snapshot). Andere Prozesse,
+      z.B. die Server in board_push.py und vehicles.py, lesen neue Datensätze
+      mit refresh() bzw. watch() aus den Dateien nach.
+    - p90 über mehrere Tage/Stunden wird als mit n gewichtetes Mittel der
+      gespeicherten p90-Werte angenähert (exakt wäre nur mit Rohdaten möglich).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import DELAY_HISTORY_DIR, DELAY_WATCH_SEC, ON_TIME_THRESHOLD_SEC
+from models import DelayObservation
+from utils import today_date, yyyymmdd
+
+OBS_DTYPE = np.dtype([
+    ("trip", "<i4"),
+    ("stop", "<i4"),
+    ("sched", "<i4"),
+    ("ts", "<i8"),
+    ("delay", "<i4"),
+])
+
+
+@dataclass(frozen=True)
+class PunctualitySummary:
+    observations: int
+    mean_delay_sec: float
+    p90_delay_sec: float
+    on_time_share: float
+
+
+class _Partition:
+    """
+    Ein Betriebstag: Wörterbücher, letzter Stand pro (Trip, Halt), Dateien zum
+    Anhängen (erst beim ersten append geöffnet).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.trip_index: Dict[str, int] = {}
+        self.trip_route: List[str] = []
+        self.stop_index: Dict[str, int] = {}
+        self.trip_ids: List[str] = []
+        self.last: Dict[Tuple[int, int], int] = {}
+        self.sched: Dict[Tuple[int, int], int] = {}
+        self._pos = {"trips.tsv": 0, "stops.tsv": 0, "observations.bin": 0}  # bis hierher gelesen (Bytes)
+
+        self._trips_out = self._stops_out = self._obs_out = None
+        self.tail()
+
+    def _open_for_append(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self._trips_out = open(os.path.join(self.path, "trips.tsv"), "a", encoding="utf-8")
+        self._stops_out = open(os.path.join(self.path, "stops.tsv"), "a", encoding="utf-8")
+        self._obs_out = open(os.path.join(self.path, "observations.bin"), "ab")
+
+    def _read_new(self, name: str, unit: int) -> bytes:
+        """Neue Bytes seit dem letzten Lesen, nur ganze Zeilen (unit=0) bzw. Datensätze."""
+        p = os.path.join(self.path, name)
+        if not os.path.exists(p):
+            return b""
+        with open(p, "rb") as f:
+            f.seek(self._pos[name])
+            data = f.read()
+        end = data.rfind(b"\n") + 1 if unit == 0 else len(data) - len(data) % unit
+        self._pos[name] += end
+        return data[:end]
+
+    def tail(self, changed: Optional[Set[str]] = None) -> int:
+        """
+        Liest, was seit dem letzten Lesen an die Dateien angehängt wurde (auch von
+        anderen Prozessen). Rückgabe: Anzahl neuer Datensätze.
+        """
+        for line in self._read_new("trips.tsv", 0).decode("utf-8").splitlines():
+            tid, rid = line.split("\t")
+            self.trip_index[tid] = len(self.trip_route)
+            self.trip_ids.append(tid)
+            self.trip_route.append(rid)
+        for line in self._read_new("stops.tsv", 0).decode("utf-8").splitlines():
+            self.stop_index[line] = len(self.stop_index)
+
+        obs = np.frombuffer(self._read_new("observations.bin", OBS_DTYPE.itemsize), dtype=OBS_DTYPE)
+        for t, s, sc, d in zip(obs["trip"].tolist(), obs["stop"].tolist(), obs["sched"].tolist(), obs["delay"].tolist()):
+            if changed is not None and self.last.get((t, s)) != d:
+                changed.add(self.trip_ids[t])
+            self.last[(t, s)] = d
+            self.sched[(t, s)] = sc
+        return len(obs)
+
+    def read(self) -> np.ndarray:
+        p = os.path.join(self.path, "observations.bin")
+        if not os.path.exists(p):
+            return np.zeros(0, dtype=OBS_DTYPE)
+        return np.fromfile(p, dtype=OBS_DTYPE)
+
+    def _trip(self, trip_id: str, route_id: str) -> int:
+        i = self.trip_index.get(trip_id)
+        if i is None:
+            i = len(self.trip_route)
+            self.trip_index[trip_id] = i
+            self.trip_ids.append(trip_id)
+            self.trip_route.append(route_id)
+            self._trips_out.write(f"{trip_id}\t{route_id}\n")
+        return i
+
+    def _stop(self, stop_id: str) -> int:
+        i = self.stop_index.get(stop_id)
+        if i is None:
+            i = len(self.stop_index)
+            self.stop_index[stop_id] = i
+            self._stops_out.write(stop_id + "\n")
+        return i
+
+    def append(self, observations: Iterable[DelayObservation], ts: int, changed: Optional[Set[str]] = None) -> int:
+        if self._obs_out is None:
+            self._open_for_append()
+        rows = []
+        for o in observations:
+            t = self._trip(o.trip_id, o.route_id)
+            s = self._stop(o.stop_id)
+            if self.last.get((t, s)) == o.delay_sec:
+                continue  # unverändert -> nichts speichern
+            self.last[(t, s)] = o.delay_sec
+            self.sched[(t, s)] = o.scheduled_sec
+            rows.append((t, s, o.scheduled_sec, ts, o.delay_sec))
+            if changed is not None:
+                changed.add(o.trip_id)
+
+        # Wörterbücher zuerst, damit jeder Datensatz auflösbar ist
+        self._trips_out.flush()
+        self._stops_out.flush()
+        if rows:
+            np.array(rows, dtype=OBS_DTYPE).tofile(self._obs_out)
+            self._obs_out.flush()
+        # eigene Datensätze nicht noch einmal nachlesen
+        for name, f in (("trips.tsv", self._trips_out), ("stops.tsv", self._stops_out), ("observations.bin", self._obs_out)):
+            self._pos[name] = os.fstat(f.fileno()).st_size
+        return len(rows)
+
+    def close(self) -> None:
+        for f in (self._trips_out, self._stops_out, self._obs_out):
+            if f is not None:
+                f.close()
+        self._trips_out = self._stops_out = self._obs_out = None
+
+
+def _group_stats(keys: np.ndarray, delays: np.ndarray, threshold: int) -> List[Tuple[int, int, float, float, float]]:
+    """
+    Pro Schlüssel: (key, n, Mittel, p90, Anteil pünktlich) – vektorisiert über
+    eine Sortierung nach (key, delay).
+    """
+    if len(keys) == 0:
+        return []
+    order = np.lexsort((delays, keys))
+    k = keys[order]
+    d = delays[order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    ends = np.r_[starts[1:], len(k)]
+    n = ends - starts
+    sums = np.add.reduceat(d, starts)
+    on_time = np.add.reduceat((d < threshold).astype(np.int64), starts)
+    # p90 per Rang in der sortierten Gruppe (nearest rank)
+    p90 = d[starts + np.ceil(0.9 * n).astype(np.int64) - 1]
+    return list(zip(k[starts].tolist(), n.tolist(), (sums / n).tolist(), p90.tolist(), (on_time / n).tolist()))
+
+
+class DelayHistory:
+    """
+    Einstiegspunkt für Schreiben (record_snapshot), Verdichten (rollup_day)
+    und Abfragen (punctuality, hourly_profile).
+    """
+
+    def __init__(self, base_dir: str = DELAY_HISTORY_DIR, on_time_threshold_sec: int = ON_TIME_THRESHOLD_SEC):
+        self.base_dir = base_dir
+        self.threshold = on_time_threshold_sec
+        os.makedirs(base_dir, exist_ok=True)
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[date, Set[str]], None]] = []
+        self.con = sqlite3.connect(os.path.join(base_dir, "rollups.db"), check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL;")
+        self.con.execute("""
+        CREATE TABLE IF NOT EXISTS delay_rollup_hourly (
+        service_date TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean_delay REAL NOT NULL,
+        p90_delay REAL NOT NULL,
+        on_time_share REAL NOT NULL,
+        PRIMARY KEY (kind, key, service_date, hour)
+    );
+        """)
+        self.con.execute("""
+        CREATE TABLE IF NOT EXISTS delay_rollup_daily (
+        service_date TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean_delay REAL NOT NULL,
+        p90_delay REAL NOT NULL,
+        on_time_share REAL NOT NULL,
+        PRIMARY KEY (kind, key, service_date)
+    );
+        """)
+        self.con.commit()
+
+    def _partition(self, service_date: date) -> _Partition:
+        day = yyyymmdd(service_date)
+        p = self._partitions.get(day)
+        if p is None:
+            # ältere Tage als gestern nicht offen halten (Speicher, Dateien)
+            keep = yyyymmdd(today_date() - timedelta(days=1))
+            for old in [k for k in self._partitions if k < keep]:
+                self._partitions.pop(old).close()
+            p = _Partition(os.path.join(self.base_dir, day))
+            self._partitions[day] = p
+        return p
+
+    def record_snapshot(self, service_date: date, observations: Iterable[DelayObservation], observed_at: int) -> int:
+        """
+        Übernimmt einen Echtzeit-Abruf. Es werden nur Beobachtungen gespeichert,
+        deren Verspätung sich seit dem letzten Abruf geändert hat.
+
+        Parameter:
+            observed_at (int): Zeitpunkt des Abrufs (Unix-Zeit).
+
+        Rückgabe:
+            Anzahl neu gespeicherter Datensätze.
+        """
+        changed: Set[str] = set()
+        with self._lock:
+            n = self._partition(service_date).append(observations, observed_at, changed)
+            listeners = list(self._listeners)
+        if changed:
+            for callback in listeners:
+                callback(service_date, changed)
+        return n
+
+    def refresh(self, service_date: date) -> int:
+        """
+        Übernimmt Datensätze, die ein anderer Prozess inzwischen angehängt hat,
+        und benachrichtigt die Abonnenten wie record_snapshot.
+        Rückgabe: Anzahl neuer Datensätze.
+        """
+        changed: Set[str] = set()
+        with self._lock:
+            n = self._partition(service_date).tail(changed)
+            listeners = list(self._listeners)
+        if changed:
+            for callback in listeners:
+                callback(service_date, changed)
+        return n
+
+    def watch(self, interval_sec: float = DELAY_WATCH_SEC) -> threading.Thread:
+        """
+        Hintergrund-Thread: ruft refresh() für heute und gestern (Fahrten nach
+        Mitternacht) alle interval_sec Sekunden auf. Für Prozesse, die nur lesen.
+        """
+        def loop() -> None:
+            while True:
+                d = today_date()
+                for day in (d - timedelta(days=1), d):
+                    self.refresh(day)
+                time.sleep(interval_sec)
+
+        t = threading.Thread(target=loop, name="delay-watch", daemon=True)
+        t.start()
+        return t
+
+    def subscribe(self, callback: Callable[[date, Set[str]], None]) -> None:
+        """
+        callback(service_date, trip_ids) wird nach jedem Abruf mit den Trips
+        aufgerufen, deren Verspätung sich geändert hat (z.B. für board_cache.py).
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def current_delays(self, service_date: date) -> Dict[Tuple[str, str], int]:
+        """Zuletzt beobachtete Verspätung je (trip_id, stop_id) des Betriebstags (z.B. für vehicles.py)."""
+        with self._lock:
+            p = self._partition(service_date)
+            trips = list(p.trip_index)
+            stops = list(p.stop_index)
+            return {(trips[t], stops[s]): d for (t, s), d in p.last.items()}
+
+    def current_trip_delays(self, service_date: date) -> Dict[str, List[Tuple[int, str, int]]]:
+        """
+        Wie current_delays, aber je Trip: trip_id -> [(Planzeit, stop_id, Verspätung), ...]
+        nach Planzeit sortiert (zum Weiterreichen auf spätere Halte, z.B. board_push.py).
+        """
+        with self._lock:
+            p = self._partition(service_date)
+            trips = list(p.trip_index)
+            stops = list(p.stop_index)
+            out: Dict[str, List[Tuple[int, str, int]]] = {}
+            for (t, s), d in p.last.items():
+                out.setdefault(trips[t], []).append((p.sched[(t, s)], stops[s], d))
+        for events in out.values():
+            events.sort()
+        return out
+
+    def rollup_day(self, service_date: date) -> int:
+        """
+        Berechnet die Stunden- und Tageswerte eines Betriebstags neu
+        (idempotent, kann nach jedem Abruf oder einmal nachts laufen).
+        Rückgabe: Anzahl ausgewerteter (Trip, Halt)-Paare.
+        """
+        with self._lock:
+            p = self._partition(service_date)
+            obs = p.read()
+            stop_ids = list(p.stop_index)
+            route_of_trip = list(p.trip_route)
+        day = yyyymmdd(service_date)
+
+        if len(obs):
+            # letzte Beobachtung pro (Trip, Halt): Datei ist zeitlich geordnet
+            pair = obs["trip"].astype(np.int64) * (len(stop_ids) + 1) + obs["stop"]
+            _, last_rev = np.unique(pair[::-1], return_index=True)
+            final = obs[len(obs) - 1 - last_rev]
+        else:
+            final = obs
+
+        delays = final["delay"].astype(np.int64)
+        hours = (final["sched"] // 3600).astype(np.int64)
+        route_names = sorted(set(route_of_trip))
+        route_idx = {r: i for i, r in enumerate(route_names)}
+        trip_route = np.array([route_idx[r] for r in route_of_trip], dtype=np.int64)
+        routes = trip_route[final["trip"]] if len(final) else np.zeros(0, dtype=np.int64)
+        stops = final["stop"].astype(np.int64)
+
+        hourly_rows = []
+        daily_rows = []
+        for kind, keys, names in (("stop", stops, stop_ids), ("route", routes, route_names)):
+            for key, n, mean, p90, share in _group_stats(keys, delays, self.threshold):
+                daily_rows.append((day, kind, names[key], n, mean, p90, share))
+            for key, n, mean, p90, share in _group_stats(keys * 48 + hours, delays, self.threshold):
+                hourly_rows.append((day, key % 48, kind, names[key // 48], n, mean, p90, share))
+
+        with self.con:
+            self.con.execute("DELETE FROM delay_rollup_daily WHERE service_date=?;", (day,))
+            self.con.execute("DELETE FROM delay_rollup_hourly WHERE service_date=?;", (day,))
+            self.con.executemany(
+                "INSERT INTO delay_rollup_daily(service_date,kind,key,n,mean_delay,p90_delay,on_time_share) "
+                "VALUES (?,?,?,?,?,?,?);", daily_rows)
+            self.con.executemany(
+                "INSERT INTO delay_rollup_hourly(service_date,hour,kind,key,n,mean_delay,p90_delay,on_time_share) "
+                "VALUES (?,?,?,?,?,?,?,?);", hourly_rows)
+        return len(final)
+
+    def punctuality(self, kind: str, key: str, start: date, end: date) -> Optional[PunctualitySummary]:
+        """
+        Pünktlichkeit eines Halts (kind="stop") oder einer Linie (kind="route")
+        im Zeitraum [start, end] – liest nur die Tageswerte.
+        """
+        row = self.con.execute(
+            """
+            SELECT SUM(n), SUM(n * mean_delay), SUM(n * p90_delay), SUM(n * on_time_share)
+            FROM delay_rollup_daily
+            WHERE kind=? AND key=? AND service_date BETWEEN ? AND ?;
+            """,
+            (kind, key, yyyymmdd(start), yyyymmdd(end))
+        ).fetchone()
+        n = row[0] or 0
+        if not n:
+            return None
+        return PunctualitySummary(n, row[1] / n, row[2] / n, row[3] / n)
+
+    def hourly_profile(self, kind: str, key: str, start: date, end: date) -> List[Tuple[int, PunctualitySummary]]:
+        """Pünktlichkeit je Stunde des Tages über den Zeitraum (aus den Stundenwerten)."""
+        cur = self.con.execute(
+            """
+            SELECT hour, SUM(n), SUM(n * mean_delay), SUM(n * p90_delay), SUM(n * on_time_share)
+            FROM delay_rollup_hourly
+            WHERE kind=? AND key=? AND service_date BETWEEN ? AND ?
+            GROUP BY hour ORDER BY hour;
+            """,
+            (kind, key, yyyymmdd(start), yyyymmdd(end))
+        )
+        return [(h, PunctualitySummary(n, a / n, b / n, c / n)) for h, n, a, b, c in cur.fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            for p in self._partitions.values():
+                p.close()
+            self._partitions.clear()
+        self.con.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verspätungshistorie: Rollups und Pünktlichkeit")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_roll = sub.add_parser("rollup", help="Stunden- und Tageswerte berechnen (z.B. nachts per cron)")
+    p_roll.add_argument("--datum", help="Betriebstag YYYY-MM-DD (Standard: gestern)")
+    p_roll.add_argument("--tage", type=int, default=1, help="so viele Tage bis einschließlich --datum")
+    p_punct = sub.add_parser("puenktlichkeit", help="Pünktlichkeit eines Halts oder einer Linie")
+    p_punct.add_argument("art", choices=["stop", "route"])
+    p_punct.add_argument("id", help="stop_id bzw. route_id")
+    p_punct.add_argument("--von", help="YYYY-MM-DD (Standard: vor 7 Tagen)")
+    p_punct.add_argument("--bis", help="YYYY-MM-DD (Standard: gestern)")
+    for p in (p_roll, p_punct):
+        p.add_argument("--verzeichnis", default=DELAY_HISTORY_DIR)
+    args = parser.parse_args()
+
+    history = DelayHistory(args.verzeichnis)
+    yesterday = today_date() - timedelta(days=1)
+    if args.cmd == "rollup":
+        last = date.fromisoformat(args.datum) if args.datum else yesterday
+        for i in range(args.tage - 1, -1, -1):
+            d = last - timedelta(days=i)
+            t0 = time.time()
+            n = history.rollup_day(d)
+            print(f"{d.isoformat()}: {n} (Trip, Halt)-Paare verdichtet in {time.time() - t0:.2f}s")
+    else:
+        end = date.fromisoformat(args.bis) if args.bis else yesterday
+        start = date.fromisoformat(args.von) if args.von else end - timedelta(days=6)
+        s = history.punctuality(args.art, args.id, start, end)
+        if s is None:
+            print("Keine Rollups im Zeitraum (zuerst: python delay_history.py rollup).")
+        else:
+            print(f"{s.observations} Beobachtungen, Mittel {s.mean_delay_sec / 60:.1f} min, "
+                  f"p90 {s.p90_delay_sec / 60:.1f} min, pünktlich {s.on_time_share:.0%}")
+    history.close()
@@ -0,0 +1,581 @@
+# feed_snapshot.py
+
+"""
+feed_snapshot.py
+
+Aufgabe:
+    Dieses Modul "kompiliert" die kleinen und mittleren Tabellen des Feeds
+    (Halte, Linien, Trips, Kalender, Stationshierarchie, Suchindex) in eine
+    einzige versionierte Binärdatei. Ein neuer Prozess öffnet sie per mmap
+    und kann sofort suchen und Abfahrten filtern, ohne die ZIP anzufassen.
+
+Verwendete GTFS-Dateien (nur beim Kompilieren):
+    - stops.txt
+    - routes.txt
+    - trips.txt
+    - calendar.txt / calendar_dates.txt
+
+Zentrale Aufgaben:
+    - Tabellen als flache NumPy-Spalten ablegen; Texte als UTF-8-Block mit
+      Offsets (kein Pickle, keine Python-Objekte in der Datei)
+    - Laden per mmap: die Arrays zeigen direkt in die Datei, das Betriebssystem
+      teilt die Seiten zwischen allen Prozessen (Streamlit-Worker, Cron, CLI)
+    - Stationssuche direkt auf dem gemappten Namensblock (vorsortiert wie
+      stops.search_stops, daher Abbruch nach `limit` Treffern)
+    - aktive Services und trip_id -> route_id für ein Datum (wie calendar_.py
+      und departures.py)
+
+Dateiformat:
+    MAGIC (8 Bytes) | Version, Header-Länge (je uint32) | JSON-Header |
+    Arrays, jeweils auf 64 Bytes ausgerichtet. Der Header nennt für jedes
+    Array dtype, Länge und Offset sowie den Fingerprint des Feeds.
+
+Hinweise:
+    - Die Datei wird neu geschrieben, wenn sich der Feed (Fingerprint) oder
+      SNAPSHOT_VERSION ändert. Jeder Schreiber schreibt in eine eigene
+      temporäre Datei, die dann umbenannt wird – laufende Prozesse lesen
+      ungestört die alte weiter, gleichzeitig startende Worker überschreiben
+      sich nicht gegenseitig halbe Dateien.
+    - stop_times.txt gehört nicht hinein, dafür gibt es cache_db.py und
+      timetable.py.
+"""
+
+import json
+import mmap
+import os
+import tempfile
+from datetime import date
+from itertools import compress
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import GTFS_ZIP_PATH, SNAPSHOT_PATH
+from gtfs_zip import iter_rows, has_file
+from models import Stop
+from utils import yyyymmdd
+
+SNAPSHOT_VERSION = 1
+MAGIC = b"GTFSSNAP"
+ALIGN = 64
+SEP = "\x00"
+
+
+class StringColumn:
+    """Texte als ein UTF-8-Block; Eintrag i liegt in data[off[i]:off[i+1]-1] (mit \\0 abgeschlossen)."""
+
+    def __init__(self, data: np.ndarray, off: np.ndarray):
+        self.data = data
+        self.off = off
+
+    def __len__(self) -> int:
+        return len(self.off) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[int(self.off[i]):int(self.off[i + 1]) - 1].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        if len(self) == 0:
+            return []
+        return self.data.tobytes().decode("utf-8").split(SEP)[:-1]
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [(v.replace(SEP, "") + SEP).encode("utf-8") for v in values]
+    off = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=off[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), off
+
+
+def _int_or(text: str, default: int) -> int:
+    text = (text or "").strip()
+    return int(text) if text.isdigit() else default
+
+
+# ---------------------------
+# Kompilieren
+# ---------------------------
+
+def compile_snapshot(zip_path: str = GTFS_ZIP_PATH) -> Tuple[Dict[str, np.ndarray], Dict[str, List[str]], str]:
+    """
+    Liest die Tabellen aus der ZIP.
+    Rückgabe: (Zahlen-Arrays, Text-Spalten, Fingerprint).
+    """
+    from stops import load_stops
+    from timetable import feed_fingerprint
+
+    arrays: Dict[str, np.ndarray] = {}
+    strings: Dict[str, List[str]] = {}
+
+    # Halte (gleiche Auswahl wie stops.load_stops, Reihenfolge wie in stops.txt)
+    stops_by_id = load_stops(zip_path)
+    stop_list = list(stops_by_id.values())
+    stop_index = {s.stop_id: i for i, s in enumerate(stop_list)}
+    strings["stop_id"] = [s.stop_id for s in stop_list]
+    strings["stop_name"] = [s.stop_name for s in stop_list]
+    arrays["stop_lat"] = np.array([s.lat for s in stop_list], dtype=np.float64)
+    arrays["stop_lon"] = np.array([s.lon for s in stop_list], dtype=np.float64)
+    arrays["stop_parent"] = np.array(
+        [stop_index.get(s.parent_station, -1) if s.parent_station else -1 for s in stop_list], dtype=np.int32
+    )
+    arrays["stop_type"] = np.array(
+        [-1 if s.location_type is None else s.location_type for s in stop_list], dtype=np.int8
+    )
+    arrays["stop_order"] = np.argsort(np.array(strings["stop_id"], dtype=object), kind="stable").astype(np.int32)
+
+    # Stationshierarchie: Kinder je Halt (CSR)
+    parent = arrays["stop_parent"]
+    has_parent = np.flatnonzero(parent >= 0)
+    by_parent = has_parent[np.argsort(parent[has_parent], kind="stable")]
+    arrays["child_idx"] = by_parent.astype(np.int32)
+    arrays["child_ptr"] = np.zeros(len(stop_list) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parent[has_parent], minlength=len(stop_list)), out=arrays["child_ptr"][1:])
+
+    # Suchindex: kleingeschriebene Namen, sortiert wie search_stops (Länge, Name, Dateireihenfolge)
+    search_order = sorted(range(len(stop_list)), key=lambda i: (len(stop_list[i].stop_name), stop_list[i].stop_name))
+    strings["search_key"] = [stop_list[i].stop_name.lower() for i in search_order]
+    arrays["search_stop"] = np.array(search_order, dtype=np.int32)
+
+    # Linien (routes.txt plus route_ids, die nur in trips.txt vorkommen)
+    route_ids: List[str] = []
+    route_short: List[str] = []
+    route_long: List[str] = []
+    route_type: List[int] = []
+    route_index: Dict[str, int] = {}
+    for row in iter_rows(zip_path, "routes.txt"):
+        rid = (row.get("route_id") or "").strip()
+        if not rid or rid in route_index:
+            continue
+        route_index[rid] = len(route_ids)
+        route_ids.append(rid)
+        route_short.append((row.get("route_short_name") or "").strip())
+        route_long.append((row.get("route_long_name") or "").strip())
+        route_type.append(_int_or(row.get("route_type"), -1))
+
+    # Services
+    service_ids: List[str] = []
+    service_index: Dict[str, int] = {}
+
+    def service(sid: str) -> int:
+        i = service_index.get(sid)
+        if i is None:
+            i = service_index[sid] = len(service_ids)
+            service_ids.append(sid)
+        return i
+
+    # Trips (wie departures.build_active_trip_route_map: trip_id und route_id nötig)
+    trip_ids: List[str] = []
+    trip_route: List[int] = []
+    trip_service: List[int] = []
+    trip_headsign: List[int] = []
+    trip_direction: List[int] = []
+    headsigns: List[str] = []
+    headsign_index: Dict[str, int] = {}
+    for row in iter_rows(zip_path, "trips.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        rid = (row.get("route_id") or "").strip()
+        if not tid or not rid:
+            continue
+        if rid not in route_index:
+            route_index[rid] = len(route_ids)
+            route_ids.append(rid)
+            route_short.append("")
+            route_long.append("")
+            route_type.append(-1)
+        hs = (row.get("trip_headsign") or "").strip()
+        h = headsign_index.get(hs)
+        if h is None:
+            h = headsign_index[hs] = len(headsigns)
+            headsigns.append(hs)
+        trip_ids.append(tid)
+        trip_route.append(route_index[rid])
+        trip_service.append(service((row.get("service_id") or "").strip()))
+        trip_headsign.append(h)
+        trip_direction.append(_int_or(row.get("direction_id"), -1))
+
+    strings["route_id"] = route_ids
+    strings["route_short_name"] = route_short
+    strings["route_long_name"] = route_long
+    arrays["route_type"] = np.array(route_type, dtype=np.int16)
+    strings["trip_id"] = trip_ids
+    strings["headsign"] = headsigns
+    arrays["trip_route"] = np.array(trip_route, dtype=np.int32)
+    arrays["trip_service"] = np.array(trip_service, dtype=np.int32)
+    arrays["trip_headsign"] = np.array(trip_headsign, dtype=np.int32)
+    arrays["trip_direction"] = np.array(trip_direction, dtype=np.int8)
+    arrays["trip_order"] = np.argsort(np.array(trip_ids, dtype=object), kind="stable").astype(np.int32)
+
+    # Kalender: eine Zeile pro calendar.txt-Eintrag, Wochentage als Bitmaske (Bit 0 = Montag)
+    weekdays = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+    cal_service: List[int] = []
+    cal_days: List[int] = []
+    cal_start: List[int] = []
+    cal_end: List[int] = []
+    if has_file(zip_path, "calendar.txt"):
+        for row in iter_rows(zip_path, "calendar.txt"):
+            sid = (row.get("service_id") or "").strip()
+            start = _int_or(row.get("start_date"), -1)
+            end = _int_or(row.get("end_date"), -1)
+            if not sid or start < 0 or end < 0:
+                continue
+            cal_service.append(service(sid))
+            cal_days.append(sum(1 << i for i, k in enumerate(weekdays) if (row.get(k) or "0").strip() == "1"))
+            cal_start.append(start)
+            cal_end.append(end)
+
+    # Ausnahmen, nach Datum sortiert (innerhalb eines Datums Dateireihenfolge)
+    ex_date: List[int] = []
+    ex_service: List[int] = []
+    ex_type: List[int] = []
+    if has_file(zip_path, "calendar_dates.txt"):
+        for row in iter_rows(zip_path, "calendar_dates.txt"):
+            sid = (row.get("service_id") or "").strip()
+            day = _int_or(row.get("date"), -1)
+            ex = _int_or(row.get("exception_type"), 0)
+            if not sid or day < 0 or ex not in (1, 2):
+                continue
+            ex_date.append(day)
+            ex_service.append(service(sid))
+            ex_type.append(ex)
+
+    strings["service_id"] = service_ids
+    arrays["cal_service"] = np.array(cal_service, dtype=np.int32)
+    arrays["cal_days"] = np.array(cal_days, dtype=np.uint8)
+    arrays["cal_start"] = np.array(cal_start, dtype=np.int32)
+    arrays["cal_end"] = np.array(cal_end, dtype=np.int32)
+    order = np.argsort(np.array(ex_date, dtype=np.int32), kind="stable")
+    arrays["ex_date"] = np.array(ex_date, dtype=np.int32)[order]
+    arrays["ex_service"] = np.array(ex_service, dtype=np.int32)[order]
+    arrays["ex_type"] = np.array(ex_type, dtype=np.int8)[order]
+
+    return arrays, strings, feed_fingerprint(zip_path)
+
+
+def write_snapshot(path: str, arrays: Dict[str, np.ndarray], strings: Dict[str, List[str]], fingerprint: str) -> None:
+    """Schreibt die Datei (erst temporär, dann umbenennen -> nie halbe Dateien)."""
+    blocks: Dict[str, np.ndarray] = dict(arrays)
+    for name, values in strings.items():
+        blocks[name + ".data"], blocks[name + ".off"] = _encode_strings(values)
+
+    # Die Offsets hängen von der Länge des Headers ab -> bauen, bis sie sich nicht mehr ändert
+    header = b""
+    while True:
+        pos = _align(16 + len(header))
+        layout: Dict[str, list] = {}
+        for name, arr in blocks.items():
+            layout[name] = [arr.dtype.str, int(arr.size), pos]
+            pos = _align(pos + arr.nbytes)
+        new_header = json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "fingerprint": fingerprint,
+            "strings": sorted(strings),
+            "arrays": layout,
+        }).encode("utf-8")
+        if len(new_header) == len(header):
+            header = new_header
+            break
+        header = new_header
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.array([SNAPSHOT_VERSION, len(header)], dtype="<u4").tobytes())
+            f.write(header)
+            for name, arr in blocks.items():
+                f.write(b"\0" * (layout[name][2] - f.tell()))
+                f.write(np.ascontiguousarray(arr).tobytes())
+            f.write(b"\0" * (pos - f.tell()))  # auch leere Arrays am Ende liegen innerhalb der Datei
+        os.chmod(tmp, 0o644)  # mkstemp legt 0600 an, andere Worker-Benutzer sollen lesen können
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _align(pos: int) -> int:
+    return (pos + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build_snapshot(zip_path: str = GTFS_ZIP_PATH, path: str = SNAPSHOT_PATH) -> "FeedSnapshot":
+    arrays, strings, fingerprint = compile_snapshot(zip_path)
+    write_snapshot(path, arrays, strings, fingerprint)
+    return load_snapshot(path)
+
+
+# ---------------------------
+# Laden und Abfragen
+# ---------------------------
+
+class FeedSnapshot:
+    """
+    Gemappter Snapshot. Alle Arrays sind schreibgeschützte Sichten auf die Datei.
+
+        snap = get_snapshot()
+        hits = snap.search("Mannheim")                  # wie stops.search_stops
+        active = snap.active_trip_route(today_date())   # trip_id -> route_id
+    """
+
+    def __init__(self, path: str, mm: mmap.mmap, header: dict):
+        self.path = path
+        self.fingerprint: str = header["fingerprint"]
+        self._mm = mm
+        self._layout: Dict[str, list] = header["arrays"]
+        for name, (dtype, count, offset) in self._layout.items():
+            if name.endswith(".data") or name.endswith(".off"):
+                continue
+            setattr(self, name, np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=offset))
+        for name in header["strings"]:
+            setattr(self, name, StringColumn(self._array(name + ".data"), self._array(name + ".off")))
+        self._stops_by_id: Optional[Dict[str, Stop]] = None
+
+    def _array(self, name: str) -> np.ndarray:
+        dtype, count, offset = self._layout[name]
+        return np.frombuffer(self._mm, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_id)
+
+    @property
+    def n_trips(self) -> int:
+        return len(self.trip_id)
+
+    # --- Halte ---
+
+    @staticmethod
+    def _find(col: StringColumn, order: np.ndarray, key: str) -> int:
+        """Binäre Suche über die sortierte Reihenfolge; -1 = nicht vorhanden."""
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if col[int(order[mid])] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and col[int(order[lo])] == key:
+            return int(order[lo])
+        return -1
+
+    def stop_index(self, stop_id: str) -> int:
+        return self._find(self.stop_id, self.stop_order, stop_id)
+
+    def _stop_at(self, i: int) -> Stop:
+        p = int(self.stop_parent[i])
+        t = int(self.stop_type[i])
+        return Stop(
+            self.stop_id[i], self.stop_name[i], float(self.stop_lat[i]), float(self.stop_lon[i]),
+            parent_station=self.stop_id[p] if p >= 0 else None,
+            location_type=t if t >= 0 else None,
+        )
+
+    def stop(self, stop_id: str) -> Optional[Stop]:
+        i = self.stop_index(stop_id)
+        return self._stop_at(i) if i >= 0 else None
+
+    def stops_by_id(self) -> Dict[str, Stop]:
+        """Alle Halte als Dict wie stops.load_stops (einmal gebaut, danach gemerkt)."""
+        if self._stops_by_id is None:
+            ids = self.stop_id.tolist()
+            names = self.stop_name.tolist()
+            parents = self.stop_parent.tolist()
+            types = self.stop_type.tolist()
+            self._stops_by_id = {
+                sid: Stop(sid, name, lat, lon,
+                          parent_station=ids[p] if p >= 0 else None,
+                          location_type=t if t >= 0 else None)
+                for sid, name, lat, lon, p, t in zip(
+                    ids, names, self.stop_lat.tolist(), self.stop_lon.tolist(), parents, types
+                )
+            }
+        return self._stops_by_id
+
+    def children(self, stop_id: str) -> List[str]:
+        """Kinder (Bahnsteige) einer Station, wie stops.child_stop_ids."""
+        i = self.stop_index(stop_id)
+        if i < 0:
+            return []
+        return [self.stop_id[int(c)] for c in self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]]
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """
+        Substring-Suche wie stops.search_stops, gleiche Treffer in gleicher
+        Reihenfolge. Gesucht wird direkt im gemappten Namensblock; weil die
+        Namen schon sortiert sind, endet die Suche nach `limit` Treffern.
+        """
+        q = query.strip().lower().replace(SEP, "").encode("utf-8")
+        _, _, start = self._layout["search_key.data"]
+        off = self.search_key.off
+        end = start + int(off[-1])
+
+        entries: List[int] = []
+        if not q:
+            entries = list(range(min(limit, len(self.search_key))))
+        pos = start
+        while q and len(entries) < limit:
+            hit = self._mm.find(q, pos, end)
+            if hit < 0:
+                break
+            e = int(np.searchsorted(off, hit - start, side="right")) - 1
+            entries.append(e)
+            pos = start + int(off[e + 1])
+
+        result = []
+        for e in entries:
+            i = int(self.search_stop[e])
+            result.append((self.stop_id[i], self.stop_name[i]))
+        return result
+
+    # --- Linien und Kalender ---
+
+    def routes(self) -> Dict[str, Dict[str, str]]:
+        """route_id -> Zeile wie departures.load_routes (nur die Anzeigespalten)."""
+        types = self.route_type.tolist()
+        return {
+            rid: {"route_id": rid, "route_short_name": short, "route_long_name": long,
+                  "route_type": str(t) if t >= 0 else ""}
+            for rid, short, long, t in zip(
+                self.route_id.tolist(), self.route_short_name.tolist(), self.route_long_name.tolist(), types
+            )
+        }
+
+    def service_mask(self, d: date) -> np.ndarray:
+        """Bool-Array über service_id: aktiv an d (Logik wie calendar_.active_service_ids)."""
+        day = int(yyyymmdd(d))
+        active = np.zeros(len(self.service_id), dtype=bool)
+        on = (self.cal_start <= day) & (day <= self.cal_end) & ((self.cal_days >> d.weekday()) & 1).astype(bool)
+        active[self.cal_service[on]] = True
+
+        lo = int(np.searchsorted(self.ex_date, day, side="left"))
+        hi = int(np.searchsorted(self.ex_date, day, side="right"))
+        for s, ex in zip(self.ex_service[lo:hi].tolist(), self.ex_type[lo:hi].tolist()):
+            active[s] = ex == 1
+        return active
+
+    def active_service_ids(self, d: date) -> Set[str]:
+        ids = self.service_id.tolist()
+        return {ids[i] for i in np.flatnonzero(self.service_mask(d)).tolist()}
+
+    def active_trip_route(self, d: date, fallback_all: bool = True) -> Dict[str, str]:
+        """
+        trip_id -> route_id der an d aktiven Trips. Ist an d gar kein Service
+        aktiv und fallback_all gesetzt: alle Trips (wie build_trip_route_map_all).
+        """
+        services = self.service_mask(d)
+        if services.any() or not fallback_all:
+            mask = services[self.trip_service]
+        else:
+            mask = np.ones(self.n_trips, dtype=bool)
+        route_ids = self.route_id.tolist()
+        return dict(zip(
+            compress(self.trip_id.tolist(), mask.tolist()),
+            (route_ids[r] for r in self.trip_route[mask].tolist()),
+        ))
+
+    def size_bytes(self) -> int:
+        return len(self._mm)
+
+
+def read_header(path: str) -> Optional[dict]:
+    """Nur den Header lesen (z.B. für Versions-/Fingerprint-Prüfung)."""
+    with open(path, "rb") as f:
+        head = f.read(16)
+        if len(head) < 16 or head[:8] != MAGIC:
+            return None
+        version, length = np.frombuffer(head[8:16], dtype="<u4").tolist()
+        if version != SNAPSHOT_VERSION:
+            return None
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Optional[FeedSnapshot]:
+    """Datei per mmap öffnen; None, falls sie fehlt, kaputt ist oder die Version nicht passt."""
+    if not os.path.exists(path):
+        return None
+    header = read_header(path)
+    if header is None:
+        return None
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return FeedSnapshot(path, mm, header)
+
+
+_LOADED: Dict[str, FeedSnapshot] = {}
+
+
+def get_snapshot(zip_path: str = GTFS_ZIP_PATH, path: str = SNAPSHOT_PATH) -> FeedSnapshot:
+    """
+    Liefert den Snapshot:
+        1) aus dem Prozess-Speicher,
+        2) aus der Datei (wenn zum Feed passend; fehlt die ZIP, wird die Datei
+           ohne Prüfung genommen),
+        3) sonst neu kompiliert und geschrieben.
+    """
+    from timetable import feed_fingerprint
+
+    fp = feed_fingerprint(zip_path) if os.path.exists(zip_path) else None
+    snap = _LOADED.get(path)
+    if snap is not None and (fp is None or snap.fingerprint == fp):
+        return snap
+
+    snap = load_snapshot(path)
+    if snap is None or (fp is not None and snap.fingerprint != fp):
+        snap = build_snapshot(zip_path, path)
+
+    _LOADED[path] = snap
+    return snap
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils import today_date
+
+    parser = argparse.ArgumentParser(description="Kompilierter Feed-Snapshot (Halte, Linien, Trips, Kalender)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Snapshot aus der ZIP kompilieren")
+    p_build.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_build.add_argument("--out", default=SNAPSHOT_PATH)
+
+    p_info = sub.add_parser("info", help="Inhalt und Ladezeit anzeigen")
+    p_info.add_argument("--pfad", default=SNAPSHOT_PATH)
+
+    p_search = sub.add_parser("suche", help="Kaltstart + Stationssuche messen")
+    p_search.add_argument("text")
+    p_search.add_argument("--pfad", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        t0 = time.time()
+        snap = build_snapshot(args.zip, args.out)
+        print(f"Snapshot geschrieben: {args.out} ({snap.size_bytes() / 1e6:.1f} MB) in {time.time() - t0:.1f}s")
+        print(f"  Halte: {snap.n_stops}, Linien: {len(snap.route_id)}, Trips: {snap.n_trips}, "
+              f"Services: {len(snap.service_id)}")
+
+    elif args.cmd == "info":
+        t0 = time.perf_counter()
+        snap = load_snapshot(args.pfad)
+        if snap is None:
+            raise SystemExit("Kein gültiger Snapshot (fehlt oder falsche Version).")
+        t_load = time.perf_counter() - t0
+        print(f"{args.pfad}: Version {SNAPSHOT_VERSION}, Feed {snap.fingerprint}, {snap.size_bytes() / 1e6:.1f} MB")
+        print(f"  Halte: {snap.n_stops}, Linien: {len(snap.route_id)}, Trips: {snap.n_trips}, "
+              f"Services: {len(snap.service_id)}")
+        t0 = time.perf_counter()
+        active = snap.active_trip_route(today_date())
+        print(f"  Öffnen: {t_load * 1000:.1f} ms, heute aktive Trips: {len(active)} "
+              f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+    else:
+        t0 = time.perf_counter()
+        snap = load_snapshot(args.pfad)
+        if snap is None:
+            raise SystemExit("Kein gültiger Snapshot (fehlt oder falsche Version).")
+        hits = snap.search(args.text)
+        dt = time.perf_counter() - t0
+        for i, (sid, name) in enumerate(hits, start=1):
+            print(f"{i:2d}. {name}  ({sid})")
+        print(f"\nÖffnen + erste Suche: {dt * 1000:.1f} ms")
@@ -0,0 +1,349 @@
+# feed_update.py
+
+"""
+feed_update.py
+
+Aufgabe:
+    Dieses Modul aktualisiert den SQLite-Cache inkrementell, wenn ein neuer
+    Feed (neue ZIP-Datei von gtfs.de) erscheint. Statt alles neu einzulesen,
+    werden nur die tatsächlich geänderten Trips gelöscht bzw. neu eingefügt.
+
+Verwendete GTFS-Dateien:
+    - trips.txt
+    - routes.txt
+    - stop_times.txt
+    - shapes.txt      (nur Linienverläufe, siehe shapes.py)
+
+Zentrale Aufgaben:
+    - Vergleich der CRC32-Prüfsummen aus dem ZIP-Verzeichnis (ohne Entpacken)
+    - Unveränderte Dateien werden komplett übersprungen
+    - Pro Trip ein Hash über seine Zeilen (trips.txt, stop_times.txt, Route)
+    - Differenz alt/neu: gelöschte, geänderte und neue Trips
+    - Nur diese Trips werden im stop_times_cache ersetzt
+    - Linienverläufe (shapes.py) werden neu aufgebaut, wenn sich trips.txt,
+      shapes.txt oder stop_times.txt geändert hat
+
+Hinweise:
+    - Der Zeilen-Hash eines Trips ist eine Summe von Einzel-Hashes und damit
+      unabhängig von der Zeilenreihenfolge in stop_times.txt.
+    - Der kompilierte Tagesfahrplan (timetable.py) erkennt einen neuen Feed
+      selbst (Größe/Änderungszeit) und wird beim nächsten Zugriff neu gebaut.
+      Der Feed-Snapshot (feed_snapshot.py) ebenso; die CLI baut ihn nach dem
+      Abgleich gleich mit, damit nicht der erste Worker darauf warten muss.
+    - stops.txt und die Kalenderdateien liegen nicht im Cache und brauchen
+      hier keine Behandlung.
+"""
+
+import hashlib
+import sqlite3
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+from cache_db import insert_cache_rows, make_cache_row, has_compressed_cache, build_compressed_cache
+from cache_db import track_first_stop, clear_origin_arrivals, build_cache_for_stops
+from cache_db import track_last_stop, clear_terminal_departures
+from gtfs_zip import iter_rows
+from shapes import build_shapes
+
+HASH_MASK = (1 << 63) - 1  # SQLite INTEGER ist vorzeichenbehaftet (64 bit)
+
+# Spalten, die den Inhalt eines Trips bestimmen
+TRIP_FIELDS = ("route_id", "service_id", "trip_headsign", "direction_id")
+STOP_TIME_FIELDS = ("stop_id", "stop_sequence", "arrival_time", "departure_time")
+ROUTE_FIELDS = ("route_short_name", "route_long_name", "route_type")
+
+RELEVANT_MEMBERS = ("trips.txt", "routes.txt", "stop_times.txt", "shapes.txt")
+# Verlauf-Tabellen hängen an Trip -> shape_id und den Halte-Folgen
+SHAPE_MEMBERS = ("trips.txt", "shapes.txt", "stop_times.txt")
+
+
+@dataclass
+class UpdateReport:
+    changed_members: List[str] = field(default_factory=list)
+    skipped_members: List[str] = field(default_factory=list)
+    added_trips: int = 0
+    changed_trips: int = 0
+    deleted_trips: int = 0
+    inserted_rows: int = 0
+    deleted_rows: int = 0
+    initial: bool = False
+    compressed_rebuilt: bool = False
+    shapes_rebuilt: bool = False
+
+
+def init_update_tables(con: sqlite3.Connection) -> None:
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS feed_members (
+    name TEXT PRIMARY KEY,
+    crc INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS feed_row_hashes (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+    """)
+    con.commit()
+
+
+def member_crcs(zip_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    CRC32 und Größe jeder Datei in der ZIP – steht im ZIP-Verzeichnis,
+    es muss also nichts entpackt werden.
+    """
+    with zipfile.ZipFile(zip_path, "r") as z:
+        return {info.filename: (info.CRC, info.file_size) for info in z.infolist()}
+
+
+def stored_member_crcs(con: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+    return {name: (crc, size) for name, crc, size in con.execute("SELECT name, crc, size FROM feed_members;")}
+
+
+def _row_hash(row: Dict[str, str], fields: Iterable[str]) -> int:
+    data = "\x1f".join((row.get(f) or "").strip() for f in fields).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def hash_trips(zip_path: str) -> Dict[str, int]:
+    result: Dict[str, int] = {}
+    for row in iter_rows(zip_path, "trips.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        if tid:
+            result[tid] = _row_hash(row, TRIP_FIELDS) & HASH_MASK
+    return result
+
+
+def hash_routes(zip_path: str) -> Dict[str, int]:
+    result: Dict[str, int] = {}
+    for row in iter_rows(zip_path, "routes.txt"):
+        rid = (row.get("route_id") or "").strip()
+        if rid:
+            result[rid] = _row_hash(row, ROUTE_FIELDS) & HASH_MASK
+    return result
+
+
+def hash_stop_times(zip_path: str) -> Dict[str, int]:
+    """
+    Ein Hash pro Trip über alle seine stop_times-Zeilen (Summe der Zeilen-Hashes,
+    daher reihenfolgeunabhängig).
+    """
+    result: Dict[str, int] = {}
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        if tid:
+            result[tid] = (result.get(tid, 0) + _row_hash(row, STOP_TIME_FIELDS)) & HASH_MASK
+    return result
+
+
+def load_hashes(con: sqlite3.Connection, kind: str) -> Dict[str, int]:
+    return dict(con.execute("SELECT key, hash FROM feed_row_hashes WHERE kind=?;", (kind,)))
+
+
+def save_hashes(con: sqlite3.Connection, kind: str, hashes: Dict[str, int]) -> None:
+    con.execute("DELETE FROM feed_row_hashes WHERE kind=?;", (kind,))
+    con.executemany(
+        "INSERT INTO feed_row_hashes(kind, key, hash) VALUES (?,?,?);",
+        ((kind, k, h) for k, h in hashes.items())
+    )
+
+
+def _diff(old: Dict[str, int], new: Dict[str, int]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Rückgabe: (neu, geändert, gelöscht)"""
+    added = new.keys() - old.keys()
+    deleted = old.keys() - new.keys()
+    changed = {k for k in new.keys() & old.keys() if new[k] != old[k]}
+    return set(added), changed, set(deleted)
+
+
+def _delete_trips(con: sqlite3.Connection, trip_ids: Set[str]) -> int:
+    if not trip_ids:
+        return 0
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS upd_trips (trip_id TEXT PRIMARY KEY);")
+    con.execute("DELETE FROM upd_trips;")
+    con.executemany("INSERT INTO upd_trips(trip_id) VALUES (?);", ((t,) for t in trip_ids))
+    cur = con.execute("DELETE FROM stop_times_cache WHERE trip_id IN (SELECT trip_id FROM upd_trips);")
+    con.execute("DELETE FROM upd_trips;")
+    return cur.rowcount
+
+
+def has_shape_tables(con: sqlite3.Connection) -> bool:
+    """True, wenn in dieser Datenbank schon Verläufe aufgebaut wurden (shapes.py build)."""
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='shapes';"
+    ).fetchone() is not None
+
+
+def cached_stop_ids(con: sqlite3.Connection) -> Set[str]:
+    return {sid for (sid,) in con.execute("SELECT DISTINCT stop_id FROM stop_times_cache;")}
+
+
+def _insert_trips(zip_path: str, con: sqlite3.Connection, trip_ids: Set[str], cached_stops: Set[str]) -> int:
+    """
+    Fügt die stop_times-Zeilen der angegebenen Trips ein – aber nur für Halte,
+    die im Cache sind (der Cache wird ja pro Halt aufgebaut).
+    """
+    if not trip_ids or not cached_stops:
+        return 0
+
+    trips = {r["trip_id"]: r for r in iter_rows(zip_path, "trips.txt") if r.get("trip_id") in trip_ids}
+    routes = {r["route_id"]: r for r in iter_rows(zip_path, "routes.txt")}
+
+    rows: List[Tuple] = []
+    first_stop: Dict[str, Tuple[int, str]] = {}
+    last_stop: Dict[str, Tuple[int, str]] = {}
+    count = 0
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        if (row.get("trip_id") or "").strip() not in trip_ids:
+            continue
+        track_first_stop(row, first_stop)
+        track_last_stop(row, last_stop)
+        if (row.get("stop_id") or "").strip() not in cached_stops:
+            continue
+        cache_row = make_cache_row(row, trips, routes)
+        if cache_row is None:
+            continue
+        rows.append(cache_row)
+        count += 1
+        if len(rows) >= 5000:
+            insert_cache_rows(con, rows)
+            rows.clear()
+    insert_cache_rows(con, rows)
+    clear_origin_arrivals(con, first_stop, cached_stops)
+    clear_terminal_departures(con, last_stop, cached_stops)
+    return count
+
+
+def update_feed(zip_path: str, con: sqlite3.Connection) -> UpdateReport:
+    """
+    Gleicht den Cache mit einem neuen Feed ab.
+
+    Ablauf:
+        1) CRCs der ZIP-Einträge mit den gespeicherten vergleichen
+        2) für geänderte Dateien Hashes pro Trip/Route neu berechnen
+        3) Differenz bilden und nur betroffene Trips im Cache ersetzen
+        4) neue CRCs und Hashes speichern
+
+    Beim allerersten Aufruf gibt es nichts zu vergleichen: die Hashes werden
+    als Ausgangsstand gespeichert (initial=True). Schon vorhandene Cache-Zeilen
+    stammen dann aus einem unbekannten Feed und werden für ihre Halte mit
+    diesem Feed neu gebaut (ein Scan), ebenso der komprimierte Cache.
+
+    Die Linienverläufe werden neu aufgebaut, wenn es ihre Tabellen gibt und
+    eine ihrer Quelldateien geändert ist (auch: shapes.txt entfernt).
+    """
+    init_update_tables(con)
+    report = UpdateReport()
+
+    new_crcs = member_crcs(zip_path)
+    old_crcs = stored_member_crcs(con)
+    report.initial = not old_crcs
+
+    changed = [m for m in RELEVANT_MEMBERS if m in new_crcs and old_crcs.get(m) != new_crcs[m]]
+    shapes_changed = report.initial or any(old_crcs.get(m) != new_crcs.get(m) for m in SHAPE_MEMBERS)
+    report.changed_members = changed
+    report.skipped_members = [m for m in new_crcs if m not in changed and old_crcs.get(m) == new_crcs[m]]
+
+    old = {kind: load_hashes(con, kind) for kind in ("trip", "route", "stop_times")}
+    new = dict(old)
+    if report.initial or "trips.txt" in changed:
+        new["trip"] = hash_trips(zip_path)
+    if report.initial or "routes.txt" in changed:
+        new["route"] = hash_routes(zip_path)
+    if report.initial or "stop_times.txt" in changed:
+        new["stop_times"] = hash_stop_times(zip_path)
+
+    if report.initial:
+        cached_stops = cached_stop_ids(con)
+        if cached_stops:
+            report.deleted_rows = con.execute("SELECT COUNT(*) FROM stop_times_cache;").fetchone()[0]
+            report.inserted_rows = sum(build_cache_for_stops(zip_path, con, sorted(cached_stops)).values())
+        if has_compressed_cache(con):
+            build_compressed_cache(zip_path, con)
+            report.compressed_rebuilt = True
+
+    elif changed:
+        added, changed_trips, deleted = _diff(old["trip"], new["trip"])
+        st_added, st_changed, st_deleted = _diff(old["stop_times"], new["stop_times"])
+        changed_trips |= (st_changed | st_added) - added
+        deleted |= st_deleted
+
+        # Liniennamen stehen im Cache -> Trips geänderter Routen neu schreiben
+        _, route_changed, _ = _diff(old["route"], new["route"])
+        if route_changed:
+            for row in iter_rows(zip_path, "trips.txt"):
+                if (row.get("route_id") or "").strip() in route_changed:
+                    tid = (row.get("trip_id") or "").strip()
+                    if tid and tid not in added:
+                        changed_trips.add(tid)
+
+        deleted -= added | changed_trips
+        report.added_trips = len(added)
+        report.changed_trips = len(changed_trips)
+        report.deleted_trips = len(deleted)
+
+        # vor dem Löschen merken, sonst "verschwinden" Halte mit nur geänderten Trips
+        cached_stops = cached_stop_ids(con)
+        report.deleted_rows = _delete_trips(con, deleted | changed_trips)
+        report.inserted_rows = _insert_trips(zip_path, con, added | changed_trips, cached_stops)
+
+        # komprimierte Form hat Muster/Vorlagen über alle Trips -> neu aufbauen
+        if (added or changed_trips or deleted or "routes.txt" in changed) and has_compressed_cache(con):
+            build_compressed_cache(zip_path, con)
+            report.compressed_rebuilt = True
+
+    if shapes_changed and has_shape_tables(con):
+        build_shapes(zip_path, con)
+        report.shapes_rebuilt = True
+
+    for kind, hashes in new.items():
+        if hashes is not old[kind]:
+            save_hashes(con, kind, hashes)
+    con.execute("DELETE FROM feed_members;")
+    con.executemany(
+        "INSERT INTO feed_members(name, crc, size) VALUES (?,?,?);",
+        ((name, crc, size) for name, (crc, size) in new_crcs.items())
+    )
+    con.commit()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import GTFS_ZIP_PATH, CACHE_DB_PATH, SNAPSHOT_PATH
+    from cache_db import connect, init_db
+    from feed_snapshot import get_snapshot
+
+    parser = argparse.ArgumentParser(description="Cache inkrementell auf einen neuen Feed aktualisieren")
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    parser.add_argument("--db", default=CACHE_DB_PATH)
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    con = connect(args.db)
+    init_db(con)
+    r = update_feed(args.zip, con)
+    if r.initial:
+        print("Ausgangsstand gespeichert (erster Abgleich).")
+        if r.deleted_rows:
+            print(f"Vorhandenen Cache mit diesem Feed neu gebaut: {r.deleted_rows} -> {r.inserted_rows} Zeilen")
+        if r.compressed_rebuilt:
+            print("Komprimierter Feed-Cache neu aufgebaut.")
+        if r.shapes_rebuilt:
+            print("Linienverläufe neu aufgebaut.")
+    else:
+        print(f"Unverändert übersprungen: {', '.join(r.skipped_members) or '-'}")
+        print(f"Geändert: {', '.join(r.changed_members) or '-'}")
+        print(f"Trips neu/geändert/gelöscht: {r.added_trips}/{r.changed_trips}/{r.deleted_trips}")
+        print(f"Cache-Zeilen gelöscht/eingefügt: {r.deleted_rows}/{r.inserted_rows}")
+        if r.compressed_rebuilt:
+            print("Komprimierter Feed-Cache neu aufgebaut.")
+        if r.shapes_rebuilt:
+            print("Linienverläufe neu aufgebaut.")
+
+    snap = get_snapshot(args.zip, args.snapshot)
+    print(f"Feed-Snapshot aktuell: {args.snapshot} (Feed {snap.fingerprint})")
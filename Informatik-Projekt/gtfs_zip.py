@@ -19,11 +19,14 @@ Zentrale Aufgaben:
 
 Hinweise:
     - Alle anderen Module greifen indirekt über dieses Modul auf GTFS-Daten zu.
+    - Optional kann statt der ZIP ein Parquet-Export gelesen werden
+      (siehe columnar.py): nur benötigte Spalten, Row-Groups per Filter.
 """
 
 import csv
+import os
 import zipfile
-from typing import Dict, Iterator
+from typing import Dict, Iterator, List, Optional
 
 def iter_rows(zip_path: str, filename: str) -> Iterator[Dict[str, str]]:
     with zipfile.ZipFile(zip_path, "r") as z:
@@ -71,4 +74,54 @@ def has_file(zip_path: str, filename: str) -> bool:
     Rückgabe:
         bool: True, wenn die Datei vorhanden ist, sonst False.
     """
-    
\ No newline at end of file
+    
+
+def columnar_path(columnar_dir: str, filename: str) -> str:
+    """Pfad der Parquet-Datei zu einer GTFS-Datei, z. B. stop_times.txt -> stop_times.parquet."""
+    return os.path.join(columnar_dir, os.path.splitext(filename)[0] + ".parquet")
+
+def has_columnar(columnar_dir: str, filename: str) -> bool:
+    return os.path.exists(columnar_path(columnar_dir, filename))
+
+def read_columnar(
+    columnar_dir: str,
+    filename: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[list] = None
+):
+    """
+    Liest eine exportierte GTFS-Datei als pyarrow.Table.
+
+    Parameter:
+        columnar_dir (str): Verzeichnis des Parquet-Exports (config.COLUMNAR_DIR).
+        filename (str): GTFS-Dateiname, z. B. "stop_times.txt".
+        columns (List[str] | None): nur diese Spalten lesen (Column Projection).
+        filters (list | None): pyarrow-Filter, z. B. [("departure_time", ">=", 8 * 3600)].
+            Row-Groups, deren Statistiken nicht passen, werden gar nicht gelesen.
+
+    Hinweise:
+        - Zeiten liegen als Sekunden (int32) vor, IDs als Dictionary-Spalten.
+        - pyarrow wird erst hier importiert; ohne Export bleibt alles beim CSV-Weg.
+    """
+    import pyarrow.parquet as pq
+    return pq.read_table(columnar_path(columnar_dir, filename), columns=columns, filters=filters)
+
+def iter_rows_columnar(
+    columnar_dir: str,
+    filename: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[list] = None
+) -> Iterator[Dict[str, object]]:
+    """
+    Wie iter_rows, aber aus dem Parquet-Export und mit typisierten Werten
+    (Zeiten als Sekunden, Zahlen als int/float, fehlende Werte als None).
+    Liest Row-Group für Row-Group, damit der Speicherbedarf klein bleibt.
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(columnar_path(columnar_dir, filename), format="parquet")
+    expr = None
+    if filters:
+        import pyarrow.parquet as pq
+        expr = pq.filters_to_expression(filters)
+    for batch in dataset.to_batches(columns=columns, filter=expr):
+        yield from batch.to_pylist()
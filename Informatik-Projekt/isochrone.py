@@ -0,0 +1,153 @@
+# isochrone.py
+
+"""
+isochrone.py
+
+Aufgabe:
+    Dieses Modul berechnet Isochronen: "Wohin komme ich von dieser Station aus
+    in 30/60/90 Minuten, wenn ich um T losfahre?"
+
+Verfahren:
+    Es werden dieselben vektorisierten Runden wie in der Verbindungssuche
+    verwendet (journey.scan_rounds), nur ohne Ziel: das Ergebnis ist die
+    früheste Ankunft an JEDEM Halt (One-to-All).
+
+Zentrale Aufgaben:
+    - Früheste Ankunft pro Halt ab einer Station
+    - Einteilung in Zeitbänder (z. B. 30/60/90 Minuten)
+    - Cache pro (Datum, Station, Abfahrts-Zeitfenster)
+    - Kartenebene über route_map.add_isochrone_layer
+
+Hinweise:
+    - Die Abfahrtszeit wird auf ISOCHRONE_BUCKET_SEC aufgerundet. Alle Anfragen
+      im selben Zeitfenster teilen sich damit ein Ergebnis, und es werden nie
+      Züge benutzt, die zur angefragten Zeit schon weg sind (Reisezeiten
+      zählen ab dem Fensterende, Isochrone.dep_sec).
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import ISOCHRONE_BANDS_MIN, ISOCHRONE_BUCKET_SEC, ISOCHRONE_CACHE_SIZE, MAX_TRANSFERS
+from journey import INF, scan_rounds
+from timetable import Timetable
+
+
+class Isochrone:
+    """
+    Früheste Ankunft pro Halt (Sekunden ab Mitternacht, INF = nicht erreichbar).
+    """
+
+    def __init__(self, tt: Timetable, origin_ids: Tuple[str, ...], dep_sec: int, arrival: np.ndarray):
+        self.tt = tt
+        self.origin_ids = origin_ids
+        self.dep_sec = dep_sec
+        self.arrival = arrival
+
+    def travel_minutes(self) -> Dict[str, int]:
+        """stop_id -> Reisezeit in Minuten (nur erreichbare Halte)."""
+        reach = np.flatnonzero(self.arrival < INF)
+        minutes = (self.arrival[reach] - self.dep_sec) // 60
+        return {self.tt.stop_ids[i]: int(mi) for i, mi in zip(reach.tolist(), minutes.tolist())}
+
+    def bands(self, bands_min: Sequence[int] = ISOCHRONE_BANDS_MIN) -> Dict[int, List[str]]:
+        """
+        Teilt erreichbare Halte in Zeitbänder ein.
+        Band 60 enthält z. B. alle Halte mit 30 < Reisezeit <= 60 Minuten.
+        """
+        travel = (self.arrival - self.dep_sec) // 60
+        result: Dict[int, List[str]] = {}
+        lower = -1
+        for b in sorted(bands_min):
+            idx = np.flatnonzero((self.arrival < INF) & (travel > lower) & (travel <= b))
+            result[b] = [self.tt.stop_ids[i] for i in idx.tolist()]
+            lower = b
+        return result
+
+
+_CACHE: "OrderedDict[tuple, Isochrone]" = OrderedDict()
+
+
+def compute_isochrone(
+    tt: Timetable,
+    origin_ids: Sequence[str],
+    dep_sec: int,
+    max_minutes: int = max(ISOCHRONE_BANDS_MIN),
+    max_transfers: int = MAX_TRANSFERS,
+    bucket_sec: int = ISOCHRONE_BUCKET_SEC
+) -> Isochrone:
+    """
+    One-to-All: früheste Ankunft an allen Halten ab origin_ids.
+
+    Parameter:
+        origin_ids: Steige der Startstation (siehe journey.station_stop_ids).
+        dep_sec: Abfahrt in Sekunden ab Mitternacht (wird auf bucket_sec aufgerundet).
+        max_minutes: maximale Reisezeit; begrenzt auch das Verbindungsfenster.
+
+    Rückgabe:
+        Isochrone (aus dem Cache, falls dieselbe Anfrage schon gerechnet wurde).
+    """
+    dep_bucket = dep_sec + (-dep_sec) % bucket_sec  # aufrunden: nichts vor dep_sec
+    origins_key = tuple(sorted(origin_ids))
+    key = (tt.service_date, tt.fingerprint, origins_key, dep_bucket, max_minutes, max_transfers)
+
+    hit = _CACHE.get(key)
+    if hit is not None:
+        _CACHE.move_to_end(key)
+        return hit
+
+    origins = [tt.stop_index[s] for s in origins_key if s in tt.stop_index]
+    if origins:
+        search = scan_rounds(tt, origins, dep_bucket, max_transfers, max_minutes * 60)
+        arrival = search.best_arrival()
+        arrival[arrival > dep_bucket + max_minutes * 60] = INF
+    else:
+        arrival = np.full(tt.n_stops, INF, dtype=np.int64)
+
+    iso = Isochrone(tt, origins_key, dep_bucket, arrival)
+    _CACHE[key] = iso
+    while len(_CACHE) > ISOCHRONE_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return iso
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import date
+    from config import GTFS_ZIP_PATH, MAP_FILE, MAP_ZOOM
+    from journey import station_stop_ids
+    from stops import load_stops, search_stops
+    from timetable import get_timetable
+    from utils import today_date, now_seconds, parse_gtfs_time_to_seconds, format_seconds_hhmm
+
+    parser = argparse.ArgumentParser(description="Isochrone ab einer Station")
+    parser.add_argument("start", help="Station (Suchtext oder stop_id)")
+    parser.add_argument("--zeit", help="Abfahrt ab HH:MM (Standard: jetzt)")
+    parser.add_argument("--datum", help="Datum YYYY-MM-DD (Standard: heute)")
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    parser.add_argument("--karte", action="store_true")
+    args = parser.parse_args()
+
+    stops_by_id = load_stops(args.zip)
+    if args.start in stops_by_id:
+        start_id = args.start
+    else:
+        hits = search_stops(stops_by_id, args.start, limit=1)
+        if not hits:
+            raise SystemExit(f"Kein Halt gefunden für '{args.start}'.")
+        start_id = hits[0][0]
+
+    d = date.fromisoformat(args.datum) if args.datum else today_date()
+    dep = parse_gtfs_time_to_seconds(args.zeit + ":00") if args.zeit else now_seconds()
+    tt = get_timetable(args.zip, d, stops_by_id=stops_by_id)
+    iso = compute_isochrone(tt, station_stop_ids(stops_by_id, start_id), dep)
+
+    print(f"Abfahrt ab {format_seconds_hhmm(iso.dep_sec)}")
+    for band, ids in iso.bands().items():
+        print(f"bis {band:3d} min: {len(ids)} Halte")
+
+    if args.karte:
+        from route_map import build_isochrone_map
+        build_isochrone_map(stops_by_id, iso, MAP_FILE, MAP_ZOOM)
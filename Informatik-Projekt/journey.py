@@ -0,0 +1,337 @@
+# journey.py
+
+"""
+journey.py
+
+Aufgabe:
+    Dieses Modul beantwortet die Frage "Wie komme ich von A nach B?".
+    Es arbeitet auf dem kompilierten Tagesfahrplan (timetable.py) und
+    berechnet früheste Ankunft sowie Pareto-optimale Verbindungen
+    (Ankunftszeit vs. Anzahl Umstiege).
+
+Verfahren:
+    RAPTOR-artige Runden: Runde k findet alle Halte, die mit höchstens
+    k Fahrten erreichbar sind. Jede Runde ist vollständig mit NumPy
+    vektorisiert (keine Python-Schleife über Verbindungen):
+        - Einstiegsmöglichkeit pro Verbindung prüfen
+        - "ab hier im Trip sitzen" per maximum.accumulate innerhalb der Trips
+        - beste Ankunft pro Halt per np.minimum.at
+        - anschließend Fußwege zwischen nahen Steigen
+
+Zentrale Aufgaben:
+    - Früheste Ankunft (earliest_arrival)
+    - Pareto-Menge (Ankunft, Umstiege) (pareto_journeys)
+    - Rekonstruktion der Teilstrecken (Fahrten + Fußwege)
+
+Hinweise:
+    - Kalenderfilter kommt aus calendar_.py (über timetable.py).
+    - Zum Zeichnen einer Verbindung: route_map.build_map_from_journey.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import GTFS_ZIP_PATH, MIN_TRANSFER_SEC, MAX_TRANSFERS, MAX_JOURNEY_SEC
+from models import Journey, JourneyLeg, Stop
+from stops import child_stop_ids
+from timetable import Timetable
+
+INF = np.iinfo(np.int64).max // 4
+
+
+class RoundLabels:
+    """
+    Ergebnis einer Runde: nur die in dieser Runde verbesserten Halte
+    haben Werte < INF.
+    """
+
+    def __init__(self, n: int):
+        self.trip_arr = np.full(n, INF, dtype=np.int64)
+        self.board = np.full(n, -1, dtype=np.int64)   # Verbindung (Fensterindex) beim Einstieg
+        self.alight = np.full(n, -1, dtype=np.int64)  # Verbindung (Fensterindex) beim Ausstieg
+        self.foot_arr = np.full(n, INF, dtype=np.int64)
+        self.foot_from = np.full(n, -1, dtype=np.int64)
+
+
+class RoundSearch:
+    """Alle Runden einer Suche plus das verwendete Verbindungsfenster."""
+
+    def __init__(self, tt: Timetable, dep_sec: int, window: np.ndarray, rounds: List[RoundLabels]):
+        self.tt = tt
+        self.dep_sec = dep_sec
+        self.window = window  # Indizes in tt.c_* (Connections im Zeitfenster)
+        self.rounds = rounds
+
+    def best_arrival(self) -> np.ndarray:
+        """Früheste Ankunft pro Halt über alle Runden (INF = nicht erreichbar)."""
+        best = np.full(self.tt.n_stops, INF, dtype=np.int64)
+        for rd in self.rounds:
+            np.minimum(best, rd.trip_arr, out=best)
+            np.minimum(best, rd.foot_arr, out=best)
+        return best
+
+
+def scan_rounds(
+    tt: Timetable,
+    origins: List[int],
+    dep_sec: int,
+    max_transfers: int = MAX_TRANSFERS,
+    max_journey_sec: int = MAX_JOURNEY_SEC,
+    transfer_sec: int = MIN_TRANSFER_SEC
+) -> RoundSearch:
+    """
+    Führt die vektorisierten Runden von den Start-Halten aus.
+
+    Parameter:
+        origins: Halte-Indizes (tt.stop_index), an denen man um dep_sec steht.
+        max_transfers: maximal erlaubte Umstiege (-> max_transfers + 1 Runden).
+        max_journey_sec: nur Verbindungen bis dep_sec + max_journey_sec.
+        transfer_sec: Mindestumstiegszeit am selben Halt.
+    """
+    n = tt.n_stops
+
+    # Verbindungen im Zeitfenster; Reihenfolge bleibt nach (Trip, Sequenz)
+    window = np.flatnonzero((tt.c_dep >= dep_sec) & (tt.c_dep <= dep_sec + max_journey_sec))
+    c_from = tt.c_from[window]
+    c_to = tt.c_to[window]
+    c_dep = tt.c_dep[window].astype(np.int64)
+    c_arr = tt.c_arr[window].astype(np.int64)
+    c_trip = tt.c_trip[window]
+
+    m = len(window)
+    pos = np.arange(m, dtype=np.int64)
+    trip_start = np.ones(m, dtype=bool)
+    if m > 1:
+        trip_start[1:] = c_trip[1:] != c_trip[:-1]
+    grp_first = np.maximum.accumulate(np.where(trip_start, pos, 0)) if m else pos
+
+    best_trip = np.full(n, INF, dtype=np.int64)
+    best_foot = np.full(n, INF, dtype=np.int64)
+
+    # Runde 0: Startpunkte und Fußwege von dort
+    rd0 = RoundLabels(n)
+    origin_arr = np.asarray(origins, dtype=np.int64)
+    rd0.foot_arr[origin_arr] = dep_sec
+    fm = np.isin(tt.fp_from, origin_arr)
+    if fm.any():
+        cand = dep_sec + tt.fp_dur[fm].astype(np.int64)
+        _relax(rd0.foot_arr, rd0.foot_from, tt.fp_from[fm], tt.fp_to[fm], cand)
+    rd0.foot_from[origin_arr] = -1
+    best_foot = rd0.foot_arr.copy()
+    rounds = [rd0]
+
+    for _ in range(max_transfers + 1):
+        if m == 0:
+            break
+        board_time = np.minimum(
+            np.where(best_trip < INF, best_trip + transfer_sec, INF), best_foot
+        )
+        boardable = board_time[c_from] <= c_dep
+        if not boardable.any():
+            break
+
+        # letzter möglicher Einstieg im selben Trip bis einschließlich dieser Verbindung
+        bidx = np.maximum.accumulate(np.where(boardable, pos, -1))
+        reach = np.flatnonzero(bidx >= grp_first)
+
+        rd = RoundLabels(n)
+        new = np.full(n, INF, dtype=np.int64)
+        np.minimum.at(new, c_to[reach], c_arr[reach])
+        improved = new < np.minimum(best_trip, best_foot)
+        if not improved.any():
+            break
+
+        to_r = c_to[reach]
+        sel = reach[improved[to_r] & (c_arr[reach] == new[to_r])]
+        rd.trip_arr[improved] = new[improved]
+        rd.board[c_to[sel]] = bidx[sel]
+        rd.alight[c_to[sel]] = sel
+        best_trip = np.where(improved, new, best_trip)
+
+        # Fußwege von den neu erreichten Halten
+        fm = improved[tt.fp_from]
+        if fm.any():
+            cand = rd.trip_arr[tt.fp_from[fm]] + tt.fp_dur[fm].astype(np.int64)
+            foot_new = np.full(n, INF, dtype=np.int64)
+            foot_src = np.full(n, -1, dtype=np.int64)
+            _relax(foot_new, foot_src, tt.fp_from[fm], tt.fp_to[fm], cand)
+            fimp = foot_new < np.minimum(best_trip, best_foot)
+            rd.foot_arr[fimp] = foot_new[fimp]
+            rd.foot_from[fimp] = foot_src[fimp]
+            best_foot = np.where(fimp, foot_new, best_foot)
+
+        rounds.append(rd)
+
+    return RoundSearch(tt, dep_sec, window, rounds)
+
+
+def _relax(arr: np.ndarray, src: np.ndarray, frm: np.ndarray, to: np.ndarray, cand: np.ndarray) -> None:
+    """arr[to] = min(arr[to], cand) und merkt sich den zugehörigen Start-Halt."""
+    np.minimum.at(arr, to, cand)
+    hit = cand == arr[to]
+    src[to[hit]] = frm[hit]
+
+
+def _reconstruct(search: RoundSearch, k: int, s: int, transfer_sec: int) -> Journey:
+    tt = search.tt
+    w = search.window
+    rounds = search.rounds
+    legs: List[JourneyLeg] = []
+
+    rd = rounds[k]
+    use_foot = rd.foot_arr[s] < INF and rd.foot_arr[s] <= rd.trip_arr[s]
+
+    while True:
+        rd = rounds[k]
+        if use_foot:
+            prev = int(rd.foot_from[s])
+            if prev < 0:
+                break  # Startpunkt
+            dep = search.dep_sec if k == 0 else int(rd.trip_arr[prev])
+            legs.append(JourneyLeg("walk", tt.stop_ids[prev], tt.stop_ids[s], dep, int(rd.foot_arr[s])))
+            if k == 0:
+                break
+            s = prev
+            use_foot = False
+            continue
+
+        b = int(rd.board[s])
+        a = int(rd.alight[s])
+        cb = int(w[b])
+        ca = int(w[a])
+        t = int(tt.c_trip[cb])
+        ev = tt.ev_stop[int(tt.c_ev[cb]):int(tt.c_ev[ca]) + 2]
+        dep = int(tt.c_dep[cb])
+        legs.append(JourneyLeg(
+            "trip",
+            tt.stop_ids[int(tt.c_from[cb])],
+            tt.stop_ids[s],
+            dep,
+            int(tt.c_arr[ca]),
+            trip_id=tt.trip_ids[t],
+            route_id=tt.route_ids[int(tt.trip_route[t])],
+            stop_ids=tuple(tt.stop_ids[i] for i in ev.tolist()),
+        ))
+
+        # Vorgänger: kleinste Runde < k, in der man rechtzeitig am Einstiegshalt war
+        s = int(tt.c_from[cb])
+        for j in range(k):
+            if rounds[j].foot_arr[s] <= dep:
+                k, use_foot = j, True
+                break
+            if rounds[j].trip_arr[s] < INF and rounds[j].trip_arr[s] + transfer_sec <= dep:
+                k, use_foot = j, False
+                break
+        else:
+            raise RuntimeError("Verbindung konnte nicht rekonstruiert werden.")
+
+    legs.reverse()
+    n_trips = sum(1 for leg in legs if leg.kind == "trip")
+    if not legs:
+        return Journey((), search.dep_sec, search.dep_sec, 0)
+    return Journey(tuple(legs), legs[0].dep_sec, legs[-1].arr_sec, max(n_trips - 1, 0))
+
+
+def pareto_journeys(
+    tt: Timetable,
+    origin_ids: List[str],
+    target_ids: List[str],
+    dep_sec: int,
+    max_transfers: int = MAX_TRANSFERS,
+    max_journey_sec: int = MAX_JOURNEY_SEC,
+    transfer_sec: int = MIN_TRANSFER_SEC
+) -> List[Journey]:
+    """
+    Alle Pareto-optimalen Verbindungen bzgl. (Ankunftszeit, Umstiege).
+
+    Rückgabe:
+        Liste sortiert nach Anzahl Umstiege (aufsteigend); jede weitere
+        Verbindung kommt früher an als die vorherige.
+    """
+    origins = [tt.stop_index[s] for s in origin_ids if s in tt.stop_index]
+    targets = [tt.stop_index[s] for s in target_ids if s in tt.stop_index]
+    if not origins or not targets:
+        return []
+
+    search = scan_rounds(tt, origins, dep_sec, max_transfers, max_journey_sec, transfer_sec)
+    target_arr = np.asarray(targets, dtype=np.int64)
+
+    result: List[Journey] = []
+    best = INF
+    for k, rd in enumerate(search.rounds):
+        labels = np.minimum(rd.trip_arr[target_arr], rd.foot_arr[target_arr])
+        i = int(np.argmin(labels))
+        if labels[i] < best:
+            best = int(labels[i])
+            result.append(_reconstruct(search, k, int(target_arr[i]), transfer_sec))
+    return result
+
+
+def earliest_arrival(
+    tt: Timetable,
+    origin_ids: List[str],
+    target_ids: List[str],
+    dep_sec: int,
+    max_transfers: int = MAX_TRANSFERS,
+    max_journey_sec: int = MAX_JOURNEY_SEC
+) -> Optional[Journey]:
+    """Früheste Ankunft (bei Gleichstand die mit weniger Umstiegen)."""
+    journeys = pareto_journeys(tt, origin_ids, target_ids, dep_sec, max_transfers, max_journey_sec)
+    return journeys[-1] if journeys else None
+
+
+def station_stop_ids(stops_by_id: Dict[str, Stop], stop_id: str) -> List[str]:
+    """
+    Eine Station (parent_station) steht für alle ihre Steige.
+    Ein einzelner Steig steht nur für sich; Nachbarsteige erreicht man über Fußwege.
+    """
+    children = child_stop_ids(stops_by_id, stop_id)
+    return [stop_id] + children
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import MAP_FILE, MAP_ZOOM
+    from cli import print_journey
+    from stops import load_stops, search_stops
+    from timetable import get_timetable
+    from utils import today_date, now_seconds, parse_gtfs_time_to_seconds
+
+    parser = argparse.ArgumentParser(description="Verbindungssuche auf dem kompilierten Tagesfahrplan")
+    parser.add_argument("start", help="Starthalt (Suchtext oder stop_id)")
+    parser.add_argument("ziel", help="Zielhalt (Suchtext oder stop_id)")
+    parser.add_argument("--zeit", help="Abfahrt ab HH:MM (Standard: jetzt)")
+    parser.add_argument("--datum", help="Datum YYYY-MM-DD (Standard: heute)")
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    parser.add_argument("--karte", action="store_true", help="früheste Verbindung auf Karte zeigen")
+    args = parser.parse_args()
+
+    stops_by_id = load_stops(args.zip)
+
+    def resolve(q: str) -> Tuple[str, str]:
+        if q in stops_by_id:
+            return q, stops_by_id[q].stop_name
+        hits = search_stops(stops_by_id, q, limit=1)
+        if not hits:
+            raise SystemExit(f"Kein Halt gefunden für '{q}'.")
+        return hits[0]
+
+    start_id, start_name = resolve(args.start)
+    ziel_id, ziel_name = resolve(args.ziel)
+    d = date.fromisoformat(args.datum) if args.datum else today_date()
+    dep = parse_gtfs_time_to_seconds(args.zeit + ":00") if args.zeit else now_seconds()
+
+    tt = get_timetable(args.zip, d, stops_by_id=stops_by_id)
+    journeys = pareto_journeys(
+        tt, station_stop_ids(stops_by_id, start_id), station_stop_ids(stops_by_id, ziel_id), dep
+    )
+    if not journeys:
+        print(f"Keine Verbindung von {start_name} nach {ziel_name} gefunden.")
+    for j in journeys:
+        print_journey(j, stops_by_id)
+
+    if journeys and args.karte:
+        from route_map import build_map_from_journey
+        build_map_from_journey(stops_by_id, journeys[-1], MAP_FILE, MAP_ZOOM)
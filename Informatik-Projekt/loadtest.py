@@ -0,0 +1,679 @@
+# loadtest.py
+
+"""
+loadtest.py
+
+Aufgabe:
+    Lasttest für den Abfahrts-Pfad. Aufgezeichnete Anfragen aus dem Query-Log
+    (Stationssuche, Abfahrtstafeln, Fahrtkarten) oder synthetische Anfragen
+    werden mit einstellbarer Parallelität und Rate gegen das Backend
+    abgespielt – im selben Prozess oder gegen einen lokalen Server.
+
+Gemessen wird:
+    - Latenz p50/p95/p99 je Anfrageart und gesamt, Durchsatz, Fehler
+    - SQLite: Busy-/Locked-Wiederholungen der Leser und Wartezeit der Schreiber
+    - Speicher (RSS) im Zeitverlauf
+
+Zentrale Aufgaben:
+    - synthetischen GTFS-Feed erzeugen (läuft komplett offline)
+    - Query-Log lesen oder synthetische Anfragen erzeugen
+    - InProcessBackend (cache_db- oder Tagesindex-Pfad, optional mit board_cache)
+    - HttpBackend + kleiner JSON-Server (python loadtest.py serve)
+    - Stufen-Lauf über mehrere Parallelitäten: ab wann skaliert es nicht mehr?
+
+Hinweise:
+    - Mit --rate wird "offen" abgespielt (feste Ankunftsrate); die Latenz zählt
+      dann ab dem geplanten Startzeitpunkt, Wartezeit in der Warteschlange
+      ist also enthalten. Ohne --rate: so schnell wie möglich (geschlossen).
+    - Beispiele:
+        python loadtest.py feed --out data/synthetic.zip
+        python loadtest.py run --zip data/synthetic.zip --db lt.db --synthetisch 2000 --parallel 1,4,16
+        python loadtest.py run --log data/query_log.jsonl --rate 50 --dauer 60
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse, parse_qs
+from urllib.request import urlopen
+
+import numpy as np
+
+import cache_db
+from config import GTFS_ZIP_PATH, CACHE_DB_PATH, QUERY_LOG_PATH, DEFAULT_DEPARTURES_LIMIT, DEFAULT_RESULTS_LIMIT
+from config import SNAPSHOT_PATH
+from utils import today_date
+
+
+@dataclass(frozen=True)
+class LoadEvent:
+    kind: str   # "search" | "board" | "trip_map"
+    arg: str    # Suchtext, stop_id oder trip_id
+    limit: int = DEFAULT_DEPARTURES_LIMIT
+
+
+@dataclass
+class LoadReport:
+    concurrency: int
+    rate: Optional[float]
+    wall_sec: float
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    busy_retries: int = 0
+    busy_wait_sec: float = 0.0
+    writer_wait_sec: float = 0.0
+    memory_mb: List[Tuple[float, float]] = field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        return sum(len(v) for v in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.wall_sec if self.wall_sec > 0 else 0.0
+
+    def percentiles(self, kind: Optional[str] = None) -> Tuple[float, float, float]:
+        """(p50, p95, p99) in Millisekunden."""
+        values = self.latencies.get(kind, []) if kind else [x for v in self.latencies.values() for x in v]
+        if not values:
+            return (0.0, 0.0, 0.0)
+        p = np.percentile(np.asarray(values) * 1000.0, [50, 95, 99])
+        return float(p[0]), float(p[1]), float(p[2])
+
+    def to_dict(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "wall_sec": round(self.wall_sec, 3),
+            "requests": self.requests,
+            "throughput": round(self.throughput, 2),
+            "latency_ms": {
+                (k or "gesamt"): dict(zip(("p50", "p95", "p99"), (round(x, 2) for x in self.percentiles(k))))
+                for k in [None, *sorted(self.latencies)]
+            },
+            "errors": self.errors,
+            "sqlite_busy_retries": self.busy_retries,
+            "sqlite_busy_wait_sec": round(self.busy_wait_sec, 3),
+            "writer_wait_sec": round(self.writer_wait_sec, 3),
+            "memory_mb": [(round(t, 2), round(m, 1)) for t, m in self.memory_mb],
+        }
+
+
+# ---------------------------
+# Synthetischer Feed
+# ---------------------------
+
+def generate_feed(
+    path: str,
+    stations: int = 60,
+    routes: int = 24,
+    stops_per_route: int = 14,
+    trips_per_direction: int = 60,
+    seed: int = 1
+) -> Dict[str, int]:
+    """
+    Schreibt einen gültigen, kleinen GTFS-Feed: Stationen mit je zwei Bahnsteigen,
+    Linien über zufällige Stationen, Takt-Fahrten in beide Richtungen über den ganzen Tag,
+    Wochentags- und Täglich-Kalender. Rückgabe: Zeilenzahlen je Datei.
+    """
+    rnd = random.Random(seed)
+    stops = ["stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station"]
+    platforms: List[str] = []
+    for i in range(stations):
+        lat, lon = 47.5 + rnd.random() * 7.0, 6.0 + rnd.random() * 9.0
+        stops.append(f"ST{i},Station {i},{lat:.5f},{lon:.5f},1,")
+        for p in (1, 2):
+            stops.append(f"ST{i}_{p},Station {i},{lat + 0.0003 * p:.5f},{lon:.5f},0,ST{i}")
+        platforms.append(f"ST{i}")
+
+    route_rows = ["route_id,agency_id,route_short_name,route_long_name,route_type"]
+    trips = ["route_id,service_id,trip_id,trip_headsign,direction_id"]
+    stop_times = ["trip_id,arrival_time,departure_time,stop_id,stop_sequence"]
+
+    def fmt(x: int) -> str:
+        return f"{x // 3600:02d}:{x % 3600 // 60:02d}:{x % 60:02d}"
+
+    n = 0
+    for r in range(routes):
+        rid = f"R{r}"
+        name = rnd.choice(["S", "RE", "RB", "ICE"]) + str(r + 1)
+        route_rows.append(f"{rid},A,{name},Linie {name},2")
+        pattern = rnd.sample(platforms, min(stops_per_route, len(platforms)))
+        run = [rnd.randint(3, 12) * 60 for _ in pattern]
+        # Fahrten gleichmäßig über den Betriebstag (04:00-24:00) verteilen
+        headway = max(5, 20 * 60 // trips_per_direction) * 60
+        offset = rnd.randint(0, 9) * 60
+        for d in (0, 1):
+            seq = pattern if d == 0 else pattern[::-1]
+            for k in range(trips_per_direction):
+                n += 1
+                tid = f"T{n}"
+                trips.append(f"{rid},{'WK' if k % 3 else 'ALL'},{tid},Station {seq[-1][2:]},{d}")
+                t = 4 * 3600 + offset + k * headway + d * 300
+                for j, sid in enumerate(seq):
+                    dwell = 60 if 0 < j < len(seq) - 1 else 0
+                    stop_times.append(f"{tid},{fmt(t)},{fmt(t + dwell)},{sid}_{1 + d},{j + 1}")
+                    t += dwell + run[j]
+
+    calendar = [
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date",
+        "WK,1,1,1,1,1,0,0,20200101,20351231",
+        "ALL,1,1,1,1,1,1,1,20200101,20351231",
+    ]
+    files = {
+        "agency.txt": ["agency_id,agency_name,agency_url,agency_timezone", "A,Synthetisch,https://example.org,Europe/Berlin"],
+        "stops.txt": stops,
+        "routes.txt": route_rows,
+        "trips.txt": trips,
+        "stop_times.txt": stop_times,
+        "calendar.txt": calendar,
+    }
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, rows in files.items():
+            z.writestr(name, "\n".join(rows) + "\n")
+    return {name: len(rows) - 1 for name, rows in files.items()}
+
+
+# ---------------------------
+# Anfragen
+# ---------------------------
+
+def read_query_log(path: str = QUERY_LOG_PATH) -> List[LoadEvent]:
+    """Ereignisse aus dem Query-Log (prewarm.log_event). Unbekannte Zeilen werden übersprungen."""
+    events: List[LoadEvent] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                continue
+            kind = obj.get("kind") or ("board" if obj.get("stop_id") else None)
+            arg = {"search": obj.get("query"), "board": obj.get("stop_id"), "trip_map": obj.get("trip_id")}.get(kind)
+            if arg:
+                events.append(LoadEvent(kind, arg, int(obj.get("limit") or DEFAULT_DEPARTURES_LIMIT)))
+    return events
+
+
+def synthetic_events(
+    zip_path: str,
+    n: int,
+    mix: Tuple[float, float, float] = (0.2, 0.7, 0.1),
+    seed: int = 1
+) -> List[LoadEvent]:
+    """
+    n Anfragen mit realistischer Schieflage: wenige Halte sind sehr beliebt
+    (Zipf-Verteilung). mix = Anteile (Suche, Tafel, Fahrtkarte).
+    """
+    from gtfs_zip import iter_rows
+    from stops import load_stops
+
+    rnd = random.Random(seed)
+    stops_by_id = load_stops(zip_path)
+    board_ids = sorted({(r.get("stop_id") or "").strip() for r in iter_rows(zip_path, "stop_times.txt")} - {""})
+    trip_ids = [(r.get("trip_id") or "").strip() for r in iter_rows(zip_path, "trips.txt")]
+    names = sorted({s.stop_name for s in stops_by_id.values()})
+    rnd.shuffle(board_ids)
+
+    weights = 1.0 / np.arange(1, len(board_ids) + 1)
+    weights /= weights.sum()
+    np_rnd = np.random.default_rng(seed)
+    popular = np_rnd.choice(len(board_ids), size=n, p=weights).tolist()
+
+    events: List[LoadEvent] = []
+    for i in range(n):
+        x = rnd.random()
+        if x < mix[0]:
+            name = rnd.choice(names)
+            events.append(LoadEvent("search", name[:rnd.randint(3, max(3, len(name)))]))
+        elif x < mix[0] + mix[1]:
+            events.append(LoadEvent("board", board_ids[popular[i]]))
+        else:
+            events.append(LoadEvent("trip_map", rnd.choice(trip_ids)))
+    return events
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+
+def process_rss_mb() -> float:
+    """Resident Set Size dieses Prozesses (Linux /proc, sonst Höchstwert über resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+class InProcessBackend:
+    """
+    Der Abfahrts-Pfad im selben Prozess.
+
+    path:
+        "sqlite" – cache_db wie main.py/Dashboard (Cache-Aufbau bei kalten Halten)
+        "index"  – Tagesindex (board_index.py), wird vor dem Lauf gebaut
+    board_cache: zusätzlich board_cache.BoardCache vor die Tafeln schalten
+    """
+
+    def __init__(self, zip_path: str = GTFS_ZIP_PATH, db_path: str = CACHE_DB_PATH,
+                 path: str = "sqlite", board_cache: bool = False, snapshot_path: str = SNAPSHOT_PATH):
+        from feed_snapshot import get_snapshot
+
+        self.zip_path = zip_path
+        self.db_path = db_path
+        self.path = path
+        # Halte, Suche und aktive Trips aus dem Snapshot – der Start parst keine ZIP
+        self.snapshot = get_snapshot(zip_path, snapshot_path)
+        self.stops_by_id = self.snapshot.stops_by_id()
+        self.active_trip_route = self.snapshot.active_trip_route(today_date(), fallback_all=True)
+
+        con = cache_db.connect(db_path)
+        cache_db.init_db(con)
+        self.compressed = cache_db.CompressedStopTimes(con) if cache_db.has_compressed_cache(con) else None
+        con.close()
+
+        self.index = None
+        if path == "index":
+            from board_index import BoardIndexManager
+            self.index = BoardIndexManager(zip_path).start()
+            self.index.wait_ready()
+
+        self.cache = None
+        if board_cache:
+            from board_cache import BoardCache
+            self.cache = BoardCache()
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.busy_retries = 0
+        self.busy_wait_sec = 0.0
+        self.writer_wait_sec = 0.0
+
+    def reset_stats(self) -> None:
+        """Vor jeder Stufe: Zähler zurücksetzen und den Tafel-Cache leeren (jede Stufe startet kalt)."""
+        with self._stats_lock:
+            self.busy_retries = 0
+            self.busy_wait_sec = 0.0
+            self.writer_wait_sec = 0.0
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _reader(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            # timeout=0: jede Sperre kommt als Fehler zurück und wird hier gemessen
+            con = sqlite3.connect(self.db_path, timeout=0.0)
+            self._local.con = con
+        return con
+
+    def _read(self, fn: Callable[[sqlite3.Connection], object]):
+        con = self._reader()
+        while True:
+            try:
+                return fn(con)
+            except sqlite3.OperationalError as e:
+                msg = str(e)
+                if "locked" not in msg and "busy" not in msg:
+                    raise
+                t0 = time.perf_counter()
+                time.sleep(0.002)
+                with self._stats_lock:
+                    self.busy_retries += 1
+                    self.busy_wait_sec += time.perf_counter() - t0
+
+    def search(self, query: str, limit: int = DEFAULT_RESULTS_LIMIT):
+        return self.snapshot.search(query, limit)
+
+    def _board_uncached(self, stop_id: str, limit: int):
+        if self.index is not None:
+            return self.index.next_departures(stop_id, limit)
+        if self.compressed is not None:
+            return self.compressed.next_departures(stop_id, self.active_trip_route, limit)
+        if not self._read(lambda con: cache_db.has_cached_stop(con, stop_id)):
+            t0 = time.perf_counter()
+            with self._write_lock:
+                with self._stats_lock:
+                    self.writer_wait_sec += time.perf_counter() - t0
+                w = cache_db.connect(self.db_path)
+                try:
+                    if not cache_db.has_cached_stop(w, stop_id):
+                        cache_db.build_cache_for_stop(self.zip_path, w, stop_id)
+                finally:
+                    w.close()
+        return self._read(lambda con: cache_db.get_next_departures_cached(con, stop_id, self.active_trip_route, limit))
+
+    def board(self, stop_id: str, limit: int = DEFAULT_DEPARTURES_LIMIT):
+        if self.cache is None:
+            return self._board_uncached(stop_id, limit)
+        from utils import now_seconds
+        return self.cache.get_or_compute(stop_id, today_date(), now_seconds(), limit,
+                                         lambda: self._board_uncached(stop_id, limit))
+
+    def trip_map(self, trip_id: str):
+        if self.compressed is not None:
+            seq = self.compressed.trip_stop_sequence(trip_id)
+        else:
+            seq = cache_db.trip_stop_sequence(self.zip_path, trip_id)
+        return [(self.stops_by_id[sid].lat, self.stops_by_id[sid].lon) for _, sid in seq if sid in self.stops_by_id]
+
+    def call(self, ev: LoadEvent):
+        if ev.kind == "search":
+            return self.search(ev.arg)
+        if ev.kind == "board":
+            return self.board(ev.arg, ev.limit)
+        if ev.kind == "trip_map":
+            return self.trip_map(ev.arg)
+        raise ValueError(f"unbekannte Anfrageart: {ev.kind}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "busy_retries": self.busy_retries,
+                "busy_wait_sec": self.busy_wait_sec,
+                "writer_wait_sec": self.writer_wait_sec,
+                "rss_mb": process_rss_mb(),
+            }
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.stop()
+
+
+class HttpBackend:
+    """Spielt gegen einen laufenden Server (python loadtest.py serve) ab."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._baseline: Optional[dict] = None
+
+    def _get(self, path: str, **params) -> object:
+        with urlopen(f"{self.base_url}{path}?{urlencode(params)}", timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def call(self, ev: LoadEvent):
+        if ev.kind == "search":
+            return self._get("/search", q=ev.arg)
+        if ev.kind == "board":
+            return self._get("/board", stop_id=ev.arg, limit=ev.limit)
+        if ev.kind == "trip_map":
+            return self._get("/trip", trip_id=ev.arg)
+        raise ValueError(f"unbekannte Anfrageart: {ev.kind}")
+
+    def reset_stats(self) -> None:
+        self._get("/reset")
+        self._baseline = self._get("/stats")
+
+    def stats(self) -> dict:
+        s = self._get("/stats")
+        base = self._baseline or {}
+        for k in ("busy_retries", "busy_wait_sec", "writer_wait_sec"):
+            s[k] = s.get(k, 0) - base.get(k, 0)
+        return s
+
+    def close(self) -> None:
+        pass
+
+
+def serve(backend: InProcessBackend, host: str = "127.0.0.1", port: int = 8780) -> None:
+    """Kleiner JSON-Server um das InProcessBackend (ein Thread pro Verbindung)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/search":
+                    body = backend.search(q.get("q", ""))
+                elif url.path == "/board":
+                    deps = backend.board(q.get("stop_id", ""), int(q.get("limit", DEFAULT_DEPARTURES_LIMIT)))
+                    body = [[d.departure_time, d.route_name, d.headsign, d.trip_id] for d in deps]
+                elif url.path == "/trip":
+                    body = backend.trip_map(q.get("trip_id", ""))
+                elif url.path == "/stats":
+                    body = backend.stats()
+                elif url.path == "/reset":
+                    backend.reset_stats()
+                    body = {"ok": True}
+                else:
+                    self.send_error(404)
+                    return
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Lasttest-Server auf http://{host}:{port} (Strg+C beendet)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ---------------------------
+# Abspielen
+# ---------------------------
+
+class MemorySampler(threading.Thread):
+    """Misst alle `interval` Sekunden den Speicher (Backend-Prozess)."""
+
+    def __init__(self, read_mb: Callable[[], float], interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.read_mb = read_mb
+        self.interval = interval
+        self.samples: List[Tuple[float, float]] = []
+        self._stop_event = threading.Event()
+        self._t0 = time.perf_counter()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.samples.append((time.perf_counter() - self._t0, self.read_mb()))
+            except Exception:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> List[Tuple[float, float]]:
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+def replay(
+    backend,
+    events: List[LoadEvent],
+    concurrency: int = 4,
+    rate: Optional[float] = None,
+    duration: Optional[float] = None,
+    sample_interval: float = 0.5
+) -> LoadReport:
+    """
+    Spielt die Ereignisse ab (bei duration länger als die Liste: wiederholt).
+    rate = Anfragen pro Sekunde (offen), None = so schnell wie möglich.
+    """
+    if not events:
+        raise ValueError("keine Anfragen zum Abspielen")
+
+    def event_stream() -> Iterator[LoadEvent]:
+        while True:
+            yield from events
+            if duration is None:
+                return
+
+    report = LoadReport(concurrency=concurrency, rate=rate, wall_sec=0.0)
+    lock = threading.Lock()
+    backend.reset_stats()
+    sampler = MemorySampler(
+        (lambda: backend.stats()["rss_mb"]) if isinstance(backend, HttpBackend) else process_rss_mb,
+        sample_interval,
+    )
+    sampler.start()
+
+    def run_one(ev: LoadEvent, start_at: float) -> None:
+        try:
+            backend.call(ev)
+            ok = True
+        except Exception:
+            ok = False
+        lat = time.perf_counter() - start_at
+        with lock:
+            if ok:
+                report.latencies.setdefault(ev.kind, []).append(lat)
+            else:
+                report.errors[ev.kind] = report.errors.get(ev.kind, 0) + 1
+
+    t0 = time.perf_counter()
+    deadline = None if duration is None else t0 + duration
+    stream = event_stream()
+
+    if rate:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for i, ev in enumerate(stream):
+                at = t0 + i / rate
+                if deadline is not None and at > deadline:
+                    break
+                delay = at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(run_one, ev, at)
+    else:
+        stream_lock = threading.Lock()
+
+        def worker() -> None:
+            while True:
+                with stream_lock:
+                    ev = next(stream, None)
+                if ev is None or (deadline is not None and time.perf_counter() > deadline):
+                    return
+                run_one(ev, time.perf_counter())
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    report.wall_sec = time.perf_counter() - t0
+    report.memory_mb = sampler.stop()
+    stats = backend.stats()
+    report.busy_retries = int(stats.get("busy_retries", 0))
+    report.busy_wait_sec = float(stats.get("busy_wait_sec", 0.0))
+    report.writer_wait_sec = float(stats.get("writer_wait_sec", 0.0))
+    return report
+
+
+def print_report(report: LoadReport) -> None:
+    rate = f"{report.rate:g}/s" if report.rate else "max"
+    print(f"\nParallelität {report.concurrency}, Rate {rate}: {report.requests} Anfragen in "
+          f"{report.wall_sec:.1f}s -> {report.throughput:.1f}/s")
+    print(f"  {'Art':10s} {'n':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'Fehler':>7s}")
+    for kind in [None, *sorted(report.latencies)]:
+        p50, p95, p99 = report.percentiles(kind)
+        n = len(report.latencies.get(kind, [])) if kind else report.requests
+        err = report.errors.get(kind, 0) if kind else sum(report.errors.values())
+        print(f"  {kind or 'gesamt':10s} {n:7d} {p50:9.2f} {p95:9.2f} {p99:9.2f} {err:7d}")
+    print(f"  SQLite: {report.busy_retries} Busy-Wiederholungen ({report.busy_wait_sec:.2f}s), "
+          f"Schreiber-Wartezeit {report.writer_wait_sec:.2f}s")
+    if report.memory_mb:
+        mem = [m for _, m in report.memory_mb]
+        print(f"  Speicher: Start {mem[0]:.0f} MB, max {max(mem):.0f} MB, Ende {mem[-1]:.0f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lasttest für Suche, Abfahrtstafeln und Fahrtkarten")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_feed = sub.add_parser("feed", help="synthetischen GTFS-Feed erzeugen")
+    p_feed.add_argument("--out", default="data/synthetic.zip")
+    p_feed.add_argument("--stationen", type=int, default=60)
+    p_feed.add_argument("--linien", type=int, default=24)
+    p_feed.add_argument("--fahrten", type=int, default=60, help="Fahrten je Linie und Richtung")
+
+    def backend_args(p):
+        p.add_argument("--zip", default=GTFS_ZIP_PATH)
+        p.add_argument("--db", default=CACHE_DB_PATH)
+        p.add_argument("--pfad", choices=["sqlite", "index"], default="sqlite")
+        p.add_argument("--tafel-cache", action="store_true", help="board_cache vorschalten")
+        p.add_argument("--snapshot", default=SNAPSHOT_PATH, help="Feed-Snapshot (wird bei Bedarf gebaut)")
+
+    p_serve = sub.add_parser("serve", help="Backend als lokalen JSON-Server starten")
+    backend_args(p_serve)
+    p_serve.add_argument("--port", type=int, default=8780)
+
+    p_run = sub.add_parser("run", help="Anfragen abspielen")
+    backend_args(p_run)
+    p_run.add_argument("--url", help="gegen Server abspielen statt im Prozess")
+    p_run.add_argument("--log", help=f"Query-Log (Standard ohne --synthetisch: {QUERY_LOG_PATH})")
+    p_run.add_argument("--synthetisch", type=int, help="so viele synthetische Anfragen erzeugen")
+    p_run.add_argument("--parallel", default="4", help="Parallelität, mehrere als Stufen: 1,2,4,8")
+    p_run.add_argument("--rate", type=float, help="Anfragen pro Sekunde (offen)")
+    p_run.add_argument("--dauer", type=float, help="Sekunden pro Stufe (Anfragen werden wiederholt)")
+    p_run.add_argument("--json", help="Bericht als JSON schreiben")
+    args = parser.parse_args()
+
+    if args.cmd == "feed":
+        counts = generate_feed(args.out, args.stationen, args.linien, trips_per_direction=args.fahrten)
+        print(f"Feed geschrieben: {args.out}")
+        for name, n in counts.items():
+            print(f"  {name:16s} {n:>9d}")
+
+    elif args.cmd == "serve":
+        serve(InProcessBackend(args.zip, args.db, args.pfad, args.tafel_cache, args.snapshot), port=args.port)
+
+    else:
+        if args.synthetisch:
+            events = synthetic_events(args.zip, args.synthetisch)
+        else:
+            events = read_query_log(args.log or QUERY_LOG_PATH)
+        print(f"{len(events)} Anfragen geladen.")
+
+        backend = (
+            HttpBackend(args.url) if args.url
+            else InProcessBackend(args.zip, args.db, args.pfad, args.tafel_cache, args.snapshot)
+        )
+        reports = []
+        try:
+            for c in [int(x) for x in args.parallel.split(",") if x.strip()]:
+                r = replay(backend, events, concurrency=c, rate=args.rate, duration=args.dauer)
+                print_report(r)
+                reports.append(r)
+        finally:
+            backend.close()
+
+        if len(reports) > 1:
+            print("\nSkalierung (Durchsatz / p99):")
+            for r in reports:
+                print(f"  {r.concurrency:4d} parallel: {r.throughput:9.1f}/s  p99 {r.percentiles()[2]:9.2f} ms")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump([r.to_dict() for r in reports], f, indent=2, ensure_ascii=False)
+            print(f"JSON geschrieben: {args.json}")
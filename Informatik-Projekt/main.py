@@ -12,31 +12,39 @@ Zentrale Aufgaben:
     - Aufruf der CLI oder UI
     - Verbindung der einzelnen Module
     - Steuerung des Programmflusses
+    - Batch-Modus für Skripte (python main.py --batch anfragen.txt), siehe batch.py
 
 Hinweise:
     - Diese Datei enthält möglichst wenig Fachlogik.
     - Sie dient primär der Orchestrierung.
+    - Folium/Browser werden erst geladen, wenn wirklich eine Karte gezeichnet wird.
 """
 # main.py
-print("MAIN STARTET")
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Batch-Modus vor den Imports des interaktiven Programms (Snapshot/NumPy, Vorwärmen)
+    from batch import run_cli
+    sys.exit(run_cli(sys.argv[1:]))
+
 from config import GTFS_ZIP_PATH, CACHE_DB_PATH, DEFAULT_RESULTS_LIMIT, DEFAULT_DEPARTURES_LIMIT, MAP_FILE, MAP_ZOOM
 from utils import today_date
 from cli import header, choose_from_list, ask_yes_no
-from stops import load_stops, search_stops
-from calendar_ import active_service_ids
-from departures import build_active_trip_route_map, load_routes, format_route_name
-from cache_db import connect, init_db, has_cached_stop, build_cache_for_stop, get_next_departures_cached, trip_stop_sequence
-from route_map import build_map_from_stop_ids
+from departures import format_route_name
+from feed_snapshot import get_snapshot
+from prewarm import estimate_rows
+from cache_db import connect, init_db, has_cached_stop, build_cache_for_stops, get_next_departures_cached, trip_stop_sequence
+from cache_db import has_compressed_cache, CompressedStopTimes
 
 def main():
     header("GTFS Abfahrtsmonitor (Deutschland-Feed)")
 
-    print("1) Lade stops.txt ...")
-    stops_by_id = load_stops(GTFS_ZIP_PATH)
-    print(f"   Stops geladen: {len(stops_by_id)}")
+    print("1) Lade Feed-Snapshot (beim ersten Start oder nach Feed-Update wird er kompiliert) ...")
+    snap = get_snapshot(GTFS_ZIP_PATH)
+    print(f"   Stops: {snap.n_stops}, Trips: {snap.n_trips}")
 
     query = input("\nBahnhof/Halt suchen (z.B. 'Mannheim', 'Karlsruhe', 'Berlin Hbf'): ").strip()
-    hits = search_stops(stops_by_id, query, limit=DEFAULT_RESULTS_LIMIT)
+    hits = snap.search(query, limit=DEFAULT_RESULTS_LIMIT)
 
     if not hits:
         print("Keine Treffer. Tipp: kürzer suchen (z.B. nur 'Berlin').")
@@ -53,35 +61,45 @@ def main():
     # heutige Services
     d = today_date()
     print("2) Bestimme heute gültige services ...")
-    services = active_service_ids(GTFS_ZIP_PATH, d)
+    services = snap.active_service_ids(d)
     print(f"   aktive service_ids: {len(services)}")
 
     print("3) Baue trip->route Map (nur aktive Trips) ...")
-    active_trip_route = build_active_trip_route_map(GTFS_ZIP_PATH, services)
+    active_trip_route = snap.active_trip_route(d, fallback_all=False)
     print(f"   aktive trips: {len(active_trip_route)}")
 
     # Cache vorbereiten
     con = connect(CACHE_DB_PATH)
     init_db(con)
 
-    if not has_cached_stop(con, stop_id):
+    compressed = None
+    if has_compressed_cache(con):
+        print("\n4) Komprimierter Feed-Cache vorhanden – kein Scan nötig.")
+        compressed = CompressedStopTimes(con)
+    elif not has_cached_stop(con, stop_id):
         print("\n4) Cache für diesen Bahnhof existiert noch nicht.")
         print("   Ich scanne stop_times.txt EINMAL für diesen stop_id.")
-        print("   Das kann (je nach Bahnhof) ein bisschen dauern, danach ist es schnell.")
-        inserted = build_cache_for_stop(GTFS_ZIP_PATH, con, stop_id)
-        print(f"   Cache-Zeilen gespeichert: {inserted}")
+        total = estimate_rows(GTFS_ZIP_PATH)
+        inserted = build_cache_for_stops(
+            GTFS_ZIP_PATH, con, [stop_id],
+            progress=lambda rows: print(f"\r   {min(rows / total, 1.0):6.1%} von ca. {total} Zeilen gelesen", end="", flush=True),
+        )[stop_id]
+        print(f"\n   Cache-Zeilen gespeichert: {inserted}")
     else:
         print("\n4) Cache vorhanden – Abfahrten werden schnell geladen.")
 
     # Abfahrten
     print("\n5) Nächste Abfahrten:")
-    deps = get_next_departures_cached(con, stop_id, active_trip_route, limit=DEFAULT_DEPARTURES_LIMIT)
+    if compressed is not None:
+        deps = compressed.next_departures(stop_id, active_trip_route, limit=DEFAULT_DEPARTURES_LIMIT)
+    else:
+        deps = get_next_departures_cached(con, stop_id, active_trip_route, limit=DEFAULT_DEPARTURES_LIMIT)
 
     if not deps:
         print("Keine Abfahrten gefunden. (Kann am Datum/Wochentag/Feed liegen.)")
         return
 
-    routes = load_routes(GTFS_ZIP_PATH)
+    routes = snap.routes()
 
     for i, dep in enumerate(deps, start=1):
         rrow = routes.get(dep.route_id, {})
@@ -100,17 +118,26 @@ def main():
     chosen = deps[int(n) - 1]
     header("Karte wird erstellt")
 
-    seq = trip_stop_sequence(GTFS_ZIP_PATH, chosen.trip_id)
+    from route_map import build_map_from_stop_ids
+
+    if compressed is not None:
+        seq = compressed.trip_stop_sequence(chosen.trip_id)
+    else:
+        seq = trip_stop_sequence(GTFS_ZIP_PATH, chosen.trip_id)
     ordered_stop_ids = [sid for _, sid in seq]
+    stops_by_id = snap.stops_by_id()
+
+    from shapes import ShapeStore
+    geometry = ShapeStore(con).trip_geometry(chosen.trip_id, ordered_stop_ids, stops_by_id)
 
     build_map_from_stop_ids(
         stops_by_id=stops_by_id,
         ordered_stop_ids=ordered_stop_ids,
         out_file=MAP_FILE,
-        zoom=MAP_ZOOM
+        zoom=MAP_ZOOM,
+        geometry=geometry
     )
 
 if __name__ == "__main__":
     main()
-print("MAIN ENDE")
 
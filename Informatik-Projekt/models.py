@@ -10,8 +10,10 @@ Aufgabe:
 
 Zentrale Datenmodelle:
     - Stop
-    - Departure
+    - Departure / Arrival
     - Route (optional)
+    - JourneyLeg / Journey (Verbindungssuche)
+    - DelayObservation (Verspätungshistorie)
 
 Vorteile:
     - Verbesserte Lesbarkeit
@@ -40,4 +42,43 @@ class Departure:
 
     # Anzeigenfelder
     route_name: str | None = None
-    headsign: str | None = None
\ No newline at end of file
+    headsign: str | None = None
+
+@dataclass(frozen=True)
+class Arrival:
+    trip_id: str
+    route_id: str
+    arrival_time: str
+    stop_sequence: int
+
+    # Anzeigenfelder
+    route_name: str | None = None
+    headsign: str | None = None
+
+@dataclass(frozen=True)
+class JourneyLeg:
+    kind: str  # "trip" oder "walk"
+    from_stop_id: str
+    to_stop_id: str
+    dep_sec: int
+    arr_sec: int
+
+    # nur bei kind == "trip"
+    trip_id: str | None = None
+    route_id: str | None = None
+    stop_ids: tuple = ()
+
+@dataclass(frozen=True)
+class Journey:
+    legs: tuple
+    dep_sec: int
+    arr_sec: int
+    transfers: int
+
+@dataclass(frozen=True)
+class DelayObservation:
+    trip_id: str
+    stop_id: str
+    route_id: str
+    scheduled_sec: int  # planmäßige Abfahrt (Sekunden ab Mitternacht)
+    delay_sec: int
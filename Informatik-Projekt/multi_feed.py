@@ -0,0 +1,279 @@
+# multi_feed.py
+
+"""
+multi_feed.py
+
+Aufgabe:
+    Dieses Modul verbindet mehrere GTFS-Feeds (z.B. Deutschland-Feed plus
+    Verbundfeeds). Jeder Feed hat seinen eigenen, unabhängig gebauten
+    Cache (Shard); Suche und Abfahrten werden parallel über alle Shards
+    abgefragt und zusammengeführt.
+
+Konfiguration:
+    config.FEEDS = {"de": {"zip": ..., "db": ..., "snapshot": ...}, "vrn": {...}}
+    (ohne "snapshot": data/feed_snapshot_<name>.bin)
+
+Zentrale Aufgaben:
+    - IDs mit Feed-Präfix ("vrn:<stop_id>", "vrn:<trip_id>")
+    - Halte, Stationen, Suche und aktive Trips aus dem Feed-Snapshot des
+      Shards (feed_snapshot.py) – beim Start wird keine ZIP geparst
+    - Fan-out über einen Thread-Pool, Lesezugriffe über schreibgeschützte
+      SQLite-Verbindungen (eine pro Thread und Shard)
+    - Abfahrten aller Shards nach Zeit zusammenführen
+    - doppelte Stationen (gleicher Name, nahe Koordinaten) zusammenfassen,
+      ebenso dieselbe Abfahrt aus mehreren Feeds (Zeit, Linie, Ziel)
+
+Hinweise:
+    - Fehlt in einem Shard der Cache für einen Halt, wird er dort wie gewohnt
+      einmal aufgebaut (build_cache_for_stops, ein Scan für alle fehlenden Halte).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from heapq import merge
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cache_db
+from config import FEEDS, MULTI_FEED_WORKERS, STATION_DEDUP_METERS, DEFAULT_DEPARTURES_LIMIT, DEFAULT_RESULTS_LIMIT
+from config import SNAPSHOT_PATH
+from models import Departure, Stop
+from timetable import haversine_m
+from utils import now_seconds, parse_gtfs_time_to_seconds, today_date
+
+SEP = ":"
+
+
+def global_id(feed: str, local_id: str) -> str:
+    return f"{feed}{SEP}{local_id}"
+
+
+def split_id(gid: str) -> Tuple[str, str]:
+    feed, _, local_id = gid.partition(SEP)
+    return feed, local_id
+
+
+def normalize_name(name: str) -> str:
+    """Für den Namensvergleich: klein, ohne Satzzeichen, "Hauptbahnhof" = "Hbf"."""
+    n = name.lower()
+    n = n.replace("hauptbahnhof", "hbf").replace("bahnhof", "bf")
+    n = re.sub(r"[^\w]+", " ", n)
+    return " ".join(n.split())
+
+
+@dataclass
+class MergedStation:
+    """Eine Station über alle Feeds: Anzeigename, Position und alle globalen stop_ids."""
+    name: str
+    lat: float
+    lon: float
+    members: List[str] = field(default_factory=list)
+
+    @property
+    def feeds(self) -> List[str]:
+        return sorted({split_id(m)[0] for m in self.members})
+
+
+class FeedShard:
+    """Ein Feed mit eigener Cache-Datei."""
+
+    def __init__(self, name: str, zip_path: str, db_path: str, snapshot_path: Optional[str] = None):
+        self.name = name
+        self.zip_path = zip_path
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path or os.path.join(
+            os.path.dirname(SNAPSHOT_PATH), f"feed_snapshot_{name}.bin"
+        )
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._snapshot = None
+        self._trip_routes: Dict[date, Dict[str, str]] = {}
+
+        # Datei und Tabellen anlegen, damit Leser sie schreibgeschützt öffnen können
+        con = cache_db.connect(db_path)
+        cache_db.init_db(con)
+        con.close()
+
+    def reader(self) -> sqlite3.Connection:
+        """Schreibgeschützte Verbindung, eine pro Thread."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(Path(self.db_path).resolve().as_uri() + "?mode=ro", uri=True)
+            self._local.con = con
+        return con
+
+    def snapshot(self):
+        """Feed-Snapshot des Shards (einmal geöffnet; nur bei neuem Feed neu kompiliert)."""
+        with self._lock:
+            if self._snapshot is None:
+                from feed_snapshot import get_snapshot
+                self._snapshot = get_snapshot(self.zip_path, self.snapshot_path)
+            return self._snapshot
+
+    def stops(self) -> Dict[str, Stop]:
+        return self.snapshot().stops_by_id()
+
+    def children(self, stop_id: str) -> List[str]:
+        return self.snapshot().children(stop_id)
+
+    def active_trip_route(self, d: date) -> Dict[str, str]:
+        with self._lock:
+            m = self._trip_routes.get(d)
+        if m is not None:
+            return m
+
+        # außerhalb der Sperre bauen, sonst warten snapshot()/children() aller Threads mit
+        m = self.snapshot().active_trip_route(d, fallback_all=True)
+
+        with self._lock:
+            m = self._trip_routes.setdefault(d, m)  # parallel gebaut: erstes Ergebnis gewinnt
+            for old in [k for k in self._trip_routes if k < d - timedelta(days=1)]:
+                del self._trip_routes[old]
+        return m
+
+    def search(self, query: str, limit: int) -> List[Stop]:
+        snap = self.snapshot()
+        return [snap.stop(sid) for sid, _ in snap.search(query, limit)]
+
+    def ensure_cached(self, stop_ids: List[str]) -> None:
+        con = self.reader()
+        missing = [sid for sid in stop_ids if not cache_db.has_cached_stop(con, sid)]
+        if not missing:
+            return
+        with self._write_lock:  # pro Shard nur ein Schreiber
+            w = cache_db.connect(self.db_path)
+            try:
+                missing = [sid for sid in missing if not cache_db.has_cached_stop(w, sid)]
+                if missing:
+                    cache_db.build_cache_for_stops(self.zip_path, w, missing)
+            finally:
+                w.close()
+
+    def departures(self, stop_ids: List[str], d: date, limit: int) -> List[Tuple[int, Departure]]:
+        """Abfahrten an diesen (lokalen) Halten, nach Zeit sortiert, IDs mit Präfix."""
+        ids = list(dict.fromkeys(x for sid in stop_ids for x in [sid] + self.children(sid)))
+        self.ensure_cached(ids)
+        active = self.active_trip_route(d)
+        con = self.reader()
+
+        boards = []
+        for sid in ids:
+            deps = cache_db.get_next_departures_cached(con, sid, active, limit)
+            boards.append([
+                (parse_gtfs_time_to_seconds(dep.departure_time),
+                 replace(dep, trip_id=global_id(self.name, dep.trip_id), route_id=global_id(self.name, dep.route_id)))
+                for dep in deps
+            ])
+        return list(merge(*boards, key=lambda x: x[0]))[:limit]
+
+
+class MultiFeed:
+    """
+    Fan-out über alle Shards.
+
+        mf = MultiFeed()
+        stations = mf.search_stations("Mannheim")
+        deps = mf.next_departures(stations[0])
+    """
+
+    def __init__(self, feeds: Optional[Dict[str, Dict[str, str]]] = None, workers: int = MULTI_FEED_WORKERS):
+        feeds = feeds or FEEDS
+        self.shards: Dict[str, FeedShard] = {
+            name: FeedShard(name, cfg["zip"], cfg["db"], cfg.get("snapshot")) for name, cfg in feeds.items()
+        }
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="feed")
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False)
+
+    def search_stations(self, query: str, limit: int = DEFAULT_RESULTS_LIMIT) -> List[MergedStation]:
+        futures = {name: self.pool.submit(shard.search, query, limit * 2) for name, shard in self.shards.items()}
+        hits = [(name, s) for name, f in futures.items() for s in f.result()]
+        hits.sort(key=lambda x: (len(x[1].stop_name), x[1].stop_name))
+        return dedupe_stations(hits)[:limit]
+
+    def next_departures(
+        self,
+        station: MergedStation,
+        limit: int = DEFAULT_DEPARTURES_LIMIT,
+        d: Optional[date] = None
+    ) -> List[Departure]:
+        d = d or today_date()
+        by_feed: Dict[str, List[str]] = {}
+        for gid in station.members:
+            feed, local_id = split_id(gid)
+            by_feed.setdefault(feed, []).append(local_id)
+
+        futures = [
+            self.pool.submit(self.shards[feed].departures, ids, d, limit)
+            for feed, ids in by_feed.items() if feed in self.shards
+        ]
+        boards = [f.result() for f in futures]
+
+        # derselbe Zug steht oft im Deutschland- UND im Verbundfeed -> nur einmal zeigen
+        result: List[Departure] = []
+        seen = set()
+        for _, dep in merge(*boards, key=lambda x: x[0]):
+            key = (dep.departure_time, normalize_name(dep.route_name or ""), normalize_name(dep.headsign or ""))
+            if key in seen:
+                continue
+            seen.add(key)
+            result.append(dep)
+            if len(result) >= limit:
+                break
+        return result
+
+
+def dedupe_stations(hits: List[Tuple[str, Stop]], max_meters: float = STATION_DEDUP_METERS) -> List[MergedStation]:
+    """
+    Fasst Treffer zu Stationen zusammen: gleicher normalisierter Name und
+    höchstens max_meters entfernt. Bahnsteige derselben Station (gleicher Name)
+    landen dabei ebenfalls in einer Gruppe. Reihenfolge der Treffer bleibt erhalten.
+    """
+    stations: List[MergedStation] = []
+    by_name: Dict[str, List[MergedStation]] = {}
+    for feed, s in hits:
+        key = normalize_name(s.stop_name)
+        target = None
+        for st in by_name.get(key, []):
+            if haversine_m(st.lat, st.lon, s.lat, s.lon) <= max_meters:
+                target = st
+                break
+        if target is None:
+            target = MergedStation(s.stop_name, s.lat, s.lon)
+            stations.append(target)
+            by_name.setdefault(key, []).append(target)
+        target.members.append(global_id(feed, s.stop_id))
+    return stations
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from utils import format_seconds_hhmm
+
+    parser = argparse.ArgumentParser(description="Suche und Abfahrten über alle Feeds (config.FEEDS)")
+    parser.add_argument("suche")
+    parser.add_argument("--limit", type=int, default=DEFAULT_DEPARTURES_LIMIT)
+    args = parser.parse_args()
+
+    mf = MultiFeed()
+    t0 = time.time()
+    stations = mf.search_stations(args.suche)
+    if not stations:
+        raise SystemExit("Keine Treffer.")
+    for i, st in enumerate(stations, start=1):
+        print(f"{i:2d}. {st.name}  [{', '.join(st.feeds)}]  ({len(st.members)} stop_ids)")
+
+    deps = mf.next_departures(stations[0], args.limit)
+    print(f"\nAbfahrten {stations[0].name} ab {format_seconds_hhmm(now_seconds())}:")
+    for dep in deps:
+        print(f"  {dep.departure_time}  {dep.route_name or '':10s} {dep.headsign or '':25s} ({split_id(dep.trip_id)[0]})")
+    print(f"\n{time.time() - t0:.2f}s")
+    mf.close()
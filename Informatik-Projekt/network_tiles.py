@@ -0,0 +1,379 @@
+# network_tiles.py
+
+"""
+network_tiles.py
+
+Aufgabe:
+    Dieses Modul erzeugt eine Netzübersicht des gesamten Feeds als
+    vorab berechnete GeoJSON-Kacheln (Tiles) auf der lokalen Festplatte.
+    Statt jede Route einzeln in eine Folium-Karte zu packen, lädt der Browser
+    nur die Kacheln, die gerade im sichtbaren Kartenausschnitt liegen.
+
+Verwendete GTFS-Dateien:
+    - stops.txt
+    - trips.txt
+    - stop_times.txt
+    - calendar.txt / calendar_dates.txt (optional für Tagesfilter)
+
+Zentrale Aufgaben:
+    - Sammeln aller Haltestellen mit Abfahrtszahlen
+    - Ermittlung aller unterschiedlichen Stop-zu-Stop-Segmente
+    - Aufteilung in Zoomstufen und Kacheln (Web-Mercator, z/x/y)
+    - Schreiben der Kacheln als GeoJSON-Dateien
+    - Kleiner lokaler HTTP-Server für die Kacheln
+
+Hinweise:
+    - Der Aufbau ist ein einmaliger Offline-Schritt (python network_tiles.py build).
+    - stop_times.txt wird genau einmal gestreamt. Es wird angenommen, dass die
+      Zeilen eines Trips zusammenhängend stehen (bei gtfs.de der Fall).
+    - Pro Kachel werden nur die wichtigsten Features behalten, damit auch die
+      kleinen Zoomstufen flüssig bleiben.
+    - Ein Segment landet nur in den Kacheln, die es tatsächlich schneidet
+      (Gitterlauf entlang der Linie), nicht in allen Kacheln seiner Bounding-Box.
+"""
+
+import json
+import math
+import os
+from array import array
+from datetime import date
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+from config import (
+    GTFS_ZIP_PATH,
+    TILES_DIR,
+    TILES_HOST,
+    TILES_PORT,
+    TILE_MIN_ZOOM,
+    TILE_MAX_ZOOM,
+    TILE_MAX_FEATURES,
+)
+from gtfs_zip import iter_rows
+from stops import load_stops
+from models import Stop
+
+TileKey = Tuple[int, int, int]
+Segment = Tuple[str, str]
+
+EMPTY_COLLECTION = {"type": "FeatureCollection", "features": []}
+
+
+def _tile_position(lat: float, lon: float, zoom: int) -> Tuple[float, float]:
+    """Kachelkoordinaten mit Nachkommastellen (Web-Mercator)."""
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def lonlat_to_tile(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """
+    Rechnet eine Koordinate in die Kachelnummer (x, y) einer Zoomstufe um
+    (Slippy-Map-Schema, wie bei OpenStreetMap).
+    """
+    n = 2 ** zoom
+    x, y = _tile_position(lat, lon, zoom)
+    return min(max(int(x), 0), n - 1), min(max(int(y), 0), n - 1)
+
+
+def _active_trip_ids(zip_path: str, service_date: Optional[date]) -> Optional[Set[str]]:
+    """
+    Liefert die an service_date aktiven trip_ids oder None (= keine Filterung).
+    """
+    if service_date is None:
+        return None
+
+    from calendar_ import active_service_ids
+    from departures import build_active_trip_route_map
+
+    services = active_service_ids(zip_path, service_date)
+    if not services:
+        # Feed nicht für dieses Datum gültig -> wie in der App: ohne Kalenderfilter
+        return None
+    return set(build_active_trip_route_map(zip_path, services))
+
+
+def collect_network(
+    zip_path: str,
+    service_date: Optional[date] = None
+) -> Tuple[Dict[str, int], Dict[Segment, int]]:
+    """
+    Scannt stop_times.txt EINMAL und zählt:
+        - Abfahrten pro stop_id (ohne den letzten Halt eines Trips)
+        - Fahrten pro (ungerichtetem) Segment zwischen zwei aufeinanderfolgenden Halten
+
+    Die Zeilen werden als Spalten gepuffert und nach (Trip, stop_sequence)
+    sortiert – die Reihenfolge in stop_times.txt ist egal.
+
+    Rückgabe:
+        (departures_per_stop, trips_per_segment)
+    """
+    active = _active_trip_ids(zip_path, service_date)
+
+    trip_index: Dict[str, int] = {}
+    stop_index: Dict[str, int] = {}
+    ev_trip, ev_seq, ev_stop, ev_dep = array("i"), array("i"), array("i"), array("b")
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        trip_id = (row.get("trip_id") or "").strip()
+        stop_id = (row.get("stop_id") or "").strip()
+        seq = (row.get("stop_sequence") or "").strip()
+        if not trip_id or not stop_id or not seq.isdigit():
+            continue
+        if active is not None and trip_id not in active:
+            continue
+        ev_trip.append(trip_index.setdefault(trip_id, len(trip_index)))
+        ev_seq.append(int(seq))
+        ev_stop.append(stop_index.setdefault(stop_id, len(stop_index)))
+        ev_dep.append(1 if (row.get("departure_time") or "").strip() else 0)
+
+    stop_ids = list(stop_index)
+    e_trip = np.frombuffer(ev_trip, dtype=np.int32)
+    order = np.lexsort((np.frombuffer(ev_seq, dtype=np.int32), e_trip))
+    trip_s = e_trip[order]
+    stop_s = np.frombuffer(ev_stop, dtype=np.int32)[order]
+    dep_s = np.frombuffer(ev_dep, dtype=np.int8)[order].astype(bool)
+
+    # Abfahrten: am letzten Halt eines Trips fährt er nicht mehr ab
+    is_last = np.ones(len(trip_s), dtype=bool)
+    is_last[:-1] = trip_s[1:] != trip_s[:-1]
+    per_stop = np.bincount(stop_s[dep_s & ~is_last], minlength=len(stop_ids))
+    dep_counts = {stop_ids[i]: int(per_stop[i]) for i in np.flatnonzero(per_stop).tolist()}
+
+    # Segmente: Nachbarn im selben Trip, ungerichtet, pro Trip jedes Segment einmal
+    same = ~is_last[:-1]
+    a, b, t = stop_s[:-1][same], stop_s[1:][same], trip_s[1:][same]
+    keep = a != b
+    a, b, t = a[keep], b[keep], t[keep]
+    per_trip = np.unique(np.stack([t, np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0)
+    pairs, counts = np.unique(per_trip[:, 1:], axis=0, return_counts=True)
+
+    seg_counts: Dict[Segment, int] = {}
+    for (i, j), n in zip(pairs.tolist(), counts.tolist()):
+        x, y = stop_ids[i], stop_ids[j]
+        seg_counts[(x, y) if x < y else (y, x)] = n
+    return dep_counts, seg_counts
+
+
+def _coord_precision(zoom: int) -> int:
+    # Auf kleinen Zoomstufen reichen wenige Nachkommastellen -> kleinere Dateien
+    return 3 if zoom < 8 else 4 if zoom < 11 else 5
+
+
+def _tiles_for_segment(lat1: float, lon1: float, lat2: float, lon2: float, zoom: int) -> Iterable[Tuple[int, int]]:
+    """
+    Alle Kacheln, die die Strecke schneidet (Leaflet zeichnet sie gerade in
+    Web-Mercator). Gitterlauf: von Kachel zu Kachel, je nachdem, ob die Linie
+    zuerst eine senkrechte oder eine waagrechte Kachelgrenze kreuzt.
+    """
+    x0, y0 = _tile_position(lat1, lon1, zoom)
+    x1, y1 = _tile_position(lat2, lon2, zoom)
+    cx, cy = lonlat_to_tile(lat1, lon1, zoom)
+    ex, ey = lonlat_to_tile(lat2, lon2, zoom)
+    dx, dy = x1 - x0, y1 - y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Anteil der Strecke bis zur nächsten Kachelgrenze bzw. pro ganzer Kachel
+    t_next_x = ((cx + (step_x > 0)) - x0) / dx if dx else math.inf
+    t_next_y = ((cy + (step_y > 0)) - y0) / dy if dy else math.inf
+    t_step_x = abs(1.0 / dx) if dx else math.inf
+    t_step_y = abs(1.0 / dy) if dy else math.inf
+
+    yield cx, cy
+    for _ in range(abs(ex - cx) + abs(ey - cy)):
+        if t_next_x < t_next_y:
+            cx += step_x
+            t_next_x += t_step_x
+        else:
+            cy += step_y
+            t_next_y += t_step_y
+        yield cx, cy
+
+
+def build_tiles(
+    stops_by_id: Dict[str, Stop],
+    dep_counts: Dict[str, int],
+    seg_counts: Dict[Segment, int],
+    min_zoom: int = TILE_MIN_ZOOM,
+    max_zoom: int = TILE_MAX_ZOOM,
+    max_features: int = TILE_MAX_FEATURES
+) -> Dict[TileKey, dict]:
+    """
+    Verteilt Haltestellen und Segmente auf Kacheln aller Zoomstufen.
+
+    Pro Kachel werden höchstens max_features Haltestellen und Segmente behalten
+    (die mit den meisten Abfahrten bzw. Fahrten). Dadurch bleibt eine
+    Deutschland-Übersicht auf Zoom 5 genauso leicht wie ein Stadtausschnitt.
+    """
+    tiles: Dict[TileKey, dict] = {}
+
+    # Nach Gewicht sortieren, dann genügt beim Verteilen ein einfaches "Kachel voll?"
+    stop_items = sorted(
+        ((sid, cnt) for sid, cnt in dep_counts.items() if sid in stops_by_id),
+        key=lambda x: -x[1]
+    )
+    seg_items = sorted(
+        ((seg, cnt) for seg, cnt in seg_counts.items() if seg[0] in stops_by_id and seg[1] in stops_by_id),
+        key=lambda x: -x[1]
+    )
+
+    for z in range(min_zoom, max_zoom + 1):
+        prec = _coord_precision(z)
+        stop_fill: Dict[Tuple[int, int], int] = {}
+        seg_fill: Dict[Tuple[int, int], int] = {}
+
+        for seg, cnt in seg_items:
+            a = stops_by_id[seg[0]]
+            b = stops_by_id[seg[1]]
+            feature = None
+            for xy in _tiles_for_segment(a.lat, a.lon, b.lat, b.lon, z):
+                if seg_fill.get(xy, 0) >= max_features:
+                    continue
+                if feature is None:
+                    feature = {
+                        "type": "Feature",
+                        "geometry": {
+                            "type": "LineString",
+                            "coordinates": [
+                                [round(a.lon, prec), round(a.lat, prec)],
+                                [round(b.lon, prec), round(b.lat, prec)],
+                            ],
+                        },
+                        "properties": {"kind": "segment", "trips": cnt},
+                    }
+                seg_fill[xy] = seg_fill.get(xy, 0) + 1
+                tile = tiles.setdefault((z,) + xy, {"type": "FeatureCollection", "features": []})
+                tile["features"].append(feature)
+
+        for sid, cnt in stop_items:
+            s = stops_by_id[sid]
+            xy = lonlat_to_tile(s.lat, s.lon, z)
+            if stop_fill.get(xy, 0) >= max_features:
+                continue
+            stop_fill[xy] = stop_fill.get(xy, 0) + 1
+            tile = tiles.setdefault((z,) + xy, {"type": "FeatureCollection", "features": []})
+            tile["features"].append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(s.lon, prec), round(s.lat, prec)]},
+                "properties": {"kind": "stop", "stop_id": sid, "name": s.stop_name, "departures": cnt},
+            })
+
+    return tiles
+
+
+def write_tiles(tiles: Dict[TileKey, dict], out_dir: str, max_departures: int = 0) -> int:
+    """
+    Schreibt alle Kacheln als <out_dir>/<z>/<x>/<y>.geojson und eine meta.json.
+    Rückgabe: Anzahl geschriebener Kacheln.
+    """
+    zooms = sorted({z for z, _, _ in tiles})
+    for (z, x, y), fc in tiles.items():
+        tile_dir = os.path.join(out_dir, str(z), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f"{y}.geojson"), "w", encoding="utf-8") as f:
+            json.dump(fc, f, ensure_ascii=False, separators=(",", ":"))
+
+    meta = {
+        "min_zoom": zooms[0] if zooms else TILE_MIN_ZOOM,
+        "max_zoom": zooms[-1] if zooms else TILE_MAX_ZOOM,
+        "tiles": len(tiles),
+        "max_departures": max_departures,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return len(tiles)
+
+
+def build_network_tiles(
+    zip_path: str = GTFS_ZIP_PATH,
+    out_dir: str = TILES_DIR,
+    service_date: Optional[date] = None
+) -> int:
+    """
+    Kompletter Offline-Schritt: Feed lesen -> Kacheln berechnen -> auf Platte schreiben.
+    """
+    stops_by_id = load_stops(zip_path)
+    dep_counts, seg_counts = collect_network(zip_path, service_date)
+    tiles = build_tiles(stops_by_id, dep_counts, seg_counts)
+    return write_tiles(tiles, out_dir, max(dep_counts.values(), default=0))
+
+
+class TileRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Liefert Kacheln aus dem Kachelverzeichnis aus. Fehlende Kacheln (z. B. über
+    dem Meer) werden als leere FeatureCollection beantwortet statt mit 404,
+    damit der Browser keine Fehler protokolliert.
+    """
+
+    def end_headers(self) -> None:
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "public, max-age=86400")
+        super().end_headers()
+
+    def guess_type(self, path):
+        if str(path).endswith(".geojson"):
+            return "application/geo+json"
+        return super().guess_type(path)
+
+    def send_error(self, code, message=None, explain=None):
+        if code == 404 and self.path.endswith(".geojson"):
+            body = json.dumps(EMPTY_COLLECTION).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/geo+json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+            return
+        super().send_error(code, message, explain)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_tile_server(tile_dir: str = TILES_DIR, host: str = TILES_HOST, port: int = TILES_PORT) -> ThreadingHTTPServer:
+    handler = partial(TileRequestHandler, directory=tile_dir)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def tiles_url(host: str = TILES_HOST, port: int = TILES_PORT) -> str:
+    """URL-Vorlage für Leaflet, z. B. http://127.0.0.1:8765/{z}/{x}/{y}.geojson"""
+    return f"http://{host}:{port}/{{z}}/{{x}}/{{y}}.geojson"
+
+
+def serve_tiles(tile_dir: str = TILES_DIR, host: str = TILES_HOST, port: int = TILES_PORT) -> None:
+    server = make_tile_server(tile_dir, host, port)
+    print(f"Kachel-Server läuft: {tiles_url(host, port)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from utils import today_date
+
+    parser = argparse.ArgumentParser(description="Netzübersicht als GeoJSON-Kacheln")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Kacheln aus dem GTFS-Feed erzeugen")
+    p_build.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_build.add_argument("--out", default=TILES_DIR)
+    p_build.add_argument("--all-days", action="store_true", help="ohne Kalenderfilter zählen")
+    p_serve = sub.add_parser("serve", help="Kacheln lokal ausliefern")
+    p_serve.add_argument("--dir", default=TILES_DIR)
+    p_serve.add_argument("--port", type=int, default=TILES_PORT)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        n = build_network_tiles(args.zip, args.out, None if args.all_days else today_date())
+        print(f"Kacheln geschrieben: {n} -> {args.out}")
+    else:
+        serve_tiles(args.dir, TILES_HOST, args.port)
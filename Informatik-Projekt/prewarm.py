@@ -0,0 +1,457 @@
+# prewarm.py
+
+"""
+prewarm.py
+
+Aufgabe:
+    Dieses Modul wärmt den SQLite-Cache (cache_db.py) im Hintergrund vor.
+    Die meistgenutzten Stationen werden beim Start in Prioritätsreihenfolge
+    gebaut, damit der erste Nutzer dort nicht auf den kompletten Scan von
+    stop_times.txt warten muss.
+
+Verwendete GTFS-Dateien:
+    - stops.txt       (Stationen / Bahnsteige zusammenfassen)
+    - stop_times.txt  (Abfahrten pro Halt zählen, Cache-Aufbau)
+
+Zentrale Aufgaben:
+    - Rangfolge der Stationen: zuerst nach Anfragen im Query-Log,
+      dann nach Anzahl Abfahrten
+    - Hintergrund-Threads bauen mehrere Halte pro Scan (build_cache_for_stops)
+    - Vordergrund-Anfragen für einen kalten Halt überholen die Warteschlange
+      (eigener Thread, wartet nicht auf laufende Hintergrund-Scans)
+    - Fortschritt (gesamt und pro Halt) für CLI und Streamlit
+
+Hinweise:
+    - Jeder Thread hat seine eigene SQLite-Verbindung; durch WAL bleiben
+      Leser im Vordergrund unblockiert.
+    - Halte ohne Abfahrten bekommen nie Cache-Zeilen. Sie gelten nach der
+      Zählung trotzdem als "fertig", damit sie nicht immer wieder gescannt werden.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache_db import connect, init_db, has_cached_stop, build_cache_for_stops
+from config import (
+    GTFS_ZIP_PATH, CACHE_DB_PATH, QUERY_LOG_PATH,
+    PREWARM_STATIONS, PREWARM_BATCH_STOPS, PREWARM_WORKERS,
+)
+from gtfs_zip import iter_rows
+from models import Stop
+
+QUEUED = "queued"
+BUILDING = "building"
+DONE = "done"
+
+
+@dataclass(frozen=True)
+class PrewarmStatus:
+    ranking: bool              # Zählung der Abfahrten läuft noch
+    stations_total: int        # vorgemerkte Stationen
+    stations_done: int
+    queued: int                # Halte in den Warteschlangen
+    building: List[str]        # Halte, deren Scan gerade läuft
+    rows_total: Optional[int]  # Zeilen in stop_times.txt (geschätzt, bis gezählt)
+    last_error: Optional[str]
+
+    @property
+    def fraction(self) -> float:
+        if self.stations_total == 0:
+            return 0.0 if self.ranking else 1.0
+        return min(1.0, self.stations_done / self.stations_total)
+
+
+# ---------------------------
+# Query-Log
+# ---------------------------
+
+def log_event(kind: str, path: str = QUERY_LOG_PATH, **fields) -> None:
+    """
+    Hängt ein Ereignis an das Query-Log an (eine JSON-Zeile pro Ereignis).
+    kind: "board" (stop_id), "search" (query), "trip_map" (trip_id).
+    Das Log dient der Rangfolge hier und dem Lasttest (loadtest.py).
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": round(time.time(), 3), "kind": kind, **fields}, ensure_ascii=False) + "\n")
+
+
+def log_query(stop_id: str, path: str = QUERY_LOG_PATH) -> None:
+    """Abfahrtstafel für stop_id angefragt."""
+    log_event("board", path, stop_id=stop_id)
+
+
+def query_counts(path: str = QUERY_LOG_PATH) -> Counter:
+    """stop_id -> Anzahl Anfragen. Kaputte Zeilen werden übersprungen."""
+    counts: Counter = Counter()
+    if not os.path.exists(path):
+        return counts
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                sid = json.loads(line).get("stop_id")
+            except (ValueError, AttributeError):
+                continue
+            if sid:
+                counts[sid] += 1
+    return counts
+
+
+# ---------------------------
+# Rangfolge
+# ---------------------------
+
+def count_departures(zip_path: str) -> Tuple[Counter, int]:
+    """Ein Scan über stop_times.txt. Rückgabe: (stop_id -> Halte-Ereignisse, Zeilen gesamt)."""
+    counts: Counter = Counter()
+    total = 0
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        total += 1
+        counts[(row.get("stop_id") or "").strip()] += 1
+    return counts, total
+
+
+def estimate_rows(zip_path: str, filename: str = "stop_times.txt", sample_bytes: int = 1 << 16) -> int:
+    """Schätzt die Zeilenzahl aus Dateigröße und mittlerer Zeilenlänge der ersten Bytes."""
+    with zipfile.ZipFile(zip_path, "r") as z:
+        size = z.getinfo(filename).file_size
+        with z.open(filename, "r") as f:
+            sample = f.read(sample_bytes)
+    lines = max(sample.count(b"\n"), 1)
+    return max(1, size * lines // max(len(sample), 1))
+
+
+def rank_stations(
+    stops_by_id: Dict[str, Stop],
+    departures: Counter,
+    queries: Optional[Counter] = None,
+    limit: int = PREWARM_STATIONS
+) -> List[Tuple[str, List[str]]]:
+    """
+    Fasst Bahnsteige zu Stationen (parent_station) zusammen und sortiert:
+    zuerst nach Anfragen, dann nach Abfahrten.
+    Rückgabe: [(Stations-ID, stop_ids mit Abfahrten), ...]
+    """
+    queries = queries or Counter()
+    members: Dict[str, List[str]] = {}
+    dep_sum: Counter = Counter()
+    query_sum: Counter = Counter()
+
+    for sid, n in departures.items():
+        s = stops_by_id.get(sid)
+        key = s.parent_station if s is not None and s.parent_station else sid
+        members.setdefault(key, []).append(sid)
+        dep_sum[key] += n
+
+    for sid, n in queries.items():
+        s = stops_by_id.get(sid)
+        key = s.parent_station if s is not None and s.parent_station else sid
+        query_sum[key] += n
+
+    ranked = sorted(members, key=lambda k: (-query_sum[k], -dep_sum[k], k))
+    return [(k, sorted(members[k])) for k in ranked[:limit]]
+
+
+# ---------------------------
+# Scheduler
+# ---------------------------
+
+class PrewarmScheduler:
+    """
+    Baut Caches im Hintergrund.
+
+        sched = PrewarmScheduler().start()
+        sched.request(["de:08222:2417_1"])   # kalter Halt -> sofort dran
+        sched.wait(["de:08222:2417_1"], on_progress=print)
+    """
+
+    def __init__(
+        self,
+        zip_path: str = GTFS_ZIP_PATH,
+        db_path: str = CACHE_DB_PATH,
+        query_log: str = QUERY_LOG_PATH,
+        stations: int = PREWARM_STATIONS,
+        batch_stops: int = PREWARM_BATCH_STOPS,
+        workers: int = PREWARM_WORKERS
+    ):
+        self.zip_path = zip_path
+        self.db_path = db_path
+        self.query_log = query_log
+        self.stations = stations
+        self.batch_stops = batch_stops
+        self.workers = workers
+
+        self._cond = threading.Condition()
+        self._state: Dict[str, str] = {}
+        self._scan_of: Dict[str, int] = {}     # stop_id -> laufender Scan
+        self._scan_rows: Dict[int, int] = {}   # Scan -> bisher gelesene Zeilen
+        self._scan_ids = itertools.count()
+        self._seq = itertools.count()
+        self._background: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._urgent: "queue.Queue[str]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        self._departures: Optional[Counter] = None
+        self._ranking = False
+        self._station_stops: Dict[str, List[str]] = {}
+        self.rows_total: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    # ---------- Steuerung ----------
+
+    def start(self, prewarm: bool = True, stops_by_id: Optional[Dict[str, Stop]] = None) -> "PrewarmScheduler":
+        """
+        Startet den Vordergrund-Thread und (mit prewarm=True) Zählung und
+        Hintergrund-Threads. Kehrt sofort zurück.
+        """
+        self._spawn(self._urgent_loop, "prewarm-urgent")
+        if prewarm:
+            with self._cond:
+                self._ranking = True
+            self._spawn(lambda: self._rank(stops_by_id), "prewarm-rank")
+            for i in range(self.workers):
+                self._spawn(self._background_loop, f"prewarm-{i}")
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _spawn(self, target: Callable[[], None], name: str) -> None:
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    # ---------- öffentliche Abfragen ----------
+
+    def is_cached(self, stop_id: str) -> bool:
+        with self._cond:
+            state = self._state.get(stop_id)
+            if state == DONE:
+                return True
+            if state in (QUEUED, BUILDING):
+                return False  # nur der Scheduler weiß, ob der Scan fertig ist
+            if self._departures is not None and self._departures.get(stop_id, 0) == 0:
+                return True
+        # vom Scheduler noch nie gesehen: vielleicht von einem früheren Programmlauf
+        con = connect(self.db_path)
+        try:
+            init_db(con)
+            return has_cached_stop(con, stop_id)
+        finally:
+            con.close()
+
+    def request(self, stop_ids: Iterable[str]) -> List[str]:
+        """
+        Vordergrund-Anfrage: noch nicht gebaute Halte überholen alle
+        Hintergrund-Aufträge. Rückgabe: Halte, auf die gewartet werden muss.
+        """
+        pending: List[str] = []
+        for sid in stop_ids:
+            if self.is_cached(sid):
+                with self._cond:
+                    self._state[sid] = DONE
+                continue
+            with self._cond:
+                state = self._state.get(sid)
+                if state != BUILDING:
+                    self._state[sid] = QUEUED
+                    self._urgent.put(sid)
+            pending.append(sid)
+        return pending
+
+    def progress_for(self, stop_ids: Iterable[str]) -> float:
+        """Fortschritt 0..1 für eine Menge von Halten (Mittelwert)."""
+        ids = list(stop_ids)
+        if not ids:
+            return 1.0
+        total = self.rows_total or estimate_rows(self.zip_path)
+        parts = []
+        with self._cond:
+            for sid in ids:
+                state = self._state.get(sid)
+                if state == DONE:
+                    parts.append(1.0)
+                elif state == BUILDING:
+                    rows = self._scan_rows.get(self._scan_of.get(sid, -1), 0)
+                    parts.append(min(0.99, rows / total))
+                else:
+                    parts.append(0.0)
+        return sum(parts) / len(parts)
+
+    def wait(
+        self,
+        stop_ids: Iterable[str],
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[float], None]] = None,
+        poll: float = 0.25
+    ) -> bool:
+        """Wartet, bis alle Halte gebaut sind. False bei Timeout."""
+        ids = list(stop_ids)
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._cond:
+                if all(self._state.get(sid) == DONE for sid in ids):
+                    break
+                if self.last_error and not any(self._state.get(sid) in (QUEUED, BUILDING) for sid in ids):
+                    return False
+                self._cond.wait(poll)
+            if on_progress is not None:
+                on_progress(self.progress_for(ids))
+            if deadline is not None and time.time() > deadline:
+                return False
+        if on_progress is not None:
+            on_progress(1.0)
+        return True
+
+    def status(self) -> PrewarmStatus:
+        with self._cond:
+            done = sum(
+                1 for ids in self._station_stops.values()
+                if all(self._state.get(sid) == DONE for sid in ids)
+            )
+            return PrewarmStatus(
+                ranking=self._ranking,
+                stations_total=len(self._station_stops),
+                stations_done=done,
+                queued=sum(1 for s in self._state.values() if s == QUEUED),
+                building=sorted(sid for sid, s in self._state.items() if s == BUILDING),
+                rows_total=self.rows_total,
+                last_error=self.last_error,
+            )
+
+    # ---------- Threads ----------
+
+    def _rank(self, stops_by_id: Optional[Dict[str, Stop]]) -> None:
+        try:
+            if stops_by_id is None:
+                from stops import load_stops
+                stops_by_id = load_stops(self.zip_path)
+            departures, total = count_departures(self.zip_path)
+            ranked = rank_stations(stops_by_id, departures, query_counts(self.query_log), self.stations)
+            with self._cond:
+                self._departures = departures
+                self.rows_total = total
+                for prio, (station, ids) in enumerate(ranked):
+                    self._station_stops[station] = ids
+                    for sid in ids:
+                        self._state.setdefault(sid, QUEUED)
+                        self._background.put((prio, next(self._seq), sid))
+                # Halte ohne Abfahrten (z.B. Stationen selbst) sind sofort fertig
+                for sid, state in list(self._state.items()):
+                    if state == QUEUED and departures.get(sid, 0) == 0:
+                        self._state[sid] = DONE
+                self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self.last_error = f"Rangfolge: {e}"
+        finally:
+            with self._cond:
+                self._ranking = False
+
+    def _urgent_loop(self) -> None:
+        con = connect(self.db_path)
+        init_db(con)
+        while not self._stopped.is_set():
+            try:
+                first = self._urgent.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # alles mitnehmen, was inzwischen dazu kam -> ein gemeinsamer Scan
+            while True:
+                try:
+                    batch.append(self._urgent.get_nowait())
+                except queue.Empty:
+                    break
+            self._build(con, batch)
+
+    def _background_loop(self) -> None:
+        con = connect(self.db_path)
+        init_db(con)
+        while not self._stopped.is_set():
+            try:
+                _, _, first = self._background.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_stops:
+                try:
+                    batch.append(self._background.get_nowait()[2])
+                except queue.Empty:
+                    break
+            self._build(con, batch)
+
+    def _build(self, con, stop_ids: List[str]) -> None:
+        """Nimmt die noch offenen Halte aus stop_ids und baut sie in einem Scan."""
+        todo: List[str] = []
+        scan = next(self._scan_ids)
+        with self._cond:
+            for sid in dict.fromkeys(stop_ids):
+                if self._state.get(sid) in (BUILDING, DONE):
+                    continue
+                self._state[sid] = BUILDING
+                self._scan_of[sid] = scan
+                todo.append(sid)
+            self._scan_rows[scan] = 0
+
+        # schon von einem früheren Programmlauf gebaut?
+        cold = [sid for sid in todo if not has_cached_stop(con, sid)]
+        if cold:
+            def report(rows: int) -> None:
+                with self._cond:
+                    self._scan_rows[scan] = rows
+
+            try:
+                build_cache_for_stops(self.zip_path, con, cold, progress=report)
+            except Exception as e:
+                with self._cond:
+                    self.last_error = f"Cache-Aufbau: {e}"
+                    for sid in todo:
+                        self._state.pop(sid, None)
+                        self._scan_of.pop(sid, None)
+                    self._scan_rows.pop(scan, None)
+                    self._cond.notify_all()
+                return
+
+        with self._cond:
+            for sid in todo:
+                self._state[sid] = DONE
+                self._scan_of.pop(sid, None)
+            self._scan_rows.pop(scan, None)
+            self._cond.notify_all()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SQLite-Cache der meistgenutzten Stationen vorwärmen")
+    parser.add_argument("--stationen", type=int, default=PREWARM_STATIONS)
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    parser.add_argument("--db", default=CACHE_DB_PATH)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    sched = PrewarmScheduler(args.zip, args.db, stations=args.stationen).start()
+    while True:
+        st = sched.status()
+        print(f"\r{st.stations_done}/{st.stations_total} Stationen, "
+              f"{len(st.building)} Halte im Bau{' (zähle Abfahrten ...)' if st.ranking else ''}   ",
+              end="", flush=True)
+        if not st.ranking and st.stations_done >= st.stations_total and not st.queued:
+            break
+        if st.last_error:
+            print(f"\nFehler: {st.last_error}")
+            break
+        time.sleep(0.5)
+    print(f"\nfertig in {time.time() - t0:.1f}s")
@@ -16,23 +16,30 @@ Zentrale Aufgaben:
     - Erzeugung einer HTML-Karte
     - Darstellung von Haltestellen-Markern
     - Zeichnen der Verbindungslinie zwischen Haltestellen
+    - Darstellung einer Verbindung mit Umstiegen (journey.py)
+    - Isochronen-Ebene (isochrone.py)
+    - Netzübersicht aus vorgenerierten GeoJSON-Kacheln (siehe network_tiles.py)
+    - Live-Karte der fahrenden Züge (vehicles.py), fest oder selbst aktualisierend
 
 Hinweise:
     - Da der verwendete GTFS-Feed keine shapes.txt enthält, erfolgt die
       Darstellung Stop-zu-Stop anhand der Haltestellenkoordinaten.
 """
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import folium
 import webbrowser
+from branca.element import MacroElement
+from jinja2 import Template
 
-from models import Stop
+from models import Journey, Stop
 
 def build_map_from_stop_ids(
     stops_by_id: Dict[str, Stop],
     ordered_stop_ids: List[str],
     out_file: str,
-    zoom: int = 6
+    zoom: int = 6,
+    geometry: Optional[List[Tuple[float, float]]] = None
 ) -> None:
     coords: List[Tuple[float, float]] = []
     labels: List[str] = []
@@ -50,7 +57,8 @@ def build_map_from_stop_ids(
 
     m = folium.Map(location=[coords[0][0], coords[0][1]], zoom_start=zoom)
 
-    folium.PolyLine(coords, tooltip="Route").add_to(m)
+    # echter Verlauf aus shapes.txt (shapes.py), sonst Halt-zu-Halt
+    folium.PolyLine(geometry or coords, tooltip="Route").add_to(m)
 
     for (lat, lon), label in zip(coords, labels):
         folium.Marker([lat, lon], tooltip=label).add_to(m)
@@ -65,12 +73,14 @@ def build_map_from_stop_ids(
     Zweck:
         Visualisiert eine Fahrt/Route anhand von Koordinaten aus stops.txt.
         Da der GTFS-Feed keine shapes.txt enthält, wird die Route Stop-zu-Stop gezeichnet.
+        Liegt ein Verlauf aus shapes.txt vor (geometry), wird dieser gezeichnet.
 
     Parameter:
         stops_by_id (Dict[str, Stop]): Mapping stop_id -> Stop (enthält lat/lon).
         ordered_stop_ids (List[str]): Haltestellen in Reihenfolge der Route.
         out_file (str): Dateiname der erzeugten HTML-Karte.
         zoom (int): Start-Zoom der Karte.
+        geometry (Optional[List[Tuple[float, float]]]): Linienverlauf (shapes.py) statt Stop-zu-Stop.
 
     Ergebnis:
         - Speichert eine HTML-Datei mit Karte und Route.
@@ -79,4 +89,290 @@ def build_map_from_stop_ids(
     Hinweise:
         - Marker können optional gesetzt werden (Start/Ziel oder alle Stops).
         - Für große Strecken kann die HTML-Datei sehr groß werden (normal bei Folium).
-    """
\ No newline at end of file
+    """
+
+class GeoJsonTileLayer(MacroElement):
+    """
+    Leaflet-GridLayer, der pro sichtbarer Kachel eine GeoJSON-Datei nachlädt.
+
+    Folium kennt nur fertige GeoJSON-Layer (alles auf einmal im HTML). Für das
+    Gesamtnetz wäre das viel zu groß, deshalb wird hier ein kleines Stück
+    JavaScript eingebettet, das nur die Kacheln im Ausschnitt anfragt.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var maxDep = {{ this.max_departures }};
+            var cache = {};
+            var layer = L.GridLayer.extend({
+                createTile: function(coords, done) {
+                    var tile = document.createElement("div");
+                    var key = coords.z + "/" + coords.x + "/" + coords.y;
+                    var url = {{ this.url|tojson }}
+                        .replace("{z}", coords.z).replace("{x}", coords.x).replace("{y}", coords.y);
+                    fetch(url).then(function(r) { return r.json(); }).then(function(fc) {
+                        // veraltet, wenn inzwischen gezoomt wurde (über max_zoom bleibt coords.z = max_zoom)
+                        if (Math.min(map.getZoom(), {{ this.max_zoom }}) !== coords.z) { done(null, tile); return; }
+                        cache[key] = L.geoJSON(fc, {
+                            style: function(f) {
+                                var w = Math.min(1 + Math.log(1 + f.properties.trips) / 2, 6);
+                                return {color: "#3388ff", weight: w, opacity: 0.6};
+                            },
+                            pointToLayer: function(f, latlng) {
+                                var r = 2 + 8 * Math.sqrt(f.properties.departures / Math.max(maxDep, 1));
+                                return L.circleMarker(latlng, {radius: r, color: "#ff7800", weight: 1, fillOpacity: 0.7});
+                            },
+                            onEachFeature: function(f, l) {
+                                if (f.properties.kind === "stop") {
+                                    l.bindTooltip(f.properties.name + " (" + f.properties.departures + " Abfahrten)");
+                                }
+                            }
+                        }).addTo(map);
+                        done(null, tile);
+                    }).catch(function(e) { done(e, tile); });
+                    return tile;
+                }
+            });
+            var grid = new layer({minZoom: {{ this.min_zoom }}, maxNativeZoom: {{ this.max_zoom }}, maxZoom: 18});
+            grid.on("tileunload", function(e) {
+                var key = e.coords.z + "/" + e.coords.x + "/" + e.coords.y;
+                if (cache[key]) { map.removeLayer(cache[key]); delete cache[key]; }
+            });
+            grid.addTo(map);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url: str, min_zoom: int, max_zoom: int, max_departures: int = 0):
+        super().__init__()
+        self._name = "GeoJsonTileLayer"
+        self.url = url
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.max_departures = max_departures
+
+
+def build_network_map(
+    tiles_url: str,
+    center: Tuple[float, float] = (51.16, 10.45),
+    zoom: int = 6,
+    min_zoom: int = 5,
+    max_zoom: int = 12,
+    max_departures: int = 0,
+    out_file: Optional[str] = None
+) -> folium.Map:
+    """
+    Erstellt eine Karte der Netzübersicht, die ihre Daten aus dem lokalen
+    Kachel-Server (network_tiles.py serve) nachlädt.
+
+    Parameter:
+        tiles_url (str): URL-Vorlage mit {z}/{x}/{y}.
+        center, zoom: Startausschnitt (Standard: Deutschland).
+        min_zoom, max_zoom: Zoomstufen, für die Kacheln erzeugt wurden.
+        max_departures (int): größte Abfahrtszahl, für die Skalierung der Kreise.
+        out_file (str | None): falls gesetzt, wird die Karte gespeichert und geöffnet.
+
+    Rückgabe:
+        folium.Map (z. B. für folium_static in Streamlit).
+    """
+    m = folium.Map(location=list(center), zoom_start=zoom, min_zoom=min_zoom)
+    GeoJsonTileLayer(tiles_url, min_zoom, max_zoom, max_departures).add_to(m)
+
+    if out_file:
+        m.save(out_file)
+        print(f"Karte gespeichert: {out_file}")
+        webbrowser.open(out_file)
+    return m
+
+
+LEG_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#9467bd", "#ff7f0e", "#17becf"]
+
+
+def build_map_from_journey(
+    stops_by_id: Dict[str, Stop],
+    journey: Journey,
+    out_file: str,
+    zoom: int = 6,
+    shape_store=None
+) -> Optional[folium.Map]:
+    """
+    Zeichnet eine Verbindung (journey.py): jede Fahrt in eigener Farbe,
+    Fußwege gestrichelt, Umstiegshalte als Marker.
+    Mit shape_store (shapes.ShapeStore) folgen die Fahrten dem echten Verlauf.
+    """
+    m = None
+    color_i = 0
+    for leg in journey.legs:
+        ids = list(leg.stop_ids) if leg.kind == "trip" else [leg.from_stop_id, leg.to_stop_id]
+        coords = [(stops_by_id[sid].lat, stops_by_id[sid].lon) for sid in ids if sid in stops_by_id]
+        if not coords:
+            continue
+        if m is None:
+            m = folium.Map(location=[coords[0][0], coords[0][1]], zoom_start=zoom)
+
+        if leg.kind == "walk":
+            folium.PolyLine(coords, color="gray", dash_array="5,8", tooltip="Fußweg").add_to(m)
+            continue
+
+        color = LEG_COLORS[color_i % len(LEG_COLORS)]
+        color_i += 1
+        if shape_store is not None and leg.trip_id:
+            coords = shape_store.trip_geometry(leg.trip_id, ids, stops_by_id) or coords
+        folium.PolyLine(coords, color=color, weight=5, tooltip=f"trip_id={leg.trip_id}").add_to(m)
+        for sid in (leg.from_stop_id, leg.to_stop_id):
+            s = stops_by_id.get(sid)
+            if s:
+                folium.Marker([s.lat, s.lon], tooltip=s.stop_name).add_to(m)
+
+    if m is None:
+        print("Keine Koordinaten gefunden – Karte kann nicht erstellt werden.")
+        return None
+
+    m.save(out_file)
+    print(f"Karte gespeichert: {out_file}")
+    webbrowser.open(out_file)
+    return m
+
+
+BAND_COLORS = ["#1a9850", "#fee08b", "#fc8d59", "#d73027", "#7f0000"]
+
+
+def add_isochrone_layer(m: folium.Map, stops_by_id: Dict[str, Stop], isochrone, bands_min=None) -> folium.FeatureGroup:
+    """
+    Fügt einer Karte eine Ebene mit erreichbaren Halten hinzu, eingefärbt nach Zeitband.
+    isochrone: Ergebnis von isochrone.compute_isochrone.
+    """
+    layer = folium.FeatureGroup(name="Isochrone")
+    bands = isochrone.bands(bands_min) if bands_min else isochrone.bands()
+    minutes = isochrone.travel_minutes()
+
+    for i, (band, ids) in enumerate(bands.items()):
+        color = BAND_COLORS[min(i, len(BAND_COLORS) - 1)]
+        for sid in ids:
+            s = stops_by_id.get(sid)
+            if not s:
+                continue
+            folium.CircleMarker(
+                [s.lat, s.lon],
+                radius=5,
+                color=color,
+                fill=True,
+                fill_opacity=0.8,
+                weight=1,
+                tooltip=f"{s.stop_name}: {minutes.get(sid, band)} min (≤ {band})",
+            ).add_to(layer)
+
+    layer.add_to(m)
+    return layer
+
+
+def build_isochrone_map(stops_by_id: Dict[str, Stop], isochrone, out_file: str, zoom: int = 6) -> Optional[folium.Map]:
+    """Eigene Karte mit Startstation und Isochronen-Ebene."""
+    origin = next((stops_by_id[s] for s in isochrone.origin_ids if s in stops_by_id), None)
+    if origin is None:
+        print("Keine Koordinaten gefunden – Karte kann nicht erstellt werden.")
+        return None
+
+    m = folium.Map(location=[origin.lat, origin.lon], zoom_start=zoom)
+    add_isochrone_layer(m, stops_by_id, isochrone)
+    folium.Marker([origin.lat, origin.lon], tooltip=origin.stop_name, icon=folium.Icon(color="black")).add_to(m)
+
+    m.save(out_file)
+    print(f"Karte gespeichert: {out_file}")
+    webbrowser.open(out_file)
+    return m
+
+
+def delay_color(delay_min: int) -> str:
+    """Farbe eines Fahrzeugs nach Verspätung (gleiche Stufen wie im JavaScript unten)."""
+    if delay_min < 1:
+        return "#2ca02c"
+    if delay_min < 6:
+        return "#ff7f0e"
+    return "#d62728"
+
+
+def add_vehicle_layer(m: folium.Map, positions, max_vehicles: int = 5000) -> folium.FeatureGroup:
+    """
+    Fügt die Fahrzeuge (vehicles.VehiclePositions) als Kreise hinzu, eingefärbt
+    nach Verspätung. Bei sehr vielen Fahrzeugen nur die ersten max_vehicles.
+    """
+    layer = folium.FeatureGroup(name="Fahrzeuge")
+    for i in range(min(len(positions), max_vehicles)):
+        delay_min = int(positions.delay_sec[i]) // 60
+        state = "am Halt" if positions.at_stop[i] else "unterwegs"
+        folium.CircleMarker(
+            [float(positions.lat[i]), float(positions.lon[i])],
+            radius=5,
+            color=delay_color(delay_min),
+            fill=True,
+            fill_opacity=0.9,
+            weight=1,
+            tooltip=f"{positions.route_names[i]} → {positions.headsigns[i]} (+{delay_min} min, {state})",
+        ).add_to(layer)
+    layer.add_to(m)
+    return layer
+
+
+class VehicleLayer(MacroElement):
+    """
+    Ebene, die alle refresh_sec Sekunden die Fahrzeugpositionen als GeoJSON
+    nachlädt (python vehicles.py serve) und die Punkte ersetzt – die Karte
+    selbst (Ausschnitt, Zoom) bleibt dabei stehen.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var current = null;
+            function color(d) { return d < 1 ? "#2ca02c" : (d < 6 ? "#ff7f0e" : "#d62728"); }
+            function refresh() {
+                fetch({{ this.url|tojson }}, {cache: "no-store"}).then(function(r) { return r.json(); }).then(function(fc) {
+                    var next = L.geoJSON(fc, {
+                        pointToLayer: function(f, latlng) {
+                            return L.circleMarker(latlng, {radius: 5, color: color(f.properties.delay_min), weight: 1, fillOpacity: 0.9});
+                        },
+                        onEachFeature: function(f, l) {
+                            var p = f.properties;
+                            l.bindTooltip(p.line + " → " + p.headsign + " (+" + p.delay_min + " min), nächster Halt: " + p.next_stop);
+                        }
+                    }).addTo(map);
+                    if (current) { map.removeLayer(current); }
+                    current = next;
+                }).catch(function() {});
+            }
+            refresh();
+            setInterval(refresh, {{ this.refresh_ms }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url: str, refresh_sec: float = 5):
+        super().__init__()
+        self._name = "VehicleLayer"
+        self.url = url
+        self.refresh_ms = int(refresh_sec * 1000)
+
+
+def build_vehicle_map(
+    vehicles_url: str,
+    refresh_sec: float = 5,
+    center: Tuple[float, float] = (51.16, 10.45),
+    zoom: int = 6,
+    out_file: Optional[str] = None
+) -> folium.Map:
+    """
+    Live-Karte aller fahrenden Züge, die sich selbst beim Fahrzeug-Server
+    (vehicles.py serve) aktualisiert.
+    """
+    m = folium.Map(location=list(center), zoom_start=zoom)
+    VehicleLayer(vehicles_url, refresh_sec).add_to(m)
+
+    if out_file:
+        m.save(out_file)
+        print(f"Karte gespeichert: {out_file}")
+        webbrowser.open(out_file)
+    return m
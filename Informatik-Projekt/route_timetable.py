@@ -0,0 +1,211 @@
+# route_timetable.py
+
+"""
+route_timetable.py
+
+Aufgabe:
+    Dieses Modul erzeugt den kompletten Fahrplan einer Linie (Aushangfahrplan):
+    alle Fahrten einer Linie und Richtung an einem Datum als Matrix
+    Fahrten x Halte.
+
+Datenquelle:
+    - kompilierter Tagesfahrplan (timetable.py): die Halte-Ereignisse jedes
+      Trips liegen dort bereits zusammenhängend und nach stop_sequence sortiert,
+      deshalb ist kein Scan von stop_times.txt pro Trip nötig
+
+Zentrale Aufgaben:
+    - Trips nach Haltemuster (gleiche Halte-Folge) gruppieren
+    - Muster und Fahrten nach erster Abfahrt sortieren
+    - gemeinsame Halte-Reihenfolge aller Muster (Zusammenführung)
+    - Ausgabe in der Konsole, als CSV und im Dashboard (app_streamlit.py)
+
+Hinweise:
+    - Linie = route_id oder Linienname (z.B. "S3"); bei einem Namen werden
+      alle Routen mit diesem Namen zusammengefasst.
+    - Zellen ohne Halt haben den Wert -1. Am letzten Halt eines Trips steht
+      die Ankunftszeit, sonst die Abfahrtszeit.
+    - Hält ein Muster mehrmals am selben Halt (Ringlinien, Schleifen), bekommt
+      jeder Besuch eine eigene Spalte: Spalten sind (stop_id, n-ter Besuch).
+"""
+
+import csv
+import io
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from timetable import Timetable
+from utils import format_seconds_hhmm
+
+
+@dataclass
+class RouteTimetable:
+    route_label: str
+    direction: Optional[int]
+    stop_ids: List[str]             # Spalten in Fahrtrichtung (ein Halt kann mehrfach vorkommen)
+    trip_ids: List[str]             # Zeilen, nach Muster und erster Abfahrt sortiert
+    headsigns: List[str]
+    pattern: np.ndarray             # Muster-Nummer je Zeile
+    patterns: List[Tuple[str, ...]] # Halte-Folge je Muster
+    times: np.ndarray               # (Fahrten, Halte) Sekunden, -1 = kein Halt
+
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    def cell(self, row: int, col: int) -> str:
+        sec = int(self.times[row, col])
+        return "" if sec < 0 else format_seconds_hhmm(sec)
+
+    def _write(self, f, stop_names: Dict[str, str]) -> None:
+        w = csv.writer(f)
+        w.writerow(["stop_id", "stop_name"] + self.trip_ids)
+        w.writerow(["", "Muster"] + [int(p) + 1 for p in self.pattern])
+        w.writerow(["", "Ziel"] + self.headsigns)
+        for col, sid in enumerate(self.stop_ids):
+            w.writerow([sid, stop_names.get(sid, sid)] + [self.cell(r, col) for r in range(len(self))])
+
+    def write_csv(self, path: str, stop_names: Optional[Dict[str, str]] = None) -> None:
+        """Aushang-Layout: eine Zeile pro Halt, eine Spalte pro Fahrt."""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            self._write(f, stop_names or {})
+
+    def csv_text(self, stop_names: Optional[Dict[str, str]] = None) -> str:
+        """Wie write_csv, aber als Text (z.B. für einen Download-Button)."""
+        buf = io.StringIO()
+        self._write(buf, stop_names or {})
+        return buf.getvalue()
+
+
+def route_indices(tt: Timetable, route: str) -> List[int]:
+    """route_id oder Linienname -> Indizes in tt.route_ids."""
+    if route in tt.route_ids:
+        return [tt.route_ids.index(route)]
+    wanted = route.strip().lower()
+    return [i for i, name in enumerate(tt.route_names) if name.strip().lower() == wanted]
+
+
+ColumnKey = Tuple[str, int]  # (stop_id, n-ter Besuch im Muster, ab 0)
+
+
+def column_keys(pattern: Tuple[str, ...]) -> List[ColumnKey]:
+    """Halte-Folge -> Spaltenschlüssel; A, B, C, A -> (A,0), (B,0), (C,0), (A,1)."""
+    seen: Dict[str, int] = {}
+    keys: List[ColumnKey] = []
+    for sid in pattern:
+        n = seen.get(sid, 0)
+        keys.append((sid, n))
+        seen[sid] = n + 1
+    return keys
+
+
+def merge_stop_orders(patterns: List[Tuple[str, ...]]) -> List[ColumnKey]:
+    """
+    Gemeinsame Spalten-Reihenfolge: Start mit dem längsten Muster, fehlende
+    Spalten anderer Muster werden hinter ihrem Vorgänger eingefügt.
+    """
+    order: List[ColumnKey] = []
+    for pat in sorted(patterns, key=len, reverse=True):
+        pos = -1
+        for key in column_keys(pat):
+            if key in order:
+                pos = order.index(key)
+            else:
+                order.insert(pos + 1, key)
+                pos += 1
+    return order
+
+
+def build_route_timetable(tt: Timetable, route: str, direction: Optional[int] = None) -> RouteTimetable:
+    """
+    Fahrplanmatrix einer Linie für den Tag des Timetables.
+    direction: 0/1 wie direction_id in trips.txt, None = alle Trips.
+    """
+    routes = route_indices(tt, route)
+    if not routes:
+        raise LookupError(f"keine Linie '{route}' an diesem Tag")
+
+    mask = np.isin(tt.trip_route, np.asarray(routes, dtype=tt.trip_route.dtype))
+    if direction is not None:
+        mask &= tt.trip_direction == direction
+    trips = np.flatnonzero(mask & (np.diff(tt.trip_ptr) > 0))
+
+    # Trips nach Haltemuster gruppieren
+    groups: Dict[Tuple[int, ...], List[int]] = {}
+    for t in trips.tolist():
+        sl = tt.trip_slice(t)
+        groups.setdefault(tuple(tt.ev_stop[sl].tolist()), []).append(t)
+
+    blocks = []
+    for pat, members in groups.items():
+        m = np.asarray(members, dtype=np.int64)
+        idx = tt.trip_ptr[m][:, None] + np.arange(len(pat))[None, :]
+        times = tt.ev_dep[idx].astype(np.int32)
+        times[:, -1] = tt.ev_arr[idx[:, -1]]
+        order = np.argsort(times[:, 0], kind="stable")
+        blocks.append((int(times[order[0], 0]), pat, m[order], times[order]))
+    blocks.sort(key=lambda b: b[0])
+
+    patterns = [tuple(tt.stop_ids[s] for s in pat) for _, pat, _, _ in blocks]
+    columns = merge_stop_orders(patterns)
+    col_of = {key: i for i, key in enumerate(columns)}
+    stop_ids = [sid for sid, _ in columns]
+
+    n_rows = sum(len(b[2]) for b in blocks)
+    matrix = np.full((n_rows, len(stop_ids)), -1, dtype=np.int32)
+    pattern = np.zeros(n_rows, dtype=np.int32)
+    row_trips: List[int] = []
+    row = 0
+    for p, (_, _, members, times) in enumerate(blocks):
+        cols = np.asarray([col_of[key] for key in column_keys(patterns[p])], dtype=np.int64)
+        matrix[row:row + len(members), cols] = times
+        pattern[row:row + len(members)] = p
+        row_trips.extend(members.tolist())
+        row += len(members)
+
+    return RouteTimetable(
+        route_label=tt.route_names[routes[0]],
+        direction=direction,
+        stop_ids=stop_ids,
+        trip_ids=[tt.trip_ids[t] for t in row_trips],
+        headsigns=[tt.headsigns[int(tt.trip_headsign[t])] for t in row_trips],
+        pattern=pattern,
+        patterns=patterns,
+        times=matrix,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from datetime import date
+    from config import GTFS_ZIP_PATH
+    from cli import print_route_timetable
+    from stops import load_stops
+    from timetable import get_timetable
+    from utils import today_date
+
+    parser = argparse.ArgumentParser(description="Fahrplan einer Linie (Fahrten x Halte)")
+    parser.add_argument("linie", help="route_id oder Linienname, z.B. S3")
+    parser.add_argument("--richtung", type=int, choices=[0, 1], help="direction_id (Standard: alle)")
+    parser.add_argument("--datum", help="Datum YYYY-MM-DD (Standard: heute)")
+    parser.add_argument("--csv", help="Matrix als CSV schreiben")
+    parser.add_argument("--zip", default=GTFS_ZIP_PATH)
+    args = parser.parse_args()
+
+    d = date.fromisoformat(args.datum) if args.datum else today_date()
+    stops_by_id = load_stops(args.zip)
+    tt = get_timetable(args.zip, d, stops_by_id=stops_by_id)
+
+    t0 = time.time()
+    try:
+        rt = build_route_timetable(tt, args.linie, args.richtung)
+    except LookupError as e:
+        raise SystemExit(str(e))
+    print(f"{len(rt)} Fahrten, {len(rt.patterns)} Haltemuster in {time.time() - t0:.3f}s.")
+
+    if args.csv:
+        rt.write_csv(args.csv, {sid: s.stop_name for sid, s in stops_by_id.items()})
+        print(f"CSV geschrieben: {args.csv}")
+    else:
+        print_route_timetable(rt, stops_by_id)
@@ -0,0 +1,446 @@
+# shapes.py
+
+"""
+shapes.py
+
+Aufgabe:
+    Dieses Modul liest optional die Linienverläufe aus shapes.txt ein, damit
+    Karten den echten Streckenverlauf statt gerader Linien zwischen den
+    Halten zeichnen können.
+
+Verwendete GTFS-Dateien:
+    - shapes.txt      (Punkte je shape_id)
+    - trips.txt       (trip_id -> shape_id)
+    - stop_times.txt  (Halte-Folge je Trip, optional shape_dist_traveled)
+    - stops.txt       (Koordinaten zum Einrasten der Halte auf den Verlauf)
+
+Zentrale Aufgaben:
+    - jeden Verlauf EINMAL als Encoded Polyline mit kumulierten Distanzen speichern
+    - Trip -> Verlauf verknüpfen
+    - für jedes Haltepaar eines Verlaufs den Ausschnitt (Punkt-Indizes)
+      vorberechnen -> Geometrie eines Trips/Abschnitts ist ein Schlüssel-Zugriff
+    - Fallback: ohne shapes.txt (z.B. Deutschland-Feed) liefern die Abfragen
+      None und die Karte zeichnet wie bisher Halt-zu-Halt
+
+Hinweise:
+    - Gespeichert wird in derselben SQLite-Datei wie der Abfahrts-Cache.
+    - Aufbau: python shapes.py build
+"""
+
+import sqlite3
+import zipfile
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import GTFS_ZIP_PATH, CACHE_DB_PATH
+from gtfs_zip import iter_rows
+from models import Stop
+
+LatLon = Tuple[float, float]
+
+SNAP_MAX_METERS = 500  # weiter entfernte Halte bekommen keinen Ausschnitt (Fallback: gerade Linie)
+DECODED_CACHE_SIZE = 256
+
+
+# ---------------------------
+# Encoded Polyline (Google-Format, 5 Nachkommastellen)
+# ---------------------------
+
+def _encode_value(v: int, out: List[str]) -> None:
+    v = ~(v << 1) if v < 0 else v << 1
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1F)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def encode_polyline(coords: Sequence[LatLon]) -> str:
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        ilat, ilon = int(round(lat * 1e5)), int(round(lon * 1e5))
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode_polyline(text: str) -> List[LatLon]:
+    coords: List[LatLon] = []
+    i = lat = lon = 0
+    n = len(text)
+    while i < n:
+        vals = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(text[i]) - 63
+                i += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            vals.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += vals[0]
+        lon += vals[1]
+        coords.append((lat / 1e5, lon / 1e5))
+    return coords
+
+
+def cumulative_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Kumulierte Distanz in Metern entlang der Punkte (Haversine, vektorisiert)."""
+    if len(lat) < 2:
+        return np.zeros(len(lat), dtype=np.float64)
+    p = np.radians(lat)
+    dp = np.diff(p)
+    dl = np.radians(np.diff(lon))
+    a = np.sin(dp / 2) ** 2 + np.cos(p[:-1]) * np.cos(p[1:]) * np.sin(dl / 2) ** 2
+    step = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+    return np.r_[0.0, np.cumsum(step)]
+
+
+# ---------------------------
+# Speicher
+# ---------------------------
+
+def init_shape_db(con: sqlite3.Connection) -> None:
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS shapes (
+    shape_id TEXT PRIMARY KEY,
+    polyline TEXT NOT NULL,
+    cum_dist BLOB NOT NULL
+);
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS trip_shapes (
+    trip_id TEXT PRIMARY KEY,
+    shape_id TEXT NOT NULL
+);
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS shape_segments (
+    shape_id TEXT NOT NULL,
+    from_stop_id TEXT NOT NULL,
+    to_stop_id TEXT NOT NULL,
+    start_idx INTEGER NOT NULL,
+    end_idx INTEGER NOT NULL,
+    PRIMARY KEY (shape_id, from_stop_id, to_stop_id)
+);
+    """)
+    con.commit()
+
+
+def feed_has_shapes(zip_path: str) -> bool:
+    with zipfile.ZipFile(zip_path, "r") as z:
+        return "shapes.txt" in z.namelist()
+
+
+def _float(v: Optional[str]) -> float:
+    v = (v or "").strip()
+    try:
+        return float(v) if v else float("nan")
+    except ValueError:
+        return float("nan")
+
+
+def snap_stops(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    stop_coords: Sequence[LatLon],
+    shape_dist: Optional[np.ndarray] = None,
+    stop_dist: Optional[Sequence[float]] = None
+) -> List[Optional[int]]:
+    """
+    Punkt-Index des Verlaufs für jeden Halt, in Fahrtrichtung nie rückwärts.
+    Mit shape_dist_traveled (in beiden Dateien) per binärer Suche, sonst per
+    dynamischer Programmierung: die Folge nicht fallender Indizes mit der
+    kleinsten Summe der Abstände. So rastet ein früher Halt auf Ring- oder
+    Hin-und-zurück-Verläufen nicht auf den Punkt kurz vor dem Ende ein, nur
+    weil der zufällig etwas näher liegt. None = zu weit weg.
+    """
+    if shape_dist is not None and stop_dist is not None and not np.isnan(shape_dist).any() \
+            and not any(np.isnan(d) for d in stop_dist):
+        idx = np.searchsorted(shape_dist, np.asarray(stop_dist, dtype=np.float64))
+        idx = np.minimum(idx, len(lat) - 1)
+        return np.maximum.accumulate(idx).tolist()
+
+    # lokale Näherung in Metern reicht zum Einrasten
+    k = np.cos(np.radians(float(np.mean(lat)))) * 111320.0
+    x = lon * k
+    y = lat * 110540.0
+    result: List[Optional[int]] = [None] * len(stop_coords)
+
+    # Halte ohne Koordinaten oder ohne Punkt in SNAP_MAX_METERS nehmen nicht teil
+    rows: List[Tuple[int, np.ndarray]] = []
+    for i, (s_lat, s_lon) in enumerate(stop_coords):
+        if not (np.isfinite(s_lat) and np.isfinite(s_lon)):
+            continue
+        d = np.hypot(x - s_lon * k, y - s_lat * 110540.0)
+        if float(d.min()) <= SNAP_MAX_METERS:
+            rows.append((i, d))
+    if not rows:
+        return result
+
+    # cost[j]: kleinste Abstandssumme, wenn der aktuelle Halt auf Punkt j liegt
+    idx = np.arange(len(x))
+    cost = rows[0][1]
+    back: List[np.ndarray] = []
+    for _, d in rows[1:]:
+        best = np.minimum.accumulate(cost)
+        back.append(np.maximum.accumulate(np.where(cost == best, idx, 0)))  # Index des Minimums bis j
+        cost = d + best
+
+    j = int(np.argmin(cost))
+    for r in range(len(rows) - 1, -1, -1):
+        i, d = rows[r]
+        if d[j] <= SNAP_MAX_METERS:
+            result[i] = j
+        if r:
+            j = int(back[r - 1][j])
+    return result
+
+
+def build_shapes(zip_path: str, con: sqlite3.Connection, stops_by_id: Optional[Dict[str, Stop]] = None) -> Dict[str, int]:
+    """
+    Liest shapes.txt, trips.txt und stop_times.txt je EINMAL und füllt die
+    Tabellen shapes, trip_shapes und shape_segments neu.
+    Rückgabe: Anzahl Verläufe, Trips, Abschnitte.
+    """
+    init_shape_db(con)
+    for table in ("shapes", "trip_shapes", "shape_segments"):
+        con.execute(f"DELETE FROM {table};")
+    con.commit()
+    if not feed_has_shapes(zip_path):
+        return {"shapes": 0, "trips": 0, "segments": 0}
+
+    if stops_by_id is None:
+        from stops import load_stops
+        stops_by_id = load_stops(zip_path)
+
+    # 1) Punkte je Verlauf
+    pts: Dict[str, Tuple[array, array, array, array]] = {}
+    for row in iter_rows(zip_path, "shapes.txt"):
+        sid = (row.get("shape_id") or "").strip()
+        seq = (row.get("shape_pt_sequence") or "").strip()
+        if not sid or not seq.isdigit():
+            continue
+        cols = pts.get(sid)
+        if cols is None:
+            cols = pts[sid] = (array("i"), array("d"), array("d"), array("d"))
+        cols[0].append(int(seq))
+        cols[1].append(_float(row.get("shape_pt_lat")))
+        cols[2].append(_float(row.get("shape_pt_lon")))
+        cols[3].append(_float(row.get("shape_dist_traveled")))
+
+    geo: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    shape_rows = []
+    for sid, (seq, la, lo, dist) in pts.items():
+        order = np.argsort(np.frombuffer(seq, dtype=np.int32), kind="stable")
+        lat = np.frombuffer(la, dtype=np.float64)[order]
+        lon = np.frombuffer(lo, dtype=np.float64)[order]
+        geo[sid] = (lat, lon, np.frombuffer(dist, dtype=np.float64)[order])
+        cum = cumulative_distances(lat, lon).astype(np.float32)
+        shape_rows.append((sid, encode_polyline(zip(lat.tolist(), lon.tolist())), cum.tobytes()))
+    con.executemany("INSERT INTO shapes VALUES (?,?,?);", shape_rows)
+    del pts
+
+    # 2) Trip -> Verlauf
+    trip_shape: Dict[str, str] = {}
+    for row in iter_rows(zip_path, "trips.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        sid = (row.get("shape_id") or "").strip()
+        if tid and sid in geo:
+            trip_shape[tid] = sid
+    con.executemany("INSERT INTO trip_shapes VALUES (?,?);", trip_shape.items())
+
+    # 3) Halte-Folge je Trip (nur Trips mit Verlauf), Reihenfolge in der Datei egal
+    trip_index: Dict[str, int] = {}
+    stop_index: Dict[str, int] = {}
+    ev_trip, ev_seq, ev_stop, ev_dist = array("i"), array("i"), array("i"), array("d")
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        if tid not in trip_shape:
+            continue
+        stop_id = (row.get("stop_id") or "").strip()
+        seq = (row.get("stop_sequence") or "").strip()
+        if not stop_id or not seq.isdigit():
+            continue
+        ev_trip.append(trip_index.setdefault(tid, len(trip_index)))
+        ev_seq.append(int(seq))
+        ev_stop.append(stop_index.setdefault(stop_id, len(stop_index)))
+        ev_dist.append(_float(row.get("shape_dist_traveled")))
+
+    e_trip = np.frombuffer(ev_trip, dtype=np.int32)
+    order = np.lexsort((np.frombuffer(ev_seq, dtype=np.int32), e_trip))
+    ptr = np.zeros(len(trip_index) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(e_trip, minlength=len(trip_index)), out=ptr[1:])
+    stop_l = np.frombuffer(ev_stop, dtype=np.int32)[order].tolist()
+    dist_l = np.frombuffer(ev_dist, dtype=np.float64)[order].tolist()
+    ptr_l = ptr.tolist()
+    stop_ids = list(stop_index)
+
+    # 4) pro (Verlauf, Halte-Folge) einmal einrasten
+    done = set()
+    seg_rows = []
+    for tid, t in trip_index.items():
+        sid = trip_shape[tid]
+        a, b = ptr_l[t], ptr_l[t + 1]
+        key = (sid, tuple(stop_l[a:b]))
+        if key in done:
+            continue
+        done.add(key)
+
+        seq_ids = [stop_ids[s] for s in key[1]]
+        coords = [(stops_by_id[x].lat, stops_by_id[x].lon) if x in stops_by_id else (float("nan"), float("nan"))
+                  for x in seq_ids]
+        lat, lon, sdist = geo[sid]
+        snapped = snap_stops(lat, lon, coords, sdist, dist_l[a:b])
+        for i in range(len(seq_ids) - 1):
+            s0, s1 = snapped[i], snapped[i + 1]
+            if s0 is None or s1 is None or seq_ids[i] == seq_ids[i + 1]:
+                continue
+            seg_rows.append((sid, seq_ids[i], seq_ids[i + 1], s0, s1))
+
+    con.executemany("INSERT OR IGNORE INTO shape_segments VALUES (?,?,?,?,?);", seg_rows)
+    con.commit()
+    return {"shapes": len(shape_rows), "trips": len(trip_shape), "segments": len(seg_rows)}
+
+
+def check_loop_snapping() -> bool:
+    """
+    Ring mit Start und Ziel am selben Ort: Halte A..D liegen auf dem Hinweg,
+    der letzte Halt wieder bei A. Der frühe Halt B liegt dem Rückweg-Punkt
+    näher als dem Hinweg – er muss trotzdem auf den Hinweg einrasten.
+    """
+    # Quadrat ~1 km Kantenlänge, gegen den Uhrzeigersinn, zurück zum Start
+    corners = [(49.0, 8.0), (49.0, 8.0137), (49.009, 8.0137), (49.009, 8.0), (49.0, 8.0)]
+    lat, lon = [], []
+    for (a_lat, a_lon), (b_lat, b_lon) in zip(corners, corners[1:]):
+        for t in np.linspace(0.0, 1.0, 20, endpoint=False):
+            lat.append(a_lat + (b_lat - a_lat) * t)
+            lon.append(a_lon + (b_lon - a_lon) * t)
+    lat.append(corners[-1][0])
+    lon.append(corners[-1][1])
+    lat_a, lon_a = np.array(lat), np.array(lon)
+
+    stops = [(49.0, 8.0), (49.0005, 8.0003), (49.0, 8.0137), (49.009, 8.0137), (49.009, 8.0), (49.0, 8.0)]
+    snapped = snap_stops(lat_a, lon_a, stops)
+    ok = None not in snapped and snapped == sorted(snapped) and snapped[1] < 20 and snapped[-1] == len(lat) - 1
+    print(f"Ringverlauf ({len(lat)} Punkte): {snapped} -> {'ok' if ok else 'FEHLER'}")
+    return ok
+
+
+class ShapeStore:
+    """
+    Lesender Zugriff mit LRU-Cache der dekodierten Verläufe.
+
+        store = ShapeStore(con)
+        coords = store.trip_geometry(trip_id, ordered_stop_ids, stops_by_id)
+    """
+
+    def __init__(self, con: sqlite3.Connection):
+        init_shape_db(con)
+        self.con = con
+        self._decoded: "OrderedDict[str, List[LatLon]]" = OrderedDict()
+
+    def available(self) -> bool:
+        return self.con.execute("SELECT 1 FROM shapes LIMIT 1;").fetchone() is not None
+
+    def trip_shape(self, trip_id: str) -> Optional[str]:
+        row = self.con.execute("SELECT shape_id FROM trip_shapes WHERE trip_id=?;", (trip_id,)).fetchone()
+        return row[0] if row else None
+
+    def shape_coords(self, shape_id: str) -> Optional[List[LatLon]]:
+        coords = self._decoded.get(shape_id)
+        if coords is not None:
+            self._decoded.move_to_end(shape_id)
+            return coords
+        row = self.con.execute("SELECT polyline FROM shapes WHERE shape_id=?;", (shape_id,)).fetchone()
+        if row is None:
+            return None
+        coords = decode_polyline(row[0])
+        self._decoded[shape_id] = coords
+        if len(self._decoded) > DECODED_CACHE_SIZE:
+            self._decoded.popitem(last=False)
+        return coords
+
+    def shape_length_m(self, shape_id: str) -> Optional[float]:
+        row = self.con.execute("SELECT cum_dist FROM shapes WHERE shape_id=?;", (shape_id,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return float(np.frombuffer(row[0], dtype=np.float32)[-1])
+
+    def segment_geometry(self, shape_id: str, from_stop_id: str, to_stop_id: str) -> Optional[List[LatLon]]:
+        """Ausschnitt des Verlaufs zwischen zwei aufeinanderfolgenden Halten."""
+        row = self.con.execute(
+            "SELECT start_idx, end_idx FROM shape_segments WHERE shape_id=? AND from_stop_id=? AND to_stop_id=?;",
+            (shape_id, from_stop_id, to_stop_id),
+        ).fetchone()
+        coords = self.shape_coords(shape_id) if row else None
+        if coords is None:
+            return None
+        return coords[row[0]:row[1] + 1]
+
+    def trip_geometry(
+        self,
+        trip_id: str,
+        ordered_stop_ids: List[str],
+        stops_by_id: Dict[str, Stop]
+    ) -> Optional[List[LatLon]]:
+        """
+        Geometrie eines Trips aus den vorberechneten Abschnitten.
+        Fehlt ein Abschnitt, wird dort gerade weitergezeichnet.
+        None, wenn der Trip keinen Verlauf hat (Fallback beim Aufrufer).
+        """
+        shape_id = self.trip_shape(trip_id)
+        if shape_id is None:
+            return None
+        coords_all = self.shape_coords(shape_id)
+        segs = {
+            (a, b): (s, e)
+            for a, b, s, e in self.con.execute(
+                "SELECT from_stop_id, to_stop_id, start_idx, end_idx FROM shape_segments WHERE shape_id=?;",
+                (shape_id,),
+            )
+        }
+
+        coords: List[LatLon] = []
+        for a, b in zip(ordered_stop_ids, ordered_stop_ids[1:]):
+            span = segs.get((a, b))
+            if span is not None:
+                part = coords_all[span[0]:span[1] + 1]
+            else:
+                part = [(stops_by_id[x].lat, stops_by_id[x].lon) for x in (a, b) if x in stops_by_id]
+            if coords and part and coords[-1] == part[0]:
+                part = part[1:]
+            coords.extend(part)
+        return coords or None
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from cache_db import connect
+
+    parser = argparse.ArgumentParser(description="shapes.txt einlesen (Linienverläufe)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build")
+    p_build.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_build.add_argument("--db", default=CACHE_DB_PATH)
+    sub.add_parser("pruefen", help="Einrasten auf einem Ringverlauf prüfen (ohne Feed)")
+    args = parser.parse_args()
+
+    if args.cmd == "pruefen":
+        raise SystemExit(0 if check_loop_snapping() else 1)
+
+    t0 = time.time()
+    con = connect(args.db)
+    stats = build_shapes(args.zip, con)
+    if not stats["shapes"]:
+        print("Feed enthält keine shapes.txt – Karten zeichnen weiter Halt-zu-Halt.")
+    else:
+        print(f"{stats['shapes']} Verläufe, {stats['trips']} Trips, {stats['segments']} Abschnitte "
+              f"in {time.time() - t0:.1f}s")
@@ -34,8 +34,14 @@ def load_stops(zip_path: str) -> Dict[str, Stop]:
         lon = row.get("stop_lon")
         if not sid or not name or lat is None or lon is None:
             continue
+        parent = (row.get("parent_station") or "").strip() or None
+        loc_type = (row.get("location_type") or "").strip()
         try:
-            stops[sid] = Stop(sid, name, float(lat), float(lon))
+            stops[sid] = Stop(
+                sid, name, float(lat), float(lon),
+                parent_station=parent,
+                location_type=int(loc_type) if loc_type.isdigit() else None
+            )
         except ValueError:
             continue
     return stops
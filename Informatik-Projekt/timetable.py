@@ -0,0 +1,486 @@
+# timetable.py
+
+"""
+timetable.py
+
+Aufgabe:
+    Dieses Modul "kompiliert" den Fahrplan eines Tages in kompakte, sortierte
+    NumPy-Arrays. Auf diesen Arrays arbeiten die Verbindungssuche (journey.py)
+    und alle weiteren Auswertungen, ohne stop_times.txt erneut lesen zu müssen.
+
+Verwendete GTFS-Dateien:
+    - stops.txt
+    - trips.txt
+    - stop_times.txt
+    - calendar.txt / calendar_dates.txt (über calendar_.py)
+
+Zentrale Aufgaben:
+    - Filtern der an einem Datum aktiven Trips (calendar_.py)
+    - Halte-Ereignisse (Stop-Events) nach Trip und Reihenfolge sortiert ablegen
+    - Ableiten der Verbindungen (Connections) zwischen aufeinanderfolgenden Halten
+    - Fußwege zwischen nahen Steigen / Halten derselben Station
+    - Speichern und Laden des kompilierten Fahrplans (.npz)
+
+Hinweise:
+    - Das Kompilieren liest stop_times.txt einmal komplett und dauert beim
+      Deutschland-Feed entsprechend. Das Ergebnis wird pro Datum gespeichert,
+      danach ist das Laden eine Frage von Sekundenbruchteilen.
+    - Alle Zeiten sind Sekunden ab Mitternacht des Betriebstags (GTFS-Zeit,
+      kann > 24:00:00 sein).
+    - get_timetable ist thread-sicher; denselben Tag kompiliert im Prozess
+      nur ein Thread, die anderen warten auf sein Ergebnis.
+"""
+
+import math
+import os
+import tempfile
+import threading
+from array import array
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import TIMETABLE_DIR, FOOTPATH_MAX_METERS, WALKING_SPEED_MPS, MIN_TRANSFER_SEC
+from calendar_ import active_service_ids
+from gtfs_zip import iter_rows
+from models import Stop
+from stops import load_stops
+from utils import parse_gtfs_time_to_seconds, today_date, yyyymmdd
+
+TIMETABLE_VERSION = 1
+
+
+class Timetable:
+    """
+    Kompilierter Fahrplan eines Betriebstags.
+
+    Stop-Events (ein Eintrag pro Zeile aus stop_times.txt) liegen nach
+    (Trip, stop_sequence) sortiert vor. trip_ptr[t]:trip_ptr[t+1] ist der
+    Bereich des Trips t. Verbindungen (Connections) sind Paare
+    aufeinanderfolgender Events desselben Trips.
+    """
+
+    def __init__(
+        self,
+        service_date: str,
+        stop_ids: List[str],
+        stop_lat: np.ndarray,
+        stop_lon: np.ndarray,
+        trip_ids: List[str],
+        trip_route: np.ndarray,
+        trip_headsign: np.ndarray,
+        trip_direction: np.ndarray,
+        route_ids: List[str],
+        route_names: List[str],
+        headsigns: List[str],
+        trip_ptr: np.ndarray,
+        ev_stop: np.ndarray,
+        ev_arr: np.ndarray,
+        ev_dep: np.ndarray,
+        ev_seq: np.ndarray,
+        fp_from: np.ndarray,
+        fp_to: np.ndarray,
+        fp_dur: np.ndarray,
+        fingerprint: str = ""
+    ):
+        self.service_date = service_date
+        self.stop_ids = stop_ids
+        self.stop_index: Dict[str, int] = {sid: i for i, sid in enumerate(stop_ids)}
+        self.stop_lat = stop_lat
+        self.stop_lon = stop_lon
+        self.trip_ids = trip_ids
+        self.trip_index: Dict[str, int] = {tid: i for i, tid in enumerate(trip_ids)}
+        self.trip_route = trip_route
+        self.trip_headsign = trip_headsign
+        self.trip_direction = trip_direction
+        self.route_ids = route_ids
+        self.route_names = route_names
+        self.headsigns = headsigns
+        self.trip_ptr = trip_ptr
+        self.ev_stop = ev_stop
+        self.ev_arr = ev_arr
+        self.ev_dep = ev_dep
+        self.ev_seq = ev_seq
+        self.fp_from = fp_from
+        self.fp_to = fp_to
+        self.fp_dur = fp_dur
+        self.fingerprint = fingerprint
+
+        # Trip-Index pro Event
+        self.ev_trip = np.repeat(
+            np.arange(len(trip_ids), dtype=np.int32), np.diff(trip_ptr)
+        )
+
+        # Connections: Event i -> Event i+1, falls beide zum selben Trip gehören
+        if len(ev_stop) > 1:
+            same = self.ev_trip[1:] == self.ev_trip[:-1]
+            first = np.flatnonzero(same).astype(np.int32)
+        else:
+            first = np.zeros(0, dtype=np.int32)
+        self.c_ev = first  # Index des Abfahrts-Events
+        self.c_trip = self.ev_trip[first]
+        self.c_from = ev_stop[first]
+        self.c_to = ev_stop[first + 1]
+        self.c_dep = ev_dep[first]
+        self.c_arr = ev_arr[first + 1]
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def n_trips(self) -> int:
+        return len(self.trip_ids)
+
+    def trip_slice(self, trip_idx: int) -> slice:
+        return slice(int(self.trip_ptr[trip_idx]), int(self.trip_ptr[trip_idx + 1]))
+
+    def trip_stop_ids(self, trip_idx: int) -> List[str]:
+        return [self.stop_ids[i] for i in self.ev_stop[self.trip_slice(trip_idx)].tolist()]
+
+
+def feed_fingerprint(zip_path: str) -> str:
+    """Kennung des Feeds (Größe + Änderungszeit), um veraltete Dateien zu erkennen."""
+    st = os.stat(zip_path)
+    return f"{st.st_size}-{int(st.st_mtime)}"
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    r = 6371000.0
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def build_footpaths(
+    stop_ids: List[str],
+    stops_by_id: Dict[str, Stop],
+    max_meters: float = FOOTPATH_MAX_METERS,
+    speed_mps: float = WALKING_SPEED_MPS,
+    min_transfer_sec: int = MIN_TRANSFER_SEC
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fußwege zwischen Halten, die höchstens max_meters auseinanderliegen oder
+    zur selben Station (parent_station) gehören.
+
+    Die Suche nutzt ein einfaches Gitter (Zellen von max_meters Kantenlänge),
+    sodass nur Halte in Nachbarzellen verglichen werden.
+    """
+    cell_lat = max_meters / 111320.0
+    cell_lon = cell_lat / math.cos(math.radians(51.0))
+
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    by_parent: Dict[str, List[int]] = {}
+    for i, sid in enumerate(stop_ids):
+        s = stops_by_id.get(sid)
+        if s is None:
+            continue
+        key = (int(math.floor(s.lat / cell_lat)), int(math.floor(s.lon / cell_lon)))
+        grid.setdefault(key, []).append(i)
+        if s.parent_station:
+            by_parent.setdefault(s.parent_station, []).append(i)
+
+    pairs: Dict[Tuple[int, int], int] = {}
+
+    def add(i: int, j: int, dist: float) -> None:
+        dur = max(min_transfer_sec, int(dist / speed_mps))
+        if pairs.get((i, j), 1 << 30) > dur:
+            pairs[(i, j)] = dur
+
+    for (gy, gx), members in grid.items():
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                other = grid.get((gy + dy, gx + dx))
+                if not other:
+                    continue
+                for i in members:
+                    a = stops_by_id[stop_ids[i]]
+                    for j in other:
+                        if i == j:
+                            continue
+                        b = stops_by_id[stop_ids[j]]
+                        dist = haversine_m(a.lat, a.lon, b.lat, b.lon)
+                        if dist <= max_meters:
+                            add(i, j, dist)
+
+    for members in by_parent.values():
+        for i in members:
+            a = stops_by_id[stop_ids[i]]
+            for j in members:
+                if i != j:
+                    b = stops_by_id[stop_ids[j]]
+                    add(i, j, haversine_m(a.lat, a.lon, b.lat, b.lon))
+
+    if not pairs:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty.copy(), empty.copy()
+
+    keys = sorted(pairs)
+    fp_from = np.fromiter((k[0] for k in keys), dtype=np.int32, count=len(keys))
+    fp_to = np.fromiter((k[1] for k in keys), dtype=np.int32, count=len(keys))
+    fp_dur = np.fromiter((pairs[k] for k in keys), dtype=np.int32, count=len(keys))
+    return fp_from, fp_to, fp_dur
+
+
+def compile_timetable(
+    zip_path: str,
+    d: date,
+    stops_by_id: Optional[Dict[str, Stop]] = None
+) -> Timetable:
+    """
+    Baut den Tagesfahrplan für Datum d.
+
+    Ablauf:
+        1) aktive service_ids (calendar_.py)
+        2) trips.txt: aktive Trips mit Route, Ziel und Richtung
+        3) stop_times.txt: Events in kompakte Arrays (array-Modul) streamen
+        4) NumPy: nach (Trip, stop_sequence) sortieren
+        5) Fußwege zwischen nahen Halten berechnen
+
+    Hinweise:
+        - Ist für d kein Service aktiv (Feed nicht gültig), werden wie in der
+          App alle Trips ohne Kalenderfilter genommen.
+    """
+    if stops_by_id is None:
+        stops_by_id = load_stops(zip_path)
+
+    services = active_service_ids(zip_path, d)
+
+    trip_index: Dict[str, int] = {}
+    trip_ids: List[str] = []
+    trip_route = array("i")
+    trip_headsign = array("i")
+    trip_direction = array("b")
+    route_index: Dict[str, int] = {}
+    headsign_index: Dict[str, int] = {}
+
+    for row in iter_rows(zip_path, "trips.txt"):
+        tid = (row.get("trip_id") or "").strip()
+        rid = (row.get("route_id") or "").strip()
+        sid = (row.get("service_id") or "").strip()
+        if not tid or not rid:
+            continue
+        if services and sid not in services:
+            continue
+        trip_index[tid] = len(trip_ids)
+        trip_ids.append(tid)
+        trip_route.append(route_index.setdefault(rid, len(route_index)))
+        hs = (row.get("trip_headsign") or "").strip()
+        trip_headsign.append(headsign_index.setdefault(hs, len(headsign_index)))
+        direction = (row.get("direction_id") or "").strip()
+        trip_direction.append(int(direction) if direction.isdigit() else -1)
+
+    from departures import load_routes
+    routes = load_routes(zip_path)
+    route_ids = list(route_index)
+    route_names = []
+    for rid in route_ids:
+        r = routes.get(rid, {})
+        route_names.append(
+            (r.get("route_short_name") or "").strip()
+            or (r.get("route_long_name") or "").strip()
+            or rid
+        )
+
+    stop_index: Dict[str, int] = {}
+    ev_trip = array("i")
+    ev_seq = array("i")
+    ev_arr = array("i")
+    ev_dep = array("i")
+    ev_stop = array("i")
+
+    for row in iter_rows(zip_path, "stop_times.txt"):
+        t = trip_index.get((row.get("trip_id") or "").strip())
+        if t is None:
+            continue
+        stop_id = (row.get("stop_id") or "").strip()
+        seq = (row.get("stop_sequence") or "").strip()
+        arr_t = (row.get("arrival_time") or "").strip()
+        dep_t = (row.get("departure_time") or "").strip()
+        if not stop_id or not seq.isdigit() or not (arr_t or dep_t):
+            continue
+        arr = parse_gtfs_time_to_seconds(arr_t or dep_t)
+        dep = parse_gtfs_time_to_seconds(dep_t or arr_t)
+        ev_trip.append(t)
+        ev_seq.append(int(seq))
+        ev_arr.append(arr)
+        ev_dep.append(dep)
+        ev_stop.append(stop_index.setdefault(stop_id, len(stop_index)))
+
+    e_trip = np.frombuffer(ev_trip, dtype=np.int32)
+    e_seq = np.frombuffer(ev_seq, dtype=np.int32)
+    order = np.lexsort((e_seq, e_trip))
+    e_trip = e_trip[order]
+    trip_ptr = np.zeros(len(trip_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(e_trip, minlength=len(trip_ids)), out=trip_ptr[1:])
+
+    stop_ids = list(stop_index)
+    nan = float("nan")
+    stop_lat = np.array([stops_by_id[s].lat if s in stops_by_id else nan for s in stop_ids], dtype=np.float64)
+    stop_lon = np.array([stops_by_id[s].lon if s in stops_by_id else nan for s in stop_ids], dtype=np.float64)
+    fp_from, fp_to, fp_dur = build_footpaths(stop_ids, stops_by_id)
+
+    return Timetable(
+        service_date=yyyymmdd(d),
+        stop_ids=stop_ids,
+        stop_lat=stop_lat,
+        stop_lon=stop_lon,
+        trip_ids=trip_ids,
+        trip_route=np.frombuffer(trip_route, dtype=np.int32).copy(),
+        trip_headsign=np.frombuffer(trip_headsign, dtype=np.int32).copy(),
+        trip_direction=np.frombuffer(trip_direction, dtype=np.int8).copy(),
+        route_ids=route_ids,
+        route_names=route_names,
+        headsigns=list(headsign_index),
+        trip_ptr=trip_ptr,
+        ev_stop=np.frombuffer(ev_stop, dtype=np.int32)[order],
+        ev_arr=np.frombuffer(ev_arr, dtype=np.int32)[order],
+        ev_dep=np.frombuffer(ev_dep, dtype=np.int32)[order],
+        ev_seq=e_seq[order],
+        fp_from=fp_from,
+        fp_to=fp_to,
+        fp_dur=fp_dur,
+        fingerprint=feed_fingerprint(zip_path),
+    )
+
+
+def save_timetable(tt: Timetable, path: str) -> None:
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # eigene Temp-Datei pro Schreiber: mehrere Prozesse können denselben Tag kompilieren
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            _write_npz(f, tt)
+        os.chmod(tmp, 0o644)  # mkstemp legt 0600 an, andere Worker-Benutzer sollen lesen können
+        # erst komplett schreiben, dann umbenennen -> nie halbe Dateien
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _write_npz(f, tt: Timetable) -> None:
+    np.savez(
+        f,
+        version=np.array([TIMETABLE_VERSION]),
+        service_date=np.array([tt.service_date]),
+        fingerprint=np.array([tt.fingerprint]),
+        stop_ids=np.array(tt.stop_ids, dtype=str),
+        stop_lat=tt.stop_lat,
+        stop_lon=tt.stop_lon,
+        trip_ids=np.array(tt.trip_ids, dtype=str),
+        trip_route=tt.trip_route,
+        trip_headsign=tt.trip_headsign,
+        trip_direction=tt.trip_direction,
+        route_ids=np.array(tt.route_ids, dtype=str),
+        route_names=np.array(tt.route_names, dtype=str),
+        headsigns=np.array(tt.headsigns, dtype=str),
+        trip_ptr=tt.trip_ptr,
+        ev_stop=tt.ev_stop,
+        ev_arr=tt.ev_arr,
+        ev_dep=tt.ev_dep,
+        ev_seq=tt.ev_seq,
+        fp_from=tt.fp_from,
+        fp_to=tt.fp_to,
+        fp_dur=tt.fp_dur,
+    )
+
+
+def load_timetable(path: str) -> Optional[Timetable]:
+    """Lädt einen gespeicherten Fahrplan oder None, falls Version nicht passt."""
+    with np.load(path, allow_pickle=False) as z:
+        if int(z["version"][0]) != TIMETABLE_VERSION:
+            return None
+        return Timetable(
+            service_date=str(z["service_date"][0]),
+            stop_ids=z["stop_ids"].tolist(),
+            stop_lat=z["stop_lat"],
+            stop_lon=z["stop_lon"],
+            trip_ids=z["trip_ids"].tolist(),
+            trip_route=z["trip_route"],
+            trip_headsign=z["trip_headsign"],
+            trip_direction=z["trip_direction"],
+            route_ids=z["route_ids"].tolist(),
+            route_names=z["route_names"].tolist(),
+            headsigns=z["headsigns"].tolist(),
+            trip_ptr=z["trip_ptr"],
+            ev_stop=z["ev_stop"],
+            ev_arr=z["ev_arr"],
+            ev_dep=z["ev_dep"],
+            ev_seq=z["ev_seq"],
+            fp_from=z["fp_from"],
+            fp_to=z["fp_to"],
+            fp_dur=z["fp_dur"],
+            fingerprint=str(z["fingerprint"][0]),
+        )
+
+
+# (zip_path, YYYYMMDD) -> Fahrplan; gehalten werden nur heute und gestern
+# (Trips nach Mitternacht) sowie der zuletzt angefragte Tag
+_LOADED: Dict[Tuple[str, str], Timetable] = {}
+_LOADED_LOCK = threading.Lock()                           # schützt _LOADED und _BUILD_LOCKS
+_BUILD_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}  # ein Tag wird nur einmal kompiliert
+
+
+def _evict_loaded(keep: Tuple[str, str]) -> None:
+    """Aufruf nur mit _LOADED_LOCK."""
+    today = today_date()
+    current = {yyyymmdd(today), yyyymmdd(today - timedelta(days=1))}
+    for key in [k for k in _LOADED if k != keep and k[1] not in current]:
+        del _LOADED[key]
+    for key in [k for k in _BUILD_LOCKS if k != keep and k[1] not in current and k not in _LOADED]:
+        del _BUILD_LOCKS[key]
+
+
+def timetable_path(d: date, cache_dir: str = TIMETABLE_DIR) -> str:
+    return os.path.join(cache_dir, f"timetable_{yyyymmdd(d)}.npz")
+
+
+def get_timetable(
+    zip_path: str,
+    d: date,
+    cache_dir: str = TIMETABLE_DIR,
+    stops_by_id: Optional[Dict[str, Stop]] = None
+) -> Timetable:
+    """
+    Liefert den kompilierten Fahrplan für d:
+        1) aus dem Prozess-Speicher,
+        2) aus der gespeicherten .npz-Datei (wenn zum Feed passend),
+        3) sonst neu kompiliert und gespeichert.
+    Im Prozess-Speicher bleiben nur heute, gestern und d (siehe _LOADED).
+    """
+    key = (zip_path, yyyymmdd(d))
+    fp = feed_fingerprint(zip_path)
+    with _LOADED_LOCK:
+        tt = _LOADED.get(key)
+        if tt is not None and tt.fingerprint == fp:
+            return tt
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+
+    # Laden/Kompilieren ohne globale Sperre; derselbe Tag nur einmal
+    with build_lock:
+        with _LOADED_LOCK:
+            tt = _LOADED.get(key)
+        if tt is not None and tt.fingerprint == fp:
+            return tt  # ein anderer Thread war schneller
+
+        path = timetable_path(d, cache_dir)
+        tt = None
+        if os.path.exists(path):
+            tt = load_timetable(path)
+            if tt is not None and tt.fingerprint != fp:
+                tt = None
+
+        if tt is None:
+            tt = compile_timetable(zip_path, d, stops_by_id)
+            save_timetable(tt, path)
+
+        with _LOADED_LOCK:
+            _LOADED[key] = tt
+            _evict_loaded(key)
+    return tt
@@ -25,3 +25,9 @@ def format_seconds_hhmm(sec: int) -> str:
     hh = sec // 3600
     mm = (sec % 3600) // 60
     return f"{hh:02d}:{mm:02d}"
+
+def format_seconds_hhmmss(sec: int) -> str: # Gegenstück zu parse_gtfs_time_to_seconds
+    hh = sec // 3600
+    mm = (sec % 3600) // 60
+    ss = sec % 60
+    return f"{hh:02d}:{mm:02d}:{ss:02d}"
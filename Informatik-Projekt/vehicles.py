@@ -0,0 +1,412 @@
+# vehicles.py
+
+"""
+vehicles.py
+
+Aufgabe:
+    Dieses Modul berechnet die Positionen aller gerade fahrenden Züge aus dem
+    Fahrplan (plus Verspätung, falls bekannt). Für einen Zeitpunkt wird zu
+    jedem laufenden Trip das umgebende Halte-Paar gesucht und zwischen den
+    Koordinaten der beiden Halte interpoliert – für alle Trips in einem
+    vektorisierten Durchlauf.
+
+Datenquelle:
+    - kompilierter Tagesfahrplan (timetable.py) des aktuellen Tags und des
+      Vortags (Trips nach Mitternacht mit Zeiten > 24:00)
+    - Verspätungen je (Trip, Halt) aus delay_history.py
+
+Zentrale Aufgaben:
+    - Zeiten je Halte-Ereignis um die Verspätung verschieben; eine beobachtete
+      Verspätung gilt auch für die folgenden Halte des Trips, bis eine neue kommt
+    - Fahrten zwischen zwei Halten: Verbindungen nach Abfahrt sortiert, per
+      binärer Suche nur das Zeitfenster [t - längste Verbindung, t] prüfen
+    - Aufenthalte am Halt (Ankunft < Abfahrt) genauso über die Ankunft
+    - Ausgabe als Arrays oder GeoJSON für die Live-Karte (route_map.py,
+      Dashboard, python vehicles.py serve)
+
+Hinweise:
+    - Interpoliert wird linear zwischen den Halten (ohne shapes.txt-Verlauf).
+    - Nach dem Verschieben werden die Zeiten je Trip monoton gemacht (Laufmaximum),
+      damit ein Zug auch bei schrumpfender Verspätung nie doppelt oder gar nicht
+      erscheint.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import GTFS_ZIP_PATH, TIMETABLE_DIR, VEHICLES_HOST, VEHICLES_PORT
+from models import Stop
+from timetable import Timetable, get_timetable
+
+DAY_SEC = 24 * 3600
+
+
+@dataclass
+class VehiclePositions:
+    """Alle Fahrzeuge zu einem Zeitpunkt (Zeile i = ein Fahrzeug)."""
+    time_sec: int
+    lat: np.ndarray
+    lon: np.ndarray
+    delay_sec: np.ndarray
+    progress: np.ndarray      # 0..1 zwischen letztem und nächstem Halt
+    at_stop: np.ndarray       # True = steht am Halt
+    trip_ids: List[str]
+    route_names: List[str]
+    headsigns: List[str]
+    next_stop_ids: List[str]  # beim Halt: der Halt selbst
+
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    def to_geojson(self, stop_names: Optional[Dict[str, str]] = None) -> dict:
+        names = stop_names or {}
+        features = []
+        for i in range(len(self)):
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(float(self.lon[i]), 5), round(float(self.lat[i]), 5)]},
+                "properties": {
+                    "trip_id": self.trip_ids[i],
+                    "line": self.route_names[i],
+                    "headsign": self.headsigns[i],
+                    "delay_min": int(self.delay_sec[i]) // 60,
+                    "at_stop": bool(self.at_stop[i]),
+                    "next_stop": names.get(self.next_stop_ids[i], self.next_stop_ids[i]),
+                },
+            })
+        return {"type": "FeatureCollection", "features": features}
+
+
+class _DayState:
+    """Zeiten eines Betriebstags mit eingerechneter Verspätung plus Suchstrukturen."""
+
+    def __init__(self, tt: Timetable, offset_sec: int):
+        self.tt = tt
+        self.offset_sec = offset_sec  # Vortag: Abfrage mit t + 24h
+        self.ev_lat = tt.stop_lat[tt.ev_stop]
+        self.ev_lon = tt.stop_lon[tt.ev_stop]
+        self.trip_first = tt.trip_ptr[tt.ev_trip]  # erstes Event des eigenen Trips
+        self._ev_key: Optional[np.ndarray] = None
+        self._ev_key_order: Optional[np.ndarray] = None
+        self.delay = np.zeros(len(tt.ev_stop), dtype=np.int32)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        tt = self.tt
+        arr = tt.ev_arr.astype(np.int64) + self.delay
+        dep = tt.ev_dep.astype(np.int64) + self.delay
+
+        # je Trip monoton: [arr0, dep0, arr1, dep1, ...] als Laufmaximum (Trip als hoher Offset)
+        if len(arr):
+            lo = int(min(arr.min(), dep.min()))
+            base = tt.ev_trip.astype(np.int64) << 24
+            seq = np.empty(2 * len(arr), dtype=np.int64)
+            seq[0::2] = arr - lo + base
+            seq[1::2] = dep - lo + base
+            np.maximum.accumulate(seq, out=seq)
+            arr = seq[0::2] - base + lo
+            dep = seq[1::2] - base + lo
+        self.arr = arr
+        self.dep = dep
+
+        # Fahrten: Verbindung c von Event c_ev nach c_ev + 1
+        c_dep = dep[tt.c_ev]
+        c_arr = arr[tt.c_ev + 1]
+        order = np.argsort(c_dep, kind="stable")
+        self.c_order = order
+        self.c_dep_sorted = c_dep[order]
+        self.c_max = int((c_arr - c_dep).max()) if len(c_dep) else 0
+
+        # Aufenthalte: Events mit Ankunft < Abfahrt
+        dwell = np.flatnonzero(arr < dep)
+        order = np.argsort(arr[dwell], kind="stable")
+        self.dw_ev = dwell[order]
+        self.dw_arr_sorted = arr[self.dw_ev]
+        self.dw_max = int((dep[dwell] - arr[dwell]).max()) if len(dwell) else 0
+
+    def set_delays(self, delays: Dict[Tuple[str, str], int]) -> int:
+        """Verspätungen (trip_id, stop_id) -> Sekunden übernehmen. Rückgabe: zugeordnete Events."""
+        tt = self.tt
+        n_stops = max(tt.n_stops, 1)
+        if self._ev_key is None:
+            self._ev_key = tt.ev_trip.astype(np.int64) * n_stops + tt.ev_stop
+            self._ev_key_order = np.argsort(self._ev_key, kind="stable")
+
+        keys: List[int] = []
+        values: List[int] = []
+        for (trip_id, stop_id), d in delays.items():
+            t = tt.trip_index.get(trip_id)
+            s = tt.stop_index.get(stop_id)
+            if t is not None and s is not None:
+                keys.append(t * n_stops + s)
+                values.append(d)
+
+        n_ev = len(tt.ev_stop)
+        known = np.full(n_ev, -1, dtype=np.int64)
+        vals = np.zeros(n_ev, dtype=np.int32)
+        if keys:
+            k = np.asarray(keys, dtype=np.int64)
+            sorted_keys = self._ev_key[self._ev_key_order]
+            pos = np.searchsorted(sorted_keys, k)
+            pos_ok = pos < n_ev
+            hit = np.zeros(len(k), dtype=bool)
+            hit[pos_ok] = sorted_keys[pos[pos_ok]] == k[pos_ok]
+            ev = self._ev_key_order[pos[hit]]
+            vals[ev] = np.asarray(values, dtype=np.int32)[hit]
+            known[ev] = ev
+
+        # Verspätung nach vorne durchreichen, aber nie über die Trip-Grenze
+        np.maximum.accumulate(known, out=known)
+        valid = known >= self.trip_first
+        self.delay = np.where(valid, vals[np.maximum(known, 0)], 0).astype(np.int32)
+        self._rebuild()
+        return int(np.count_nonzero(known == np.arange(n_ev)))
+
+    def locate(self, t: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rückgabe (Event vorher, Event nachher, Anteil, am Halt) für alle Fahrzeuge zu t.
+        Beim Aufenthalt sind beide Events gleich.
+        """
+        t = t + self.offset_sec
+        tt = self.tt
+
+        lo = int(np.searchsorted(self.c_dep_sorted, t - self.c_max, side="left"))
+        hi = int(np.searchsorted(self.c_dep_sorted, t, side="right"))
+        cand = self.c_order[lo:hi]
+        a = tt.c_ev[cand].astype(np.int64)
+        moving = self.arr[a + 1] > t
+        a = a[moving]
+        b = a + 1
+        span = (self.arr[b] - self.dep[a]).astype(np.float64)
+        frac = np.where(span > 0, (t - self.dep[a]) / np.maximum(span, 1.0), 1.0)
+
+        lo = int(np.searchsorted(self.dw_arr_sorted, t - self.dw_max, side="left"))
+        hi = int(np.searchsorted(self.dw_arr_sorted, t, side="right"))
+        d = self.dw_ev[lo:hi].astype(np.int64)
+        d = d[self.dep[d] > t]
+
+        before = np.concatenate([a, d])
+        after = np.concatenate([b, d])
+        progress = np.concatenate([frac, np.zeros(len(d))])
+        at_stop = np.concatenate([np.zeros(len(a), dtype=bool), np.ones(len(d), dtype=bool)])
+        return before, after, progress, at_stop
+
+
+class VehicleEngine:
+    """
+    Positionen aller Fahrzeuge eines Tags.
+
+        engine = VehicleEngine.for_day(GTFS_ZIP_PATH, today_date())
+        vp = engine.positions(now_seconds())
+    """
+
+    def __init__(self, tt: Timetable, prev_tt: Optional[Timetable] = None):
+        self.days: List[_DayState] = [_DayState(tt, 0)]
+        if prev_tt is not None:
+            self.days.append(_DayState(prev_tt, DAY_SEC))
+        self._dirty: Dict[str, bool] = {}
+        self._history = None
+
+    @classmethod
+    def for_day(
+        cls,
+        zip_path: str = GTFS_ZIP_PATH,
+        d: Optional[date] = None,
+        stops_by_id: Optional[Dict[str, Stop]] = None,
+        cache_dir: str = TIMETABLE_DIR
+    ) -> "VehicleEngine":
+        from utils import today_date
+        d = d or today_date()
+        tt = get_timetable(zip_path, d, cache_dir, stops_by_id)
+        prev = get_timetable(zip_path, d - timedelta(days=1), cache_dir, stops_by_id)
+        return cls(tt, prev)
+
+    @property
+    def service_dates(self) -> List[str]:
+        return [day.tt.service_date for day in self.days]
+
+    def set_delays(self, service_date: str, delays: Dict[Tuple[str, str], int]) -> int:
+        """Verspätungen für einen Betriebstag ("YYYYMMDD") setzen (ersetzt die bisherigen)."""
+        return sum(day.set_delays(delays) for day in self.days if day.tt.service_date == service_date)
+
+    def follow(self, history) -> None:
+        """
+        Verspätungen aus einer DelayHistory übernehmen und bei jedem Echtzeit-Abruf
+        mit Änderungen beim nächsten positions()-Aufruf neu einlesen.
+        """
+        self._history = history
+        for sd in self.service_dates:
+            self._dirty[sd] = True
+        history.subscribe(self._on_realtime_update)
+
+    def _on_realtime_update(self, service_date: date, trip_ids) -> None:
+        from utils import yyyymmdd
+        sd = yyyymmdd(service_date)
+        if sd in self.service_dates:
+            self._dirty[sd] = True
+
+    def _refresh_delays(self) -> None:
+        from datetime import datetime
+        for sd, dirty in list(self._dirty.items()):
+            if dirty:
+                self._dirty[sd] = False
+                d = datetime.strptime(sd, "%Y%m%d").date()
+                self.set_delays(sd, self._history.current_delays(d))
+
+    def positions(self, now_sec: int) -> VehiclePositions:
+        """Alle Fahrzeuge zu now_sec (Sekunden ab Mitternacht des aktuellen Tags)."""
+        if self._history is not None:
+            self._refresh_delays()
+
+        lat, lon, delay, progress, at_stop = [], [], [], [], []
+        trip_ids: List[str] = []
+        route_names: List[str] = []
+        headsigns: List[str] = []
+        next_stops: List[str] = []
+        for day in self.days:
+            a, b, frac, stopped = day.locate(now_sec)
+            lat.append(day.ev_lat[a] + frac * (day.ev_lat[b] - day.ev_lat[a]))
+            lon.append(day.ev_lon[a] + frac * (day.ev_lon[b] - day.ev_lon[a]))
+            delay.append(day.delay[b])
+            progress.append(frac)
+            at_stop.append(stopped)
+
+            tt = day.tt
+            trips = tt.ev_trip[a].tolist()
+            trip_ids.extend(tt.trip_ids[t] for t in trips)
+            route_names.extend(tt.route_names[r] for r in tt.trip_route[trips].tolist())
+            headsigns.extend(tt.headsigns[h] for h in tt.trip_headsign[trips].tolist())
+            next_stops.extend(tt.stop_ids[s] for s in tt.ev_stop[b].tolist())
+
+        lat_a = np.concatenate(lat)
+        lon_a = np.concatenate(lon)
+        ok = ~(np.isnan(lat_a) | np.isnan(lon_a))  # Halte ohne Koordinaten auslassen
+        keep = np.flatnonzero(ok).tolist()
+        return VehiclePositions(
+            time_sec=now_sec,
+            lat=lat_a[ok],
+            lon=lon_a[ok],
+            delay_sec=np.concatenate(delay)[ok],
+            progress=np.concatenate(progress)[ok],
+            at_stop=np.concatenate(at_stop)[ok],
+            trip_ids=[trip_ids[i] for i in keep],
+            route_names=[route_names[i] for i in keep],
+            headsigns=[headsigns[i] for i in keep],
+            next_stop_ids=[next_stops[i] for i in keep],
+        )
+
+
+def vehicles_url(host: str = VEHICLES_HOST, port: int = VEHICLES_PORT) -> str:
+    return f"http://{host}:{port}/vehicles.geojson"
+
+
+def serve_vehicles(
+    zip_path: str = GTFS_ZIP_PATH,
+    host: str = VEHICLES_HOST,
+    port: int = VEHICLES_PORT,
+    history=None
+) -> None:
+    """
+    Liefert /vehicles.geojson (Positionen zum Abrufzeitpunkt) für die Live-Karte.
+    Zum Tageswechsel wird die Engine für den neuen Tag gebaut.
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from utils import now_seconds, today_date
+    from feed_snapshot import get_snapshot
+
+    snap = get_snapshot(zip_path)
+    stops_by_id = snap.stops_by_id()
+    stop_names = {sid: s.stop_name for sid, s in stops_by_id.items()}
+    state = {"day": None, "engine": None}
+    lock = threading.Lock()
+
+    def engine() -> VehicleEngine:
+        with lock:
+            d = today_date()
+            if state["day"] != d:
+                state["engine"] = VehicleEngine.for_day(zip_path, d, stops_by_id)
+                if history is not None:
+                    state["engine"].follow(history)
+                state["day"] = d
+            return state["engine"]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/vehicles.geojson":
+                self.send_error(404)
+                return
+            vp = engine().positions(now_seconds())
+            body = json.dumps(vp.to_geojson(stop_names), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/geo+json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    engine()
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Fahrzeug-Server läuft: {vehicles_url(host, port)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from config import VEHICLE_REFRESH_SEC
+    from utils import now_seconds, parse_gtfs_time_to_seconds, today_date
+
+    parser = argparse.ArgumentParser(description="Live-Positionen aller Züge aus Fahrplan (+ Verspätung)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_now = sub.add_parser("jetzt", help="Positionen berechnen und Laufzeit messen")
+    p_now.add_argument("--zeit", help="HH:MM:SS statt jetzt")
+    p_now.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_now.add_argument("--wiederholen", type=int, default=20)
+    p_serve = sub.add_parser("serve", help="GeoJSON-Server für die Live-Karte")
+    p_serve.add_argument("--zip", default=GTFS_ZIP_PATH)
+    p_serve.add_argument("--port", type=int, default=VEHICLES_PORT)
+    p_serve.add_argument("--verspaetungen", help="Verzeichnis der Verspätungshistorie (delay_history.py)")
+    p_map = sub.add_parser("karte", help="HTML-Karte, die sich beim Server aktualisiert")
+    p_map.add_argument("--out", default="vehicles_map.html")
+    p_map.add_argument("--port", type=int, default=VEHICLES_PORT)
+    args = parser.parse_args()
+
+    if args.cmd == "jetzt":
+        t0 = time.time()
+        engine = VehicleEngine.for_day(args.zip, today_date())
+        print(f"Engine bereit in {time.time() - t0:.2f}s ({', '.join(engine.service_dates)}).")
+        t = parse_gtfs_time_to_seconds(args.zeit) if args.zeit else now_seconds()
+        t0 = time.perf_counter()
+        for _ in range(max(args.wiederholen, 1)):
+            vp = engine.positions(t)
+        dt = (time.perf_counter() - t0) / max(args.wiederholen, 1)
+        print(f"{len(vp)} Fahrzeuge, davon {int(vp.at_stop.sum())} am Halt; {dt * 1000:.2f} ms pro Durchlauf")
+        for i in range(min(len(vp), 10)):
+            print(f"  {vp.route_names[i]:8s} {vp.headsigns[i]:25s} {vp.lat[i]:9.5f} {vp.lon[i]:9.5f}  "
+                  f"+{int(vp.delay_sec[i]) // 60} min  -> {vp.next_stop_ids[i]}")
+
+    elif args.cmd == "serve":
+        history = None
+        if args.verspaetungen:
+            from delay_history import DelayHistory
+            history = DelayHistory(args.verspaetungen)
+            history.watch()  # Datensätze des schreibenden Prozesses nachlesen
+        serve_vehicles(args.zip, port=args.port, history=history)
+
+    else:
+        from route_map import build_vehicle_map
+        build_vehicle_map(vehicles_url(port=args.port), VEHICLE_REFRESH_SEC, out_file=args.out)